@@ -0,0 +1,274 @@
+"""
+Headless solving and grading of many puzzles
+
+Puzzles are one per line, 81 characters,
+'0' or '.' for empty cells, or arrays
+of 81 cells (e.g. chunks of a corpus,
+see corpus.py). 4x4, 16x16 and 25x25
+puzzles are solved the same way, and so
+are variants (see variants.py), either one
+variant for all the puzzles or (puzzle,
+variants.Variant) items. With a
+cache every worker keeps its own
+SolutionCache, workers can share the
+solutions through its sqlite file.
+Nothing here imports cv2 or tkinter,
+so it can run on machines without
+a display.
+"""
+import functools
+import itertools
+import multiprocessing
+import os
+
+from .cache import SolutionCache
+from .formats import format_puzzle, parse_puzzle
+from .geometry import as_board_stack, geometry_of
+from .logic import grade
+from .solver import get_solver
+from .variants import rules_of
+
+
+# cache file -> cache of this process
+_caches = {}
+
+
+def _process_cache(path):
+    cache = _caches.get(path)
+    if cache is None:
+        cache = _caches[path] = SolutionCache(path=path)
+    return cache
+
+
+def _grid_of(line):
+    if isinstance(line, str):
+        try:
+            return parse_puzzle(line)
+        except ValueError:
+            return None
+    puzzle, geo = as_board_stack(line)
+    return puzzle.reshape(geo.size, geo.size).tolist()
+
+
+def imap_windows(function, items, workers=None, chunk_size=64):
+    """
+    Map <function> over <items> in a process
+    pool, yielding results in input order
+
+    Input is read in windows of a few chunks per
+    worker, so memory does not depend on its length.
+
+    Arguments:
+        function {callable} -- picklable function of one item
+        items {iterable} -- items to map
+
+    Keyword Arguments:
+        workers {int} -- number of processes, 1 maps
+                         in this process (default: {cpu count})
+        chunk_size {int} -- items sent to a worker at once
+
+    Yields:
+        object -- result of <function> for every item
+    """
+    if workers == 1:
+        for item in items:
+            yield function(item)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    window_size = chunk_size * workers * 4
+    items = iter(items)
+    with multiprocessing.Pool(workers) as pool:
+        while True:
+            window = list(itertools.islice(items, window_size))
+            if not window:
+                break
+            for result in pool.imap(function, window, chunksize=chunk_size):
+                yield result
+
+
+def solve_line(line, backend='bitmask', profile=False, cache=None, variant='classic'):
+    """
+    Solve a one-line puzzle
+
+    Arguments:
+        line {str or array-like} -- puzzle to solve, a line
+                                    or an array of 81 cells,
+                                    or (puzzle, variants.Variant)
+
+    Keyword Arguments:
+        backend {str} -- solver backend (default: {'bitmask'})
+        profile {bool} -- return solver statistics too (default: {False})
+        cache {SolutionCache} -- cache to check first, only
+                                 for classic rules (default: {None})
+        variant {str or Variant} -- variant of the puzzle, unless
+                                    it comes with one (default: {'classic'})
+
+    Returns:
+        str or None -- solution or None if the puzzle
+                       is malformed or has no solution,
+                       (solution, stats dict or None)
+                       if <profile> is set, with
+                       'cache_hit' if <cache> is set
+    """
+    solution = stats = None
+    if isinstance(line, tuple):
+        line, variant = line
+    grid = _grid_of(line)
+    if grid is not None:
+        try:
+            rules = rules_of(variant, geometry_of(grid).box)
+            solver = get_solver(grid, backend, rules=rules)
+        except ValueError:
+            # the variant does not exist at this size
+            # or the backend does not support it
+            grid = None
+    if grid is not None:
+        if cache is None or not rules.is_classic:
+            solution = solver.solve()
+            stats = solver.stats.as_dict()
+        else:
+            hits = cache.stats.hits
+            solution = cache.solve(grid, backend, solver)
+            stats = solver.stats.as_dict()
+            stats['cache_hit'] = cache.stats.hits > hits
+        if solution is not None:
+            solution = format_puzzle(solution)
+    if profile:
+        return solution, stats
+    return solution
+
+
+def _solve_item(line, backend, profile, cache, cache_file, variant='classic'):
+    cache = _process_cache(cache_file) if cache or cache_file else None
+    if profile:
+        return (line,) + solve_line(line, backend, profile, cache, variant)
+    return line, solve_line(line, backend, cache=cache, variant=variant), None
+
+
+def solve_lines(lines, backend='bitmask', cache=False, cache_file=None, variant='classic'):
+    """
+    Solve a batch of puzzles in this process,
+    e.g. in a worker of a server
+
+    Arguments:
+        lines {list} -- one-line puzzles or arrays of 81 cells
+
+    Keyword Arguments:
+        backend {str} -- solver backend (default: {'bitmask'})
+        cache {bool} -- check the SolutionCache of this
+                        process first (default: {False})
+        cache_file {str} -- sqlite file of the cache, implies
+                            <cache> (default: {None})
+        variant {str} -- variant of the puzzles (default: {'classic'})
+
+    Returns:
+        list -- solutions, None for puzzles that are
+                malformed or have no solution
+    """
+    return [_solve_item(line, backend, False, cache, cache_file, variant)[1]
+            for line in lines]
+
+
+def solve_many(lines, workers=None, chunk_size=64, backend='bitmask', profile=False,
+               cache=False, cache_file=None, variant='classic'):
+    """
+    Solve puzzles over a process pool
+
+    Solutions are yielded as soon as they
+    are ready, in input order. Input is read
+    in windows of a few chunks per worker, so
+    memory does not depend on its length.
+
+    Arguments:
+        lines {iterable} -- one-line puzzles or arrays of 81 cells,
+                            or (puzzle, variants.Variant) pairs
+
+    Keyword Arguments:
+        workers {int} -- number of processes, 1 solves
+                         in this process (default: {cpu count})
+        chunk_size {int} -- puzzles sent to a worker at once
+        backend {str} -- solver backend (default: {'bitmask'})
+        profile {bool} -- collect solver statistics (default: {False})
+        cache {bool} -- check a SolutionCache first (default: {False})
+        cache_file {str} -- sqlite file of the cache, implies
+                            <cache> (default: {None})
+        variant {str} -- variant of puzzles that do not come
+                         with one (default: {'classic'})
+
+    Yields:
+        tuple -- (puzzle, solution or None, stats dict or None)
+    """
+    solve_item = functools.partial(
+        _solve_item, backend=backend, profile=profile,
+        cache=cache, cache_file=cache_file, variant=variant)
+    return imap_windows(solve_item, lines, workers, chunk_size)
+
+
+def solve_split(lines, jobs=None):
+    """
+    Solve puzzles one at a time, splitting the
+    search of every puzzle over a process pool
+    (see parallel.py). This suits a few hard
+    puzzles, <solve_many> is faster for many
+    easy ones.
+
+    Arguments:
+        lines {iterable} -- one-line puzzles or arrays of 81 cells
+
+    Keyword Arguments:
+        jobs {int} -- number of processes per puzzle (default: {cpu count})
+
+    Yields:
+        tuple -- (puzzle, solution or None, None)
+    """
+    from .parallel import solve
+
+    for line in lines:
+        grid = _grid_of(line)
+        solution = None if grid is None else solve(grid, jobs)
+        if solution is not None:
+            solution = format_puzzle(solution)
+        yield line, solution, None
+
+
+def grade_line(line):
+    """
+    Grade a one-line puzzle
+
+    Arguments:
+        line {str or array-like} -- puzzle to grade, a line
+                                    or an array of 81 cells
+
+    Returns:
+        Grade or None -- see logic.grade, None if
+                         the puzzle is malformed
+    """
+    grid = _grid_of(line)
+    if grid is None:
+        return None
+    return grade(grid)
+
+
+def _grade_item(line):
+    return line, grade_line(line)
+
+
+def grade_many(lines, workers=None, chunk_size=64):
+    """
+    Grade puzzles over a process pool
+
+    Grades are yielded in input order.
+
+    Arguments:
+        lines {iterable} -- one-line puzzles or arrays of 81 cells
+
+    Keyword Arguments:
+        workers {int} -- number of processes, 1 grades
+                         in this process (default: {cpu count})
+        chunk_size {int} -- puzzles sent to a worker at once
+
+    Yields:
+        tuple -- (puzzle, Grade or None)
+    """
+    return imap_windows(_grade_item, lines, workers, chunk_size)
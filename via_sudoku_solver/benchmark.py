@@ -0,0 +1,329 @@
+"""
+Reproducible benchmarks
+
+Puzzle sets are generated locally with fixed
+seeds, so every run measures the same work.
+Results (percentiles of per-item time and
+items per second) can be saved as a JSON
+baseline, and later runs compared against it.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from . import bulk, logic, validation
+from .cache import SolutionCache
+from .generator import generate
+from .solver import BACKENDS, get_solver
+from .symmetry import canonical_form
+
+
+# name -> target number of clues
+PUZZLE_SETS = (
+    ('easy', 40),
+    ('medium', 32),
+    ('hard', 26),
+    # generation stops at the fewest clues
+    # that still give a unique solution
+    ('minimal', 17),
+)
+
+# non-GUI entry points: (module, cold import budget in
+# seconds, modules it must not import on the way)
+IMPORT_BUDGETS = (
+    ('via_sudoku_solver.cli', 0.1, ('numpy', 'cv2', 'tkinter')),
+    ('via_sudoku_solver.solver', 0.05, ('numpy', 'cv2', 'tkinter')),
+    ('via_sudoku_solver.parallel', 0.05, ('numpy', 'cv2', 'tkinter')),
+    ('via_sudoku_solver.batch', 0.5, ('cv2', 'tkinter')),
+    ('via_sudoku_solver.board', 0.5, ('cv2', 'tkinter')),
+)
+
+# run in a fresh interpreter for every measurement
+_IMPORT_SCRIPT = (
+    'import json, sys, time\n'
+    'start = time.perf_counter()\n'
+    'import {module}\n'
+    'elapsed = time.perf_counter() - start\n'
+    'print(json.dumps([elapsed, [name for name in {forbidden!r} if name in sys.modules]]))\n'
+)
+
+BUNDLED_BOARD = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'boards', 'board_1.board'
+)
+
+
+def puzzle_sets(size=20, seed=0):
+    """
+    Generate the benchmark puzzle sets
+
+    Keyword Arguments:
+        size {int} -- puzzles per set (default: {20})
+        seed {int} -- base seed (default: {0})
+
+    Returns:
+        dict -- set name -> list of 9x9 puzzles
+    """
+    sets = {}
+    for k, (name, clues) in enumerate(PUZZLE_SETS):
+        sets[name] = [
+            generate(clues, seed='bench-{}-{}-{}'.format(seed, k, i))[0]
+            for i in range(size)
+        ]
+    if os.path.exists(BUNDLED_BOARD):
+        from . import formats
+        nums, const_nums = next(formats.read_boards(BUNDLED_BOARD))
+        sets['bundled'] = [(nums * const_nums).tolist()]
+    return sets
+
+
+def summarize(times):
+    """
+    Summary of per-item times
+
+    Arguments:
+        times {list} -- seconds per item
+
+    Returns:
+        dict -- count, mean, p50, p90, p99 (s) and per_sec
+    """
+    times = np.asarray(times, dtype='float64')
+    total = times.sum()
+    return {
+        'count': int(times.size),
+        'mean': float(times.mean()),
+        'p50': float(np.percentile(times, 50)),
+        'p90': float(np.percentile(times, 90)),
+        'p99': float(np.percentile(times, 99)),
+        'per_sec': float(times.size / total) if total > 0 else 0.0,
+    }
+
+
+def _timed(function, items, setup=None):
+    # <setup> runs before every call, untimed
+    times = []
+    for item in items:
+        if setup is not None:
+            setup(item)
+        start = time.perf_counter()
+        function(item)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def bench_solvers(sets):
+    results = {}
+    for backend in BACKENDS:
+        for name, puzzles in sets.items():
+            results['solve/{}/{}'.format(backend, name)] = summarize(_timed(
+                lambda puzzle: get_solver(puzzle, backend).solve(), puzzles))
+    return results
+
+
+def bench_grading(sets):
+    results = {}
+    for name, puzzles in sets.items():
+        results['grade/{}'.format(name)] = summarize(_timed(logic.grade, puzzles))
+    return results
+
+
+def bench_cache(sets):
+    results = {}
+    puzzles = [puzzle for name in sorted(sets) for puzzle in sets[name]]
+    results['canonical_form'] = summarize(_timed(canonical_form, puzzles))
+    cache = SolutionCache()
+    for puzzle in puzzles:
+        cache.solve(puzzle)
+    # transposed puzzles hit through the canonical form
+    results['cache/hit'] = summarize(_timed(
+        lambda puzzle: cache.solve(np.asarray(puzzle).T), puzzles))
+    return results
+
+
+def bench_auto_solve(sets):
+    from .board import SudokuBoard
+    results = {}
+    board = SudokuBoard()
+    for name, puzzles in sets.items():
+        results['auto_solve/{}'.format(name)] = summarize(_timed(
+            lambda _: board.auto_solve(), puzzles, setup=board.set_nums))
+    return results
+
+
+def bench_generation(size, seed):
+    from .board import SudokuBoard
+    results = {}
+    seeds = ['bench-generate-{}-{}'.format(seed, i) for i in range(size)]
+    results['generate'] = summarize(_timed(
+        lambda item_seed: generate(30, seed=item_seed), seeds))
+    board = SudokuBoard()
+    results['fill_random'] = summarize(_timed(
+        lambda item_seed: board.fill_random(30, seed=item_seed), seeds))
+    return results
+
+
+def bench_validation(sets):
+    from .board import SudokuBoard
+    results = {}
+    puzzles = [puzzle for name in sorted(sets) for puzzle in sets[name]]
+    board = SudokuBoard()
+    board.set_nums(puzzles[0])
+    results['is_correct'] = summarize(_timed(
+        lambda _: board.is_correct(), range(1000)))
+
+    boards = np.repeat(np.asarray(puzzles, dtype='uint8'), 1000, axis=0)
+    start = time.perf_counter()
+    validation.validate_boards(boards)
+    elapsed = time.perf_counter() - start
+    results['validate_boards'] = summarize([elapsed / len(boards)] * len(boards))
+    return results
+
+
+def bench_bulk(sets, repeat=100):
+    results = {}
+    for name, puzzles in sets.items():
+        boards = np.repeat(np.asarray(puzzles, dtype='uint8'), repeat, axis=0)
+        start = time.perf_counter()
+        bulk.solve_boards(boards)
+        elapsed = time.perf_counter() - start
+        results['bulk/{}'.format(name)] = summarize([elapsed / len(boards)] * len(boards))
+    return results
+
+
+def bench_rendering(sets, width=600):
+    from .board import SudokuBoard
+    results = {}
+    board = SudokuBoard(width)
+    puzzles = sets['medium']
+
+    def full_frame(puzzle):
+        board.set_nums(puzzle)
+        board.const_nums = np.asarray(puzzle) != 0
+        board.numpy()
+    results['render/full'] = summarize(_timed(full_frame, puzzles))
+
+    cells = [(i, j) for i in range(9) for j in range(9)]
+
+    def cell_frame(cell):
+        board.set_cell(cell[0], cell[1], (int(board.nums[cell]) % 9) + 1)
+        board.numpy()
+    results['render/cell'] = summarize(_timed(cell_frame, cells))
+
+    results['render/idle'] = summarize(_timed(lambda _: board.numpy(), range(1000)))
+    return results
+
+
+def bench_imports(repeat=5):
+    """
+    Time cold imports of the non-GUI entry points,
+    every summary also lists the forbidden modules
+    the import pulled in under 'leaked'
+    """
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {}
+    for module, _, forbidden in IMPORT_BUDGETS:
+        script = _IMPORT_SCRIPT.format(module=module, forbidden=forbidden)
+        times = []
+        leaked = set()
+        for _ in range(repeat):
+            output = subprocess.run(
+                [sys.executable, '-c', script], cwd=package_dir,
+                check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+            elapsed, names = json.loads(output)
+            times.append(elapsed)
+            leaked.update(names)
+        summary = summarize(times)
+        summary['leaked'] = sorted(leaked)
+        results['import/{}'.format(module)] = summary
+    return results
+
+
+def check_imports(results, metric='p50'):
+    """
+    Find entry points over their import budget
+    or importing GUI or heavy modules
+
+    Arguments:
+        results {dict} -- results of <bench_imports>
+
+    Returns:
+        list -- messages, empty if all budgets hold
+    """
+    problems = []
+    for module, budget, _ in IMPORT_BUDGETS:
+        summary = results.get('import/{}'.format(module))
+        if summary is None:
+            continue
+        if summary[metric] > budget:
+            problems.append('{} imports in {:.1f} ms, budget {:.1f} ms'.format(
+                module, summary[metric] * 1000, budget * 1000))
+        if summary['leaked']:
+            problems.append('{} imports {}'.format(module, ', '.join(summary['leaked'])))
+    return problems
+
+
+def run(size=20, seed=0, render=True):
+    """
+    Run all the benchmarks
+
+    Keyword Arguments:
+        size {int} -- puzzles per set (default: {20})
+        seed {int} -- base seed of puzzle sets (default: {0})
+        render {bool} -- benchmark rendering, needs cv2 (default: {True})
+
+    Returns:
+        dict -- benchmark name -> summary
+    """
+    sets = puzzle_sets(size, seed)
+    results = {}
+    results.update(bench_solvers(sets))
+    results.update(bench_grading(sets))
+    results.update(bench_cache(sets))
+    results.update(bench_auto_solve(sets))
+    results.update(bench_generation(size, seed))
+    results.update(bench_validation(sets))
+    results.update(bench_bulk(sets))
+    results.update(bench_imports())
+    if render:
+        results.update(bench_rendering(sets))
+    return results
+
+
+def save(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(results, baseline, threshold=0.25, metric='p50'):
+    """
+    Find benchmarks slower than the baseline
+
+    Arguments:
+        results {dict} -- current results
+        baseline {dict} -- saved results
+
+    Keyword Arguments:
+        threshold {float} -- allowed relative slowdown (default: {0.25})
+        metric {str} -- summary field to compare (default: {'p50'})
+
+    Returns:
+        list -- (name, baseline value, current value) of regressions
+    """
+    regressions = []
+    for name, summary in sorted(results.items()):
+        if name not in baseline:
+            continue
+        before = baseline[name][metric]
+        after = summary[metric]
+        if before > 0 and after > before * (1 + threshold):
+            regressions.append((name, before, after))
+    return regressions
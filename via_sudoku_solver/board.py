@@ -1,100 +1,321 @@
+import collections
+
 import numpy as np
-import cv2
+
+from . import formats, logic, validation
+from .feedback import DEFAULT_BUDGET, SolvabilityCheck
+from .generator import generate, generate_killer
+from .geometry import SYMBOLS, geometry_of
+from .solver import solve
+from .state import BoardState
+from .variants import compile_rules, get_rules
+
+
+# moves of the user that can be undone
+MAX_UNDO = 1000
 
 
 class SudokuBoard:
-    def __init__(self, width=600):
-        self.board = np.ones(shape=(width + 50, width, 3), dtype='uint8') * 255
+    def __init__(self, width=600, box=3, cache=None, pool=None, rules=None,
+                 check_budget=DEFAULT_BUDGET):
+        """
+        Keyword Arguments:
+            width {int} -- width of the board (px) (default: {600})
+            box {int} -- box size, 2 for 4x4, 3 for 9x9, 4 for 16x16
+                         and 5 for 25x25 boards (default: {3})
+            cache {SolutionCache} -- cache checked by
+                                     <auto_solve> (default: {None})
+            pool {PuzzlePool} -- ready puzzles taken by
+                                 <fill_random> (default: {None})
+            rules {variants.Rules} -- rules of a variant, classic
+                                      if None (default: {None})
+            check_budget {float} -- seconds the solvability check of
+                                    a move may take before it goes
+                                    to the background (default: {0.005})
+        """
         self.width = width
-        ################
-        # drawing grid #
-        ################
-
-        # not bold lines
-        for i in range(9):
-            cv2.line(
-                self.board,
-                (0, (self.width * i) // 9),
-                (self.width, (self.width * i) // 9),
-                (0, 0, 0), 1)
-        for i in range(9):
-            cv2.line(
-                self.board,
-                ((self.width * i) // 9, 0),
-                ((self.width * i) // 9, self.width),
-                (0, 0, 0), 1)
-
-        # bold lines
-        cv2.line(self.board, (self.width // 3, 0),
-                 (self.width // 3, self.width), (0, 0, 0), 5)
-        cv2.line(self.board, ((self.width * 2) // 3, 0),
-                 ((self.width * 2) // 3, self.width), (0, 0, 0), 5)
-        cv2.line(self.board, (0, self.width // 3),
-                 (self.width, self.width // 3), (0, 0, 0), 5)
-        cv2.line(self.board, (0, (self.width * 2) // 3),
-                 (self.width, (self.width * 2) // 3), (0, 0, 0), 5)
-
-        # numbers
-        self.nums = np.zeros(shape=(9, 9), dtype='int')
-        self.const_nums = np.zeros(shape=(9, 9), dtype='bool_')
+        self.cache = cache
+        self.pool = pool
+        self.check_budget = check_budget
+        self.solvability = None
+        self._selected_cell = None
+        self._hint_cell = None
+        # message shown in the status bar
+        self.status_text = None
+        self.resize(box, rules)
+
+    def resize(self, box, rules=None):
+        """
+        Make the board empty with
+        <box> x <box> boxes
+
+        Arguments:
+            box {int} -- box size
+
+        Keyword Arguments:
+            rules {variants.Rules} -- rules of a variant, classic
+                                      if None (default: {None})
+        """
+        self.rules = rules or get_rules('classic', box)
+        self.geometry = self.rules.geometry
+        self.box = box
+        self.size = size = box * box
+        # created on the first frame
+        self.renderer = None
+
+        # cells whose digit breaks a rule
+        self.conflict_cells = set()
+        # whether the board can still be completed,
+        # None while unknown
+        self.solvable = None
+        if self.solvability is not None:
+            self.solvability.cancel()
+        self.solvability = SolvabilityCheck(self.rules, self.check_budget)
+
+        # cells to redraw, None for all of them
+        self.dirty_cells = None
+
+        # numbers and occupancy counts,
+        # <nums> is a view of its values
+        self.state = BoardState(box, rules=self.rules)
+        self.nums = self.state.numpy()
+        self.const_nums = np.zeros(shape=(size, size), dtype='bool_')
+        self._reset_moves()
 
         self.selected_cell = None
+        self.hint_cell = None
+
+    @property
+    def selected_cell(self):
+        return self._selected_cell
+
+    @selected_cell.setter
+    def selected_cell(self, cell):
+        if cell is not None:
+            cell = (int(cell[0]), int(cell[1]))
+        self._mark_dirty(self._selected_cell)
+        self._mark_dirty(cell)
+        self._selected_cell = cell
+
+    @property
+    def hint_cell(self):
+        return self._hint_cell
+
+    @hint_cell.setter
+    def hint_cell(self, cell):
+        self._mark_dirty(self._hint_cell)
+        self._mark_dirty(cell)
+        self._hint_cell = cell
+
+    @property
+    def conflicts(self):
+        # number of repeated digits over all units
+        # and of broken cages
+        return self.state.conflicts
+
+    @property
+    def filled(self):
+        # number of non-empty cells
+        return self.state.filled
+
+    @property
+    def const_nums(self):
+        return self._const_nums
+
+    @const_nums.setter
+    def const_nums(self, const_nums):
+        self._const_nums = const_nums
+        self.dirty_cells = None
+
+    def _mark_dirty(self, cell):
+        if cell is not None and self.dirty_cells is not None:
+            self.dirty_cells.add(cell)
+
+    def take_dirty_cells(self):
+        """
+        Get cells changed since the
+        previous call and reset them
 
-    def is_correct(self):
+        Returns:
+            set or None -- (row, col) of changed cells,
+                           None if the whole board changed
+        """
+        dirty_cells = self.dirty_cells
+        self.dirty_cells = set()
+        return dirty_cells
+
+    def set_cell(self, row, col, value):
         """
-        Check whether it's correct 
-        to fill <num> into selected
-        cell
+        Write <value> into the cell keeping
+        occupancy counts up to date.
+        All the writes into the board
+        should go through this method.
 
         Arguments:
-            num {int} -- number under consideration
-        """
-
-        # go through grid
-        for i in range(3):
-            for j in range(3):
-                numbers = {x: False for x in range(1, 10)}
-                offset_i = i * 3
-                offset_j = j * 3
-                for i_1 in range(3):
-                    for j_1 in range(3):
-                        cell_value = self.nums[i_1 + offset_i, j_1 + offset_j]
-                        # pass empty cells
-                        if cell_value == 0:
-                            continue
-                        # if number repeats
-                        if numbers[cell_value] is True:
-                            return False
-                        numbers[cell_value] = True
-
-        # go through rows
-        for i in range(9):
-            numbers = {x: False for x in range(1, 10)}
-            for j in range(9):
-                cell_value = self.nums[i, j]
-                # pass empty cells
-                if cell_value == 0:
-                    continue
-                # if number repeats
-                if numbers[cell_value] is True:
-                    return False
-                numbers[cell_value] = True
-
-        # go through columns
-        for j in range(9):
-            numbers = {x: False for x in range(1, 10)}
-            for i in range(9):
-                cell_value = self.nums[i, j]
-                # pass empty cells
-                if cell_value == 0:
-                    continue
-                # if number repeats
-                if numbers[cell_value] is True:
-                    return False
-                numbers[cell_value] = True
+            row {int} -- row of the cell
+            col {int} -- column of the cell
+            value {int} -- number to write, 0 to empty the cell
+        """
+        value = int(value)
+        if self.state.set(row * self.size + col, value) == value:
+            return
+        self._cell_changed(row, col)
+
+    def _cell_changed(self, row, col):
+        self._mark_dirty((row, col))
+        # only the cell and its peers can change
+        # whether they are in conflict
+        idx = row * self.size + col
+        for cell in [idx] + self.rules.peers[idx]:
+            in_conflict = self.state.in_conflict(cell)
+            if in_conflict != (cell in self.conflict_cells):
+                if in_conflict:
+                    self.conflict_cells.add(cell)
+                else:
+                    self.conflict_cells.discard(cell)
+                self._mark_dirty(divmod(cell, self.size))
+        if (row, col) == self.hint_cell:
+            self.hint_cell = None
+            self.status_text = None
+
+    def set_nums(self, nums, move=False):
+        """
+        Write the whole grid
+        through <set_cell>
+
+        Arguments:
+            nums {NxN array-like} -- numbers to write
 
+        Keyword Arguments:
+            move {bool} -- record the writes as one move
+                           of the user, e.g. for a solution
+                           (default: {False})
+        """
+        checkpoint = self.state.checkpoint()
+        for i in range(self.size):
+            for j in range(self.size):
+                self.set_cell(i, j, nums[i][j])
+        if move:
+            self._end_move(checkpoint)
+        else:
+            self.check_solvable()
+
+    def _reset_moves(self):
+        # checkpoints of the state before every move,
+        # the oldest ones are dropped past MAX_UNDO
+        self.undo_moves = collections.deque(maxlen=MAX_UNDO)
+        # (cell, value) writes of undone moves, latest first
+        self.redo_moves = []
+
+    def _end_move(self, checkpoint):
+        """
+        Record writes made since <checkpoint>
+        as one move and forget undone moves
+        """
+        if self.state.checkpoint() == checkpoint:
+            return
+        self.redo_moves.clear()
+        self._push_move(checkpoint)
+        self.check_solvable()
+
+    def _push_move(self, checkpoint):
+        self.undo_moves.append(checkpoint)
+        # writes before the oldest move kept are not needed
+        self.state.history.forget(self.undo_moves[0])
+
+    def undo(self):
+        """
+        Undo the last move of the user
+
+        Returns:
+            bool -- whether there was a move to undo
+        """
+        if not self.undo_moves:
+            return False
+        changes = self.state.undo(self.undo_moves.pop())
+        for idx, _ in changes:
+            self._cell_changed(*divmod(idx, self.size))
+        self.redo_moves.append(changes)
+        self.selected_cell = None
+        self.check_solvable()
+        return True
+
+    def redo(self):
+        """
+        Redo the last undone move
+
+        Returns:
+            bool -- whether there was a move to redo
+        """
+        if not self.redo_moves:
+            return False
+        checkpoint = self.state.checkpoint()
+        for idx, value in reversed(self.redo_moves.pop()):
+            self.set_cell(*divmod(idx, self.size), value)
+        self._push_move(checkpoint)
+        self.selected_cell = None
+        self.check_solvable()
         return True
 
+    def check_solvable(self):
+        """
+        Check whether the board can still be
+        completed, see feedback.SolvabilityCheck
+
+        Returns:
+            bool or None -- <solvable>, None while
+                            the check runs in the background
+        """
+        self.solvable = self.solvability.update(self.state.values, self.conflicts)
+        return self.solvable
+
+    def poll_solvability(self):
+        """
+        Take the result of a background
+        solvability check once it is done
+
+        Returns:
+            bool -- whether <solvable> changed
+        """
+        solvable = self.solvability.poll()
+        if solvable is None:
+            return False
+        self.solvable = solvable
+        return True
+
+    def is_correct(self):
+        """
+        Check whether there are
+        no repeated numbers in any
+        row, column, box or group of
+        the variant and no broken cage
+        """
+        return validation.is_correct(self.nums, self.rules)
+
+    def check_state(self):
+        """
+        Check the incremental state against a
+        state rebuilt from the grid, and its
+        conflicts against the validator
+
+        Raises:
+            AssertionError -- if they disagree
+        """
+        state = self.state
+        fresh = BoardState.from_grid(self.nums, self.rules)
+        assert state.counts == fresh.counts, 'occupancy counts drifted'
+        assert state.filled == fresh.filled, 'filled count drifted'
+        assert state.cage_sums == fresh.cage_sums, 'cage sums drifted'
+        assert state.cage_filled == fresh.cage_filled, 'cage counts drifted'
+        assert (state.conflicts == 0) == self.is_correct(), 'conflicts disagree with validation'
+
+    def is_solved(self):
+        """
+        Check whether the board
+        is filled and correct
+        """
+        return self.filled == self.geometry.cells and self.conflicts == 0
+
     '''def fill_random(self, num):
         """
         Fills the board randomly
@@ -125,212 +346,124 @@ class SudokuBoard:
         x = self.selected_cell[0]
         y = self.selected_cell[1]
         self.const_nums[x, y] = not self.const_nums[x, y]
+        self._mark_dirty((x, y))
 
-    def fill_random(self, num, max_trials=50):
+    def fill_random(self, num, seed=None):
         """
-        Fills the board randomly
+        Fills the board with a random
+        puzzle that has a unique solution,
+        taken from the pool if there is one.
+        Killer boards get new cages.
+
         Arguments:
             num {int} -- Number of cells to fill
+
+        Keyword Arguments:
+            seed {int} -- seed for reproducible boards,
+                          bypasses the pool, which only
+                          keeps classic puzzles (default: {None})
         """
-        assert num >= 0 and num <= 81
+        assert num >= 0 and num <= self.geometry.cells
         self.clear()
-        filled = 0
-        total_trials = 0
-        trials_to_fill_cell = 0
-        while filled != num:
-            if trials_to_fill_cell == max_trials:
-                trials_to_fill_cell = 0
-                filled = 0
-                self.clear()
-            # generate random position
-            i = np.random.randint(0, 9)
-            j = np.random.randint(0, 9)
-            
-
-            # # if position is free
-            # if self.nums[i, j] is not None:
-            # find number that's fit
-
-            is_filled = self.nums[i, j]
-            trials_to_fill_cell += 1
-            trials = 0
-            number_to_fill = np.random.randint(1, 9)
-            self.nums[i, j] = number_to_fill
-            while not self.is_correct():
-                number_to_fill = number_to_fill % 9 + 1
-                self.nums[i, j] = number_to_fill
-                trials += 1
-                if trials == 10:
-                    self.nums[i, j] = 0
-                    break
-            else:
-                self.const_nums[i, j] = True
-                total_trials += trials_to_fill_cell
-                filled += 0 if is_filled else 1
-                trials_to_fill_cell = 0
+        if self.rules.name == 'killer':
+            puzzle, solution, rules = generate_killer(num, seed=seed, box=self.box)
+            self.resize(self.box, rules)
+        elif not self.rules.is_classic:
+            puzzle, solution = generate(num, seed=seed, box=self.box, rules=self.rules)
+        elif self.pool is not None and seed is None:
+            puzzle, solution = self.pool.get(num, self.box)
+        else:
+            puzzle, solution = generate(num, seed=seed, box=self.box)
+        # the solution answers the checks of the first moves
+        self.solvability.reset(solution)
+        self.set_nums(puzzle)
+        self.const_nums = self.nums != 0
 
     def fill_from_file(self, path_to_board):
-        nums = np.zeros_like(self.nums)
-        with open(path_to_board) as f:
-            for i, line in enumerate(f):
-                values = [int(symbol) for symbol in line.rstrip()]
-                for j in range(9):
-                    if i < 9:
-                        self.nums[i, j] = values[j]
-                    else:
-                        self.const_nums[i % 9, j] = values[j]
+        """
+        Load the first board of a .board file,
+        the board takes the size and the
+        variant of the loaded one
+
+        Arguments:
+            path_to_board {str} -- path to the file
+        """
+        nums, const_nums, variant = next(formats.read_boards(path_to_board, variants=True))
+        rules = compile_rules(variant)
+        if len(nums) != self.size or rules is not self.rules:
+            self.resize(geometry_of(nums).box, rules)
+        formats.load_into_board(self, (nums, const_nums))
         self.selected_cell = None
 
     def save_to_file(self, path_to_board):
-        with open(path_to_board, 'w+') as f:
-            for i in range(self.nums.shape[0]):
-                line = ''.join(str(num) for num in self.nums[i])
-                print(line, file=f)
-
-            for i in range(self.const_nums.shape[0]):
-                line = ''.join(str(int(num)) for num in self.const_nums[i])
-                print(line, file=f)
+        """
+        Save the board in the .board format
+
+        Arguments:
+            path_to_board {str} -- path to the file
+        """
+        formats.write_boards([(self.nums, self.const_nums, self.rules.variant)], path_to_board)
         self.selected_cell = None
 
-    def auto_solve(self):
+    def auto_solve(self, backend='bitmask'):
         """
         Automatically solve the Sudoku
+
+        The board is left untouched
+        if there is no solution. Variants
+        bypass the cache.
+
+        Keyword Arguments:
+            backend {str} -- solver backend, see
+                             solver.BACKENDS (default: {'bitmask'})
+
+        Returns:
+            np.ndarray or None -- solved board
         """
-        correct_board = None
-        positions_stack = []
-        # value to continue from
-        # for heighest element in stack
-        next_value = 1
-        while True:
-            print('\r[INFO] Filled: {:5}'.format(len(positions_stack)), end='')
-            if not (self.nums == 0).any():
-                break
-            for i in range(9):
-                break_cycle = False
-                for j in range(9):
-                    if self.nums[i, j] != 0:
-                        continue
-                    for value in range(next_value + 1, 10):
-                        self.nums[i, j] = value
-                        if self.is_correct():
-                            break
-                        else:
-                            self.nums[i, j] = 0
-                    else:  # if there is no possible filler
-                        if len(positions_stack) == 0:
-                            print('\n[INFO] There is no solution!')
-                            return None
-                        last_filled = positions_stack[-1]
-                        positions_stack = positions_stack[:-1]
-                        next_value = self.nums[last_filled[0], last_filled[1]]
-                        self.nums[last_filled[0], last_filled[1]] = 0
-                        break_cycle = True
-                        break
+        if self.cache is not None and self.rules.is_classic:
+            solution = self.cache.solve(self.nums, backend)
+        else:
+            solution = solve(self.nums, backend, self.rules)
+        if solution is None:
+            print('[INFO] There is no solution!')
+            return None
+        self.set_nums(solution, move=True)
+        return self.nums
 
-                    positions_stack.append((i, j))
-                    next_value = 0
-                    break_cycle = True
-                    break
-                if break_cycle:
-                    break
+    def show_hint(self):
+        """
+        Highlight the next cell that can
+        be filled by logic alone and show
+        the technique that fills it
+
+        Returns:
+            logic.Hint or None -- the hint
+        """
+        hint = logic.next_hint(self.nums)
+        if hint is None:
+            print('[INFO] No hint found!')
+            return None
+        self.hint_cell = (hint.row, hint.col)
+        self.status_text = 'Hint: {}'.format(hint.techniques[-1].replace('_', ' '))
+        return hint
 
     def numpy(self):
-        cell_size = self.width / 9
-        board = self.board.copy()
-
-        # const cells
-        for i in range(9):
-            for j in range(9):
-                if self.const_nums[i, j] == True:
-                    x = int(j * cell_size)
-                    y = int(i * cell_size)
-                    cv2.rectangle(
-                        board,
-                        (x, y),
-                        (int(x + cell_size), int(y + cell_size)),
-                        (200, 200, 0),
-                        -1
-                    )
-
-        # display selected cell
-        if self.selected_cell is not None:
-            x = int(self.selected_cell[1] * cell_size)
-            y = int(self.selected_cell[0] * cell_size)
-            cv2.rectangle(
-                board,
-                (x, y),
-                (int(x + cell_size), int(y + cell_size)),
-                (200, 150, 200),
-                -1
-            )
-
-        ################
-        # drawing grid #
-        ################
-
-        # not bold lines
-        for i in range(9):
-            cv2.line(
-                board,
-                (0, (self.width * i) // 9),
-                (self.width, (self.width * i) // 9),
-                (0, 0, 0), 1)
-        for i in range(9):
-            cv2.line(
-                board,
-                ((self.width * i) // 9, 0),
-                ((self.width * i) // 9, self.width),
-                (0, 0, 0), 1)
-            # bold lines
-        cv2.line(board, (self.width // 3, 0),
-                 (self.width // 3, self.width), (0, 0, 0), 5)
-        cv2.line(board, ((self.width * 2) // 3, 0),
-                 ((self.width * 2) // 3, self.width), (0, 0, 0), 5)
-        cv2.line(board, (0, self.width // 3),
-                 (self.width, self.width // 3), (0, 0, 0), 5)
-        cv2.line(board, (0, (self.width * 2) // 3),
-                 (self.width, (self.width * 2) // 3), (0, 0, 0), 5)
-
-        # draw numbers
-        for i in range(self.nums.shape[0]):
-            for j in range(self.nums.shape[1]):
-                if self.nums[i, j] == 0:
-                    continue
-                # I just tried and tried
-                # to make it fit into cell
-                # don't touch it!!
-                x = int(cell_size // 2 + j * cell_size - 0.15 * cell_size)
-                y = int(cell_size // 2 + i * cell_size + 0.18 * cell_size)
-                cv2.putText(board, str(self.nums[i, j]), (x, y), cv2.FONT_HERSHEY_SIMPLEX, 1,
-                            (0, 0, 0), 2, cv2.LINE_AA)
-
-        # correctess bar
-        cv2.line(
-            board,
-            (0, self.width),
-            (self.width, self.width),
-            (0, 0, 0),
-            5
-        )
-        color = (0, 255, 0) if self.is_correct() else (0, 0, 255)
-        cv2.rectangle(
-            board,
-            (0, self.width),
-            (self.width, self.width + 50),
-            color,
-            -1
-        )
-
-        # winning condition
-        if not (self.nums == 0).any() and self.is_correct():
-            cv2.putText(board, 'Win!', (self.width // 2, self.width + 35), cv2.FONT_HERSHEY_SIMPLEX, 1,
-                        (0, 0, 0), 2, cv2.LINE_AA)
-
-        return board
+        """
+        Render the board
+
+        Returns:
+            np.ndarray -- image of the board, it is
+                          reused by the next call
+        """
+        if self.renderer is None:
+            # cv2 is only needed to render
+            from .render import BoardRenderer
+            self.renderer = BoardRenderer(self.width, self.box, self.rules)
+        return self.renderer.render(self)
 
     def select_cell(self, row, col, select_const=False):
-        assert 0 <= row < 9
-        assert 0 <= col < 9
+        assert 0 <= row < self.size
+        assert 0 <= col < self.size
         # we cannot fill constant cells
         if self.const_nums[row, col] == True and not select_const:
             self.selected_cell = None
@@ -353,34 +486,47 @@ class SudokuBoard:
 
         # if it's backspace
         if ord(filler) == 8:
-            self.nums[self.selected_cell[0], self.selected_cell[1]] = 0
+            checkpoint = self.state.checkpoint()
+            self.set_cell(self.selected_cell[0], self.selected_cell[1], 0)
+            self._end_move(checkpoint)
             self.selected_cell = None
             return None
 
-        # convert to integer
-        try:
-            filler = int(filler)
-        except Exception as e:
+        # convert to integer, capital letters
+        # are used for numbers above 9
+        filler = SYMBOLS.find(filler) + 1
+        if filler == 0:
             print('[INFO] Not supported character!')
             return None
 
         # check if filler is appropriate
-        if not any(np.array([1, 2, 3, 4, 5, 6, 7, 8, 9]) == filler):
+        if filler > self.size:
             return None
 
         # fill into selected cell
-        self.nums[self.selected_cell[0], self.selected_cell[1]] = filler
+        checkpoint = self.state.checkpoint()
+        self.set_cell(self.selected_cell[0], self.selected_cell[1], filler)
+        self._end_move(checkpoint)
 
         # stop selection
         self.selected_cell = None
 
-        print('[INFO] Fitness: {}'.format(self.__fit()))
+        print('[INFO] Conflicts: {}'.format(self.conflicts))
 
     def clear(self, keep_const=False):
-        for i in range(9):
-            for j in range(9):
-                if not keep_const or not self.const_nums[i, j]:
-                    self.nums[i, j] = 0
-        if not keep_const:
-            self.const_nums = np.zeros(shape=(9, 9), dtype='bool_')
+        if keep_const:
+            checkpoint = self.state.checkpoint()
+            for i, j in zip(*np.nonzero((self.nums != 0) & ~self.const_nums)):
+                self.set_cell(int(i), int(j), 0)
+            self._end_move(checkpoint)
+        else:
+            self.state.clear()
+            self._reset_moves()
+            self.const_nums = np.zeros(shape=(self.size, self.size), dtype='bool_')
+            self.conflict_cells.clear()
+            self.solvability.reset()
+            self.solvable = None
         self.selected_cell = None
+        if self.hint_cell is not None:
+            self.hint_cell = None
+            self.status_text = None
@@ -0,0 +1,200 @@
+"""
+Vectorized propagation over stacks of boards
+
+Candidates of every cell of every board are
+kept in an (N, 81) bitmask array (bit d - 1
+for digit d) and naked and hidden singles
+are found for all the boards at once with
+array operations, until no board changes.
+Most puzzles are solved by singles alone,
+only the rest (the residue) goes to the
+per-board search.
+
+Every deduction follows from the givens, so
+a board that runs into a contradiction (an
+empty cell without candidates, a digit with
+no place in a unit or a repeated digit) has
+no solution.
+"""
+import collections
+import functools
+
+import numpy as np
+
+from .geometry import as_board_stack, geometry
+from .solver import get_solver
+
+
+DEFAULT_CHUNK_SIZE = 1 << 14
+
+# status of a board after propagation
+CONTRADICTION = -1
+STUCK = 0
+SOLVED = 1
+
+PropagationResult = collections.namedtuple('PropagationResult', ['grids', 'status'])
+
+BulkResult = collections.namedtuple('BulkResult', ['solutions', 'solved', 'propagated'])
+
+
+class _Tables:
+    def __init__(self, box):
+        geo = geometry(box)
+        size = geo.size
+        self.size = size
+        self.dtype = np.dtype('uint16' if size <= 16 else 'uint32')
+        self.units = np.array(geo.units, dtype='intp')
+        # rows, columns and boxes each cover
+        # every cell exactly once
+        self.unit_kinds = [self.units[k * size:(k + 1) * size] for k in range(3)]
+        self.cell_units = np.array(geo.cell_units, dtype='intp')
+        self.digit_bits = np.array(
+            [0] + [1 << d for d in range(size)], dtype=self.dtype)
+        self.all_digits = self.dtype.type((1 << size) - 1)
+        # digit of a single bit mask
+        self.digit_of = {1 << d: d + 1 for d in range(size)}
+
+
+@functools.lru_cache(maxsize=None)
+def _tables(box):
+    return _Tables(box)
+
+
+def _digits_of(masks, tables):
+    """
+    Digits of single bit masks
+    """
+    digits = np.zeros(masks.shape, dtype='uint8')
+    for bit, digit in tables.digit_of.items():
+        digits[masks == bit] = digit
+    return digits
+
+
+def _propagate_chunk(values, tables):
+    """
+    Propagate singles in place
+
+    Arguments:
+        values {np.ndarray} -- (n, cells) values, 0 for empty cells
+
+    Returns:
+        np.ndarray -- (n,) status
+    """
+    n = values.shape[0]
+    status = np.full(n, STUCK, dtype='int8')
+    # boards still changing
+    active = np.arange(n)
+    while active.size:
+        board = values[active]
+        bits = tables.digit_bits[board]
+        units = bits[:, tables.units]
+        used = np.bitwise_or.reduce(units, axis=2)
+        repeated = (used != units.sum(axis=2, dtype=tables.dtype)).any(axis=1)
+        empty = board == 0
+        done = ~repeated & ~empty.any(axis=1)
+        status[active[done]] = SOLVED
+
+        forbidden = np.bitwise_or.reduce(used[:, tables.cell_units], axis=2)
+        candidates = np.where(empty, ~forbidden & tables.all_digits, 0).astype(tables.dtype)
+
+        # a digit without a place in a unit
+        unit_candidates = np.bitwise_or.reduce(candidates[:, tables.units], axis=2)
+        missing = ((unit_candidates | used) != tables.all_digits).any(axis=1)
+        stuck_cell = (empty & (candidates == 0)).any(axis=1)
+
+        # naked singles
+        forced = np.where(candidates & (candidates - 1) == 0, candidates, 0)
+
+        # hidden singles: digits with exactly one
+        # place in a unit, for rows, columns and boxes
+        for kind in tables.unit_kinds:
+            kind_candidates = candidates[:, kind]
+            once = np.zeros(kind_candidates.shape[:2], dtype=tables.dtype)
+            twice = np.zeros_like(once)
+            for pos in range(tables.size):
+                masks = kind_candidates[:, :, pos]
+                twice |= once & masks
+                once |= masks
+            single = once & ~twice
+            for pos in range(tables.size):
+                forced[:, kind[:, pos]] |= kind_candidates[:, :, pos] & single
+
+        # a cell forced to two digits
+        conflicting = (forced & (forced - 1) != 0).any(axis=1)
+        contradiction = ~done & (repeated | missing | stuck_cell | conflicting)
+        status[active[contradiction]] = CONTRADICTION
+
+        values[active] = np.where(forced != 0, _digits_of(forced, tables), board)
+        # placements are checked on the next pass,
+        # boards without any are stuck
+        changed = ~contradiction & (forced != 0).any(axis=1)
+        active = active[changed]
+    return status
+
+
+def propagate(puzzles, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Fill every cell that naked and hidden
+    singles can fill, for all the boards at once
+
+    Arguments:
+        puzzles {array-like} -- (N, 81) or (N, 9, 9) puzzles,
+                                0 for empty cells, any
+                                supported size
+
+    Keyword Arguments:
+        chunk_size {int} -- number of boards processed at once
+
+    Returns:
+        PropagationResult -- (N, cells) uint8 grids after
+                             propagation and (N,) status:
+                             SOLVED, STUCK or CONTRADICTION
+    """
+    puzzles, geo = as_board_stack(puzzles)
+    tables = _tables(geo.box)
+    grids = puzzles.astype('uint8')
+    status = np.empty(len(grids), dtype='int8')
+    for start in range(0, len(grids), chunk_size):
+        stop = min(start + chunk_size, len(grids))
+        chunk = grids[start:stop]
+        # values outside the board are contradictions
+        invalid = (chunk > geo.size).any(axis=1)
+        original = chunk[invalid]
+        chunk[invalid] = 0
+        status[start:stop] = _propagate_chunk(chunk, tables)
+        status[start:stop][invalid] = CONTRADICTION
+        chunk[invalid] = original
+    return PropagationResult(grids, status)
+
+
+def solve_boards(puzzles, backend='bitmask', chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Solve a stack of boards, propagating singles
+    for all of them at once and searching only
+    the boards singles do not solve
+
+    Arguments:
+        puzzles {array-like} -- (N, 81) or (N, 9, 9) puzzles,
+                                0 for empty cells
+
+    Keyword Arguments:
+        backend {str} -- solver backend of the residue (default: {'bitmask'})
+        chunk_size {int} -- number of boards propagated at once
+
+    Returns:
+        BulkResult -- (N, cells) uint8 solutions (zeros if there
+                      is none), (N,) bool solved and (N,) bool
+                      solved by propagation alone
+    """
+    grids, status = propagate(puzzles, chunk_size)
+    size = int(round(grids.shape[1] ** 0.5))
+    solved = status == SOLVED
+    propagated = solved.copy()
+    solutions = np.where(solved[:, np.newaxis], grids, 0).astype('uint8')
+    for index in np.flatnonzero(status == STUCK):
+        grid = grids[index].reshape(size, size).tolist()
+        solution = get_solver(grid, backend).solve()
+        if solution is not None:
+            solutions[index] = np.asarray(solution, dtype='uint8').ravel()
+            solved[index] = True
+    return BulkResult(solutions, solved, propagated)
@@ -0,0 +1,196 @@
+"""
+Cache of solutions shared by symmetric puzzles
+
+Solutions are stored under the canonical
+form of the puzzle (see symmetry.py) and
+mapped back through the inverse transform,
+so a puzzle hits the cache if any puzzle
+equivalent to it was solved before.
+
+The canonical form takes about 1 ms, several
+times the solve of an easy puzzle (0.3 ms),
+and every miss pays for it: on puzzles without
+repeats the cache makes solving about four
+times slower. It pays off only when many
+puzzles are equivalent to each other. Puzzles
+seen as they are hit a plain lookup first.
+
+The cache is an in-memory LRU, optionally
+backed by an sqlite file that outlives the
+process and can be shared by workers.
+Boards other than 9x9 bypass the cache.
+"""
+import collections
+import sqlite3
+
+import numpy as np
+
+from .formats import format_puzzle
+from .solver import get_solver
+from .symmetry import canonical_form
+
+
+DEFAULT_MAXSIZE = 4096
+
+# stored instead of a solution if there is none
+NO_SOLUTION = ''
+
+
+class CacheStats:
+    """
+    Statistics of a cache
+
+    Attributes:
+        hits {int} -- lookups answered by the cache
+        misses {int} -- lookups that needed solving
+        disk_hits {int} -- hits found in the file only
+    """
+    FIELDS = ('hits', 'misses', 'disk_hits')
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def as_dict(self):
+        stats = {field: getattr(self, field) for field in self.FIELDS}
+        stats['hit_rate'] = self.hit_rate
+        return stats
+
+    def __repr__(self):
+        return 'CacheStats({})'.format(', '.join(
+            '{}={}'.format(field, getattr(self, field)) for field in self.FIELDS))
+
+
+class SolutionCache:
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, path=None):
+        """
+        Keyword Arguments:
+            maxsize {int} -- puzzles kept in memory (default: {4096})
+            path {str} -- sqlite file to persist solutions in,
+                          created if missing (default: {None})
+        """
+        self.maxsize = maxsize
+        self.path = path
+        self.stats = CacheStats()
+        # puzzle or canonical form -> solution string
+        self.entries = collections.OrderedDict()
+        self.db = None
+        if path is not None:
+            # a long timeout lets workers share the file,
+            # the game solves on a worker thread
+            self.db = sqlite3.connect(path, timeout=60, check_same_thread=False)
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('PRAGMA synchronous=NORMAL')
+            self.db.execute(
+                'CREATE TABLE IF NOT EXISTS solutions '
+                '(puzzle TEXT PRIMARY KEY, solution TEXT NOT NULL)')
+            self.db.commit()
+
+    def _get(self, key, disk=True):
+        solution = self.entries.get(key)
+        if solution is not None:
+            self.entries.move_to_end(key)
+            return solution
+        if self.db is None or not disk:
+            return None
+        row = self.db.execute(
+            'SELECT solution FROM solutions WHERE puzzle = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        self.stats.disk_hits += 1
+        self._remember(key, row[0])
+        return row[0]
+
+    def _remember(self, key, solution):
+        self.entries[key] = solution
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def _put(self, key, solution):
+        self._remember(key, solution)
+        if self.db is not None:
+            self.db.execute(
+                'INSERT OR REPLACE INTO solutions VALUES (?, ?)', (key, solution))
+            self.db.commit()
+
+    def solve(self, grid, backend='bitmask', solver=None):
+        """
+        Solve <grid> unless an equivalent
+        puzzle was solved before
+
+        The solution of a puzzle with several
+        solutions may differ from the one the
+        solver would find for it.
+
+        Arguments:
+            grid {9x9 array-like} -- puzzle, 0 for empty cells
+
+        Keyword Arguments:
+            backend {str} -- solver backend (default: {'bitmask'})
+            solver {Solver} -- solver of <grid> to use on a miss,
+                               e.g. to be able to cancel it
+
+        Returns:
+            list or None -- solved grid, None if there is no solution
+        """
+        grid = np.asarray(grid, dtype='int')
+        if grid.shape != (9, 9):
+            return (solver or get_solver(grid.tolist(), backend)).solve()
+
+        # every entry is a solution of its key, only
+        # canonical forms are written to the file
+        puzzle = format_puzzle(grid)
+        solution = self._get(puzzle, disk=False)
+        if solution is not None:
+            self.stats.hits += 1
+            return _grid_of(solution)
+
+        key, transform = canonical_form(grid)
+        solution = self._get(key)
+        if solution is not None:
+            self.stats.hits += 1
+            if solution != NO_SOLUTION:
+                solution = format_puzzle(transform.invert(_grid_of(solution)))
+            self._remember(puzzle, solution)
+            return _grid_of(solution)
+
+        self.stats.misses += 1
+        result = (solver or get_solver(grid.tolist(), backend)).solve()
+        if result is None:
+            solution = NO_SOLUTION
+            self._put(key, NO_SOLUTION)
+        else:
+            solution = format_puzzle(result)
+            self._put(key, format_puzzle(transform.apply(result)))
+        self._remember(puzzle, solution)
+        return result
+
+    def clear(self):
+        """
+        Forget all the solutions, also on disk
+        """
+        self.entries.clear()
+        if self.db is not None:
+            self.db.execute('DELETE FROM solutions')
+            self.db.commit()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def _grid_of(solution):
+    if solution == NO_SOLUTION:
+        return None
+    return [[int(value) for value in solution[i * 9:(i + 1) * 9]] for i in range(9)]
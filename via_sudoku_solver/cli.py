@@ -12,27 +12,491 @@ digits from 1 to 9.
 Implement an efficient sudoku solver.
 
 """
-import numpy as np
-import cv2
-from tkinter import Tk, filedialog
-import os
-import click
+import contextlib
+import json
 import sys
+import time
+import click
 
-from via_sudoku_solver.game import Game
+from via_sudoku_solver.solver import BACKENDS
+from via_sudoku_solver.variants import VARIANTS
 
-@click.command()
+
+@click.group(invoke_without_command=True)
 @click.option('-d', '--debug', is_flag=True, help="Debug mode.")
 @click.option('-s', '--size', help='Size of the board (px)', default=600)
-@click.option('-f', '--filled', type=int, help='Number of filled cells.', default=30)    
-@click.option('-r', '--random-trials', type=int, help='Number of trials to fill cell before refresh (stops freezing).', default=50)
-def cli(debug, size, filled, random_trials):
+@click.option('-f', '--filled', type=int, help='Number of filled cells (default: 30 for 9x9 boards).', default=None)
+@click.option('-r', '--random-trials', type=int, help='Deprecated, has no effect.', default=50, hidden=True)
+@click.option('--seed', type=int, help='Seed of the first board.', default=None)
+@click.option('-x', '--box-size', type=click.IntRange(2, 5), help='Box size: 2 for 4x4, 3 for 9x9, 4 for 16x16, 5 for 25x25 boards.', default=3)
+@click.option('--cache-file', type=click.Path(dir_okay=False), help='Sqlite file to keep solutions in between runs.', default=None)
+@click.option('--pool-file', type=click.Path(dir_okay=False), help='JSON file to keep ready puzzles in between runs.', default=None)
+@click.option('--variant', type=click.Choice(VARIANTS), help='Rules of the game (windoku on 4x4 and 9x9 boards only).', default='classic')
+@click.option('--check-budget', type=float, help='Milliseconds the solvability check of a move may take before it goes to the background.', default=5.0)
+@click.pass_context
+def cli(ctx, debug, size, filled, random_trials, seed, box_size, cache_file, pool_file, variant, check_budget):
+    if ctx.invoked_subcommand is not None:
+        return
+
+    # GUI dependencies are imported only
+    # when the game is actually started
+    from via_sudoku_solver.game import Game
+    from via_sudoku_solver.generator import DEFAULT_CLUES
+
     Game(
         board_size=size,
-        num_to_fill=filled,
+        num_to_fill=DEFAULT_CLUES[box_size] if filled is None else filled,
         debug=debug,
-        random_fills_trials=random_trials
+        seed=seed,
+        box=box_size,
+        cache_file=cache_file,
+        pool_file=pool_file,
+        variant=variant,
+        check_budget=check_budget / 1000
     ).main_loop()
 
+
+def _is_board_file(path):
+    return path.endswith(('.board', '.board.gz'))
+
+
+def _read_puzzles(stack, input, variants=False):
+    """
+    One-line puzzles of a file or stdin,
+    81 cell arrays of a corpus or puzzles
+    of a .board file, with their variants.Variant
+    if <variants> is set
+    """
+    from via_sudoku_solver import corpus
+    from via_sudoku_solver.formats import format_puzzle, open_stream, read_boards
+
+    if input.endswith(corpus.SUFFIX):
+        chunks = corpus.Corpus(input).iter_chunks()
+        return (puzzle for chunk in chunks for puzzle in chunk)
+    if _is_board_file(input):
+        boards = read_boards(input, variants=True)
+        if variants:
+            return ((format_puzzle(nums), declaration) for nums, _, declaration in boards)
+        return (format_puzzle(nums) for nums, _, _ in boards)
+    f = stack.enter_context(open_stream(input, 'rb'))
+    lines = (line.decode().strip() for line in f)
+    return (line for line in lines if line and not line.startswith('#'))
+
+
+@cli.command()
+@click.argument('input', default='-')
+@click.option('-o', '--output', type=click.File('w'), help='File to write solutions to.', default='-')
+@click.option('-w', '--workers', type=int, help='Number of worker processes (default: number of CPUs).', default=None)
+@click.option('-c', '--chunk-size', type=int, help='Number of puzzles sent to a worker at once.', default=64)
+@click.option('-b', '--backend', type=click.Choice(BACKENDS), help='Solver backend.', default='bitmask')
+@click.option('-p', '--profile', type=click.File('w'), help='File to write per-puzzle solver statistics to (JSON lines).', default=None)
+@click.option('--cache', is_flag=True, help='Reuse solutions of puzzles equivalent up to symmetry. Slower when the input has few repeats.')
+@click.option('--cache-file', type=click.Path(dir_okay=False), help='Sqlite file to keep cached solutions in, implies --cache.', default=None)
+@click.option('--bulk', is_flag=True, help='Propagate singles over whole chunks of puzzles with NumPy, search only the rest (in this process).')
+@click.option('-j', '--jobs', type=int, help='Split the search of every puzzle over this many processes, one puzzle at a time (for few hard puzzles).', default=None)
+@click.option('--variant', type=click.Choice(VARIANTS[:-1]), help='Rules of one-line puzzles, .board files carry their own.', default='classic')
+def solve(input, output, workers, chunk_size, backend, profile, cache, cache_file, bulk, jobs, variant):
+    """
+    Solve one-line puzzles from INPUT (stdin by default, may be gzipped),
+    puzzles of a binary corpus (.corpus) or of a .board file.
+
+    Solutions are written one per line in input order,
+    an empty line for a puzzle that cannot be solved.
+    With a cache, a puzzle with several solutions may
+    get a different one than without it, and puzzles
+    that repeat no earlier one (up to symmetry) solve
+    about four times slower. With --bulk,
+    a malformed line stops the run. --jobs always
+    uses the bitmask backend. Variants (killer puzzles
+    come in .board files) are solved by the bitmask
+    backend without a cache.
+    """
+    from via_sudoku_solver.batch import solve_many, solve_split
+
+    cache = cache or cache_file is not None
+    if bulk and (cache or profile is not None):
+        raise click.UsageError('--bulk cannot be combined with --cache or --profile')
+    if jobs is not None and (bulk or cache):
+        raise click.UsageError('--jobs cannot be combined with --bulk or --cache')
+    if (variant != 'classic' or _is_board_file(input)) and (bulk or jobs is not None):
+        raise click.UsageError('--bulk and --jobs only solve one-line classic puzzles')
+    if variant != 'classic' and (cache or backend != 'bitmask'):
+        raise click.UsageError('--variant needs the bitmask backend and no cache')
+    total = 0
+    failures = 0
+    cache_hits = 0
+    propagated = 0
+    start = time.perf_counter()
+    if bulk:
+        total, failures, propagated = _solve_bulk(input, output, backend)
+    else:
+        with contextlib.ExitStack() as stack:
+            lines = _read_puzzles(stack, input, variants=True)
+            if jobs is not None:
+                results = solve_split(lines, jobs)
+            else:
+                # cache hits are counted from the statistics
+                results = solve_many(lines, workers, chunk_size, backend,
+                                     profile is not None or cache, cache, cache_file,
+                                     variant)
+            for index, (puzzle, solution, stats) in enumerate(results):
+                total += 1
+                if stats and stats.get('cache_hit'):
+                    cache_hits += 1
+                if profile is not None:
+                    record = {'index': index, 'solved': solution is not None}
+                    record.update(stats or {})
+                    print(json.dumps(record), file=profile)
+                if solution is None:
+                    failures += 1
+                    solution = ''
+                print(solution, file=output)
+    elapsed = time.perf_counter() - start
+
+    click.echo(
+        '[INFO] Solved {} puzzles in {:.2f}s ({:.1f} puzzles/sec), {} failures'.format(
+            total - failures, elapsed, total / elapsed if elapsed else 0.0, failures),
+        err=True
+    )
+    if cache:
+        click.echo('[INFO] Cache: {} hits, {} misses'.format(
+            cache_hits, total - cache_hits), err=True)
+    if bulk:
+        click.echo('[INFO] {:.1%} solved by propagation alone'.format(
+            propagated / total if total else 0.0), err=True)
+
+
+def _solve_bulk(input, output, backend):
+    """
+    Solve chunks of puzzles with bulk.solve_boards
+
+    Returns:
+        tuple -- (puzzles, failures, puzzles solved
+                  by propagation alone)
+    """
+    import numpy as np
+
+    from via_sudoku_solver import bulk, corpus, formats
+
+    if input.endswith(corpus.SUFFIX):
+        chunks = corpus.Corpus(input).iter_chunks()
+    else:
+        chunks = formats.read_puzzles(input)
+    encode = np.frombuffer(formats.ENCODE.encode(), dtype='uint8')
+    total = failures = propagated = 0
+    while True:
+        try:
+            chunk = next(chunks, None)
+        except ValueError as e:
+            raise click.UsageError(str(e))
+        if chunk is None:
+            break
+        result = bulk.solve_boards(chunk, backend)
+        for row, solved in zip(encode[result.solutions], result.solved):
+            print(row.tobytes().decode() if solved else '', file=output)
+        total += len(chunk)
+        failures += int((~result.solved).sum())
+        propagated += int(result.propagated.sum())
+    return total, failures, propagated
+
+
+@cli.command('enumerate')
+@click.argument('puzzle')
+@click.option('-o', '--output', type=click.File('w'), help='File to write solutions to.', default='-')
+@click.option('-j', '--jobs', type=int, help='Number of worker processes (default: number of CPUs).', default=None)
+@click.option('-n', '--limit', type=int, help='Stop after this many solutions.', default=None)
+def enumerate_solutions(puzzle, output, jobs, limit):
+    """
+    Write every solution of PUZZLE (a one-line
+    puzzle, - to read it from stdin) as it is
+    found, splitting the search over processes.
+
+    Solutions come in no particular order.
+    """
+    from via_sudoku_solver import parallel
+    from via_sudoku_solver.formats import format_puzzle, parse_puzzle
+
+    if puzzle == '-':
+        puzzle = sys.stdin.readline().strip()
+    try:
+        grid = parse_puzzle(puzzle)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='PUZZLE')
+    count = 0
+    start = time.perf_counter()
+    for solution in parallel.iter_solutions(grid, jobs, limit):
+        print(format_puzzle(solution), file=output, flush=True)
+        count += 1
+    elapsed = time.perf_counter() - start
+    click.echo('[INFO] Found {} solutions in {:.2f}s'.format(count, elapsed), err=True)
+
+
+@cli.command()
+@click.argument('input', default='-')
+@click.option('-o', '--output', type=click.File('w'), help='File to write grades to (JSON lines).', default='-')
+@click.option('-w', '--workers', type=int, help='Number of worker processes (default: number of CPUs).', default=None)
+@click.option('-c', '--chunk-size', type=int, help='Number of puzzles sent to a worker at once.', default=64)
+def grade(input, output, workers, chunk_size):
+    """
+    Grade the difficulty of puzzles from INPUT by the
+    human techniques needed to solve them.
+
+    A JSON record with the level (easy, medium, hard,
+    expert or invalid) and the number of steps of every
+    technique is written per puzzle in input order.
+    """
+    from via_sudoku_solver.batch import grade_many
+    from via_sudoku_solver.logic import LEVELS
+
+    levels = dict.fromkeys(LEVELS + ('invalid', 'malformed'), 0)
+    total = 0
+    start = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        lines = _read_puzzles(stack, input)
+        for index, (puzzle, result) in enumerate(grade_many(lines, workers, chunk_size)):
+            total += 1
+            if result is None:
+                levels['malformed'] += 1
+                record = {'index': index, 'level': None}
+            else:
+                levels[result.level] += 1
+                record = {'index': index, 'level': result.level,
+                          'solved': result.solved, 'techniques': result.techniques}
+            print(json.dumps(record), file=output)
+    elapsed = time.perf_counter() - start
+
+    click.echo(
+        '[INFO] Graded {} puzzles in {:.2f}s ({:.1f} puzzles/sec): {}'.format(
+            total, elapsed, total / elapsed if elapsed else 0.0,
+            ', '.join('{} {}'.format(count, level) for level, count in levels.items() if count)),
+        err=True
+    )
+
+
+@cli.command()
+@click.option('--host', help='Address to bind.', default='127.0.0.1')
+@click.option('--port', type=int, help='TCP port.', default=8080)
+@click.option('--unix', type=click.Path(dir_okay=False), help='Unix socket to listen on instead of TCP.', default=None)
+@click.option('-w', '--workers', type=int, help='Number of worker processes (default: number of CPUs).', default=None)
+@click.option('-b', '--backend', type=click.Choice(BACKENDS), help='Solver backend.', default='bitmask')
+@click.option('--batch-size', type=int, help='Puzzles sent to a worker at once.', default=64)
+@click.option('--max-delay', type=float, help='Milliseconds a batch waits to fill up.', default=5.0)
+@click.option('--max-queue', type=int, help='Puzzles waiting for a worker before requests get 503.', default=4096)
+@click.option('-t', '--timeout', type=float, help='Default seconds a request may take before it gets 504.', default=10.0)
+@click.option('--cache', is_flag=True, help='Reuse solutions of puzzles equivalent up to symmetry. Slower when the input has few repeats.')
+@click.option('--cache-file', type=click.Path(dir_okay=False), help='Sqlite file to keep cached solutions in, implies --cache.', default=None)
+def serve(host, port, unix, workers, backend, batch_size, max_delay, max_queue, timeout, cache, cache_file):
+    """
+    Serve a local JSON API for solving puzzles.
+
+    POST /solve with {"puzzle": "..."} or {"puzzles": [...]}
+    (optionally "timeout" in seconds), GET /stats for
+    counters, queue depth and latency histograms.
+    """
+    import asyncio
+
+    from via_sudoku_solver import server
+
+    try:
+        asyncio.run(server.serve(
+            host, port, unix,
+            workers=workers,
+            backend=backend,
+            batch_size=batch_size,
+            max_delay=max_delay / 1000,
+            max_queue=max_queue,
+            timeout=timeout,
+            cache=cache or cache_file is not None,
+            cache_file=cache_file
+        ))
+    except KeyboardInterrupt:
+        click.echo('[INFO] Stopped', err=True)
+
+
+@cli.command()
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('-o', '--output', type=click.File('w'), help='File to write one-line puzzles to.', default='-')
+@click.option('-r', '--report', type=click.File('w'), help='File to write per-cell confidence to (JSON lines).', default=None)
+@click.option('-w', '--workers', type=int, help='Number of worker processes (default: number of CPUs).', default=None)
+@click.option('-c', '--chunk-size', type=int, help='Number of images sent to a worker at once.', default=4)
+@click.option('-x', '--box-size', type=click.IntRange(2, 5), help='Box size of the puzzles in the images.', default=3)
+@click.option('--min-confidence', type=float, help='Cells read with less confidence are counted as uncertain.', default=0.5)
+def ingest(directory, output, report, workers, chunk_size, box_size, min_confidence):
+    """
+    Read puzzles from the images in DIRECTORY.
+
+    Puzzles are written one per line in file name
+    order, an empty line for an unreadable image.
+    """
+    import functools
+    import os
+
+    from via_sudoku_solver import ingest as ingest_images
+    from via_sudoku_solver.batch import imap_windows
+    from via_sudoku_solver.formats import format_puzzle
+
+    paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(ingest_images.IMAGE_SUFFIXES)
+    )
+    read_image = functools.partial(ingest_images.read_image, box=box_size)
+    total = failures = uncertain = 0
+    start = time.perf_counter()
+    for path, result, error in imap_windows(read_image, paths, workers, chunk_size):
+        total += 1
+        if result is None:
+            failures += 1
+            click.echo('[INFO] {}'.format(error), err=True)
+            print('', file=output)
+        else:
+            uncertain += int((result.confidence < min_confidence).sum())
+            print(format_puzzle(result.grid), file=output)
+        if report is not None:
+            record = {'path': path, 'error': error}
+            if result is not None:
+                record.update({
+                    'puzzle': format_puzzle(result.grid),
+                    'grid_found': result.found,
+                    'min_confidence': float(result.confidence.min()),
+                    'confidence': result.confidence.round(3).tolist(),
+                })
+            print(json.dumps(record), file=report)
+    elapsed = time.perf_counter() - start
+
+    click.echo(
+        '[INFO] Read {} images in {:.2f}s ({:.1f} images/sec), {} failures, {} uncertain cells'.format(
+            total - failures, elapsed, total / elapsed if elapsed else 0.0, failures, uncertain),
+        err=True
+    )
+
+
+@cli.command()
+@click.option('-n', '--count', type=int, help='Number of puzzles.', default=1)
+@click.option('-f', '--filled', type=int, help='Number of filled cells (default: 30 for 9x9 boards).', default=None)
+@click.option('--seed', type=int, help='Seed for reproducible puzzles.', default=None)
+@click.option('-o', '--output', type=click.File('w'), help='File to write puzzles to.', default='-')
+@click.option('-w', '--workers', type=int, help='Number of worker processes (default: number of CPUs).', default=None)
+@click.option('--with-solutions', is_flag=True, help='Write the solution after every puzzle.')
+@click.option('-x', '--box-size', type=click.IntRange(2, 5), help='Box size: 2 for 4x4, 3 for 9x9, 4 for 16x16, 5 for 25x25 boards.', default=3)
+def generate(count, filled, seed, output, workers, with_solutions, box_size):
+    """
+    Generate one-line puzzles with a unique solution.
+    """
+    from via_sudoku_solver.formats import format_puzzle
+    from via_sudoku_solver.generator import DEFAULT_CLUES, generate_many
+
+    if filled is None:
+        filled = DEFAULT_CLUES[box_size]
+    start = time.perf_counter()
+    for puzzle, solution in generate_many(count, filled, seed, workers, box=box_size):
+        if with_solutions:
+            print(format_puzzle(puzzle), format_puzzle(solution), file=output)
+        else:
+            print(format_puzzle(puzzle), file=output)
+    elapsed = time.perf_counter() - start
+
+    click.echo(
+        '[INFO] Generated {} puzzles in {:.2f}s ({:.1f} puzzles/sec)'.format(
+            count, elapsed, count / elapsed if elapsed else 0.0),
+        err=True
+    )
+
+
+@cli.command()
+@click.argument('input')
+@click.argument('output')
+def convert(input, output):
+    """
+    Convert puzzles between formats.
+
+    The format is chosen by extension: .board, .corpus
+    (binary corpus) or one-line puzzles for anything else.
+    '-' stands for stdin/stdout, .gz files are (de)compressed.
+    """
+    from via_sudoku_solver import corpus, formats
+
+    def kind(path):
+        path = path[:-3] if path.endswith('.gz') else path
+        if path.endswith('.board'):
+            return 'board'
+        if path.endswith(corpus.SUFFIX):
+            return 'corpus'
+        return 'lines'
+
+    source, destination = kind(input), kind(output)
+    start = time.perf_counter()
+    if source == 'corpus':
+        if destination == 'board':
+            count = corpus.to_boards(input, output)
+        else:
+            count = corpus.to_lines(input, output)
+    elif destination == 'corpus':
+        if source == 'board':
+            count = corpus.from_boards(input, output)
+        else:
+            count = corpus.from_lines(input, output)
+    elif source == 'lines' and destination == 'lines':
+        count = formats.write_puzzles(formats.read_puzzles(input), output)
+    else:
+        if source == 'board':
+            # variants are kept between .board files
+            records = formats.read_boards(input, variants=True)
+        else:
+            records = ((nums, nums != 0) for nums in formats.iter_puzzles(input))
+        if destination == 'board':
+            count = formats.write_boards(records, output)
+        else:
+            count = formats.write_puzzles((record[0] for record in records), output)
+    elapsed = time.perf_counter() - start
+
+    click.echo('[INFO] Converted {} puzzles in {:.2f}s'.format(count, elapsed), err=True)
+
+
+@cli.command()
+@click.option('-n', '--size', type=int, help='Puzzles per benchmark set.', default=20)
+@click.option('--seed', type=int, help='Seed of benchmark sets.', default=0)
+@click.option('-o', '--output', type=click.Path(dir_okay=False), help='File to save results to (JSON).', default=None)
+@click.option('-b', '--baseline', type=click.Path(exists=True, dir_okay=False), help='Results to compare with (JSON).', default=None)
+@click.option('-t', '--threshold', type=float, help='Allowed relative slowdown of the median time.', default=0.25)
+@click.option('--no-render', is_flag=True, help='Skip rendering benchmarks.')
+@click.option('--imports-only', is_flag=True, help='Only time cold imports of the non-GUI entry points.')
+def bench(size, seed, output, baseline, threshold, no_render, imports_only):
+    """
+    Run benchmarks on fixed-seed puzzle sets.
+
+    Exits with code 1 if any benchmark is slower
+    than BASELINE by more than THRESHOLD, or if a
+    non-GUI entry point misses its import budget.
+    """
+    from via_sudoku_solver import benchmark
+
+    if imports_only:
+        results = benchmark.bench_imports()
+    else:
+        results = benchmark.run(size, seed, render=not no_render)
+    click.echo('{:40} {:>8} {:>12} {:>12} {:>12} {:>12}'.format(
+        'benchmark', 'count', 'p50 (ms)', 'p90 (ms)', 'p99 (ms)', 'per sec'))
+    for name, summary in sorted(results.items()):
+        click.echo('{:40} {:>8} {:>12.4f} {:>12.4f} {:>12.4f} {:>12.1f}'.format(
+            name, summary['count'], summary['p50'] * 1000, summary['p90'] * 1000,
+            summary['p99'] * 1000, summary['per_sec']))
+
+    if output is not None:
+        benchmark.save(results, output)
+
+    failed = False
+    for problem in benchmark.check_imports(results):
+        click.echo('[INFO] Import budget: {}'.format(problem), err=True)
+        failed = True
+    if baseline is not None:
+        regressions = benchmark.compare(results, benchmark.load(baseline), threshold)
+        for name, before, after in regressions:
+            click.echo('[INFO] Regression: {} {:.4f} ms -> {:.4f} ms'.format(
+                name, before * 1000, after * 1000), err=True)
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,368 @@
+"""
+Compact binary puzzle corpus
+
+Layout of a corpus file:
+    header (32 bytes) -- magic, version, flags,
+                         record size and number of records
+    records -- fixed-size, one per puzzle:
+        puzzle (41 bytes) -- 81 cells, 4 bits per cell,
+                             the first cell in the high nibble
+        const (11 bytes, optional) -- const mask, 1 bit per cell
+        solution (41 bytes, optional) -- packed like the puzzle
+
+Records are opened with numpy.memmap, so any
+record or slice is read without loading the
+whole corpus. Packed records are views into
+the file, unpacking happens per chunk.
+"""
+import struct
+
+import numpy as np
+
+from . import formats, validation
+
+
+MAGIC = b'VIASUDOK'
+VERSION = 1
+HEADER = struct.Struct('<8sHHIQ8x')
+HEADER_SIZE = HEADER.size
+
+HAS_CONST = 1
+HAS_SOLUTION = 2
+
+SUFFIX = '.corpus'
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+
+def record_dtype(flags):
+    """
+    Numpy dtype of a record
+
+    Arguments:
+        flags {int} -- combination of HAS_CONST and HAS_SOLUTION
+
+    Returns:
+        np.dtype -- structured dtype
+    """
+    fields = [('puzzle', 'uint8', 41)]
+    if flags & HAS_CONST:
+        fields.append(('const', 'uint8', 11))
+    if flags & HAS_SOLUTION:
+        fields.append(('solution', 'uint8', 41))
+    return np.dtype(fields)
+
+
+def pack_cells(cells):
+    """
+    Pack cells into 4 bits each
+
+    Arguments:
+        cells {array-like} -- (n, 81) or (n, 9, 9) values 0..15
+
+    Returns:
+        np.ndarray -- (n, 41) uint8
+    """
+    cells = np.asarray(cells, dtype='uint8').reshape(-1, 81)
+    padded = np.zeros((cells.shape[0], 82), dtype='uint8')
+    padded[:, :81] = cells
+    return (padded[:, 0::2] << 4) | padded[:, 1::2]
+
+
+def unpack_cells(packed):
+    """
+    Unpack cells packed by <pack_cells>
+
+    Arguments:
+        packed {array-like} -- (n, 41) uint8
+
+    Returns:
+        np.ndarray -- (n, 81) uint8
+    """
+    packed = np.asarray(packed, dtype='uint8').reshape(-1, 41)
+    cells = np.empty((packed.shape[0], 82), dtype='uint8')
+    cells[:, 0::2] = packed >> 4
+    cells[:, 1::2] = packed & 0x0F
+    return cells[:, :81]
+
+
+def _is_index(key):
+    return isinstance(key, (int, np.integer))
+
+
+class Corpus:
+    def __init__(self, path):
+        """
+        Open a corpus file for reading
+
+        Arguments:
+            path {str} -- path to the file
+
+        Raises:
+            ValueError -- if the file is not a corpus
+        """
+        with open(path, 'rb') as f:
+            header = f.read(HEADER_SIZE)
+        if len(header) != HEADER_SIZE:
+            raise ValueError('Not a puzzle corpus: {}'.format(path))
+        magic, version, flags, record_size, count = HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('Not a puzzle corpus: {}'.format(path))
+
+        self.path = path
+        self.flags = flags
+        self.dtype = record_dtype(flags)
+        if self.dtype.itemsize != record_size:
+            raise ValueError('Corrupted corpus header: {}'.format(path))
+        if count == 0:
+            self.records = np.zeros(0, dtype=self.dtype)
+        else:
+            self.records = np.memmap(
+                path, dtype=self.dtype, mode='r',
+                offset=HEADER_SIZE, shape=(count,))
+
+    def __len__(self):
+        return self.records.shape[0]
+
+    def __getitem__(self, key):
+        return self.puzzles(key)
+
+    @property
+    def has_const(self):
+        return bool(self.flags & HAS_CONST)
+
+    @property
+    def has_solution(self):
+        return bool(self.flags & HAS_SOLUTION)
+
+    def puzzles(self, key=slice(None)):
+        """
+        Unpacked puzzles
+
+        Arguments:
+            key {int or slice or array} -- records to unpack
+
+        Returns:
+            np.ndarray -- (n, 81) uint8, (81,) for an int key
+        """
+        cells = unpack_cells(self.records['puzzle'][key])
+        return cells[0] if _is_index(key) else cells
+
+    def const_nums(self, key=slice(None)):
+        """
+        Unpacked const masks, the clues
+        of the puzzle if there are none
+
+        Arguments:
+            key {int or slice or array} -- records to unpack
+
+        Returns:
+            np.ndarray -- (n, 81) bool, (81,) for an int key
+        """
+        if not self.has_const:
+            return self.puzzles(key) != 0
+        packed = np.asarray(self.records['const'][key]).reshape(-1, 11)
+        const = np.unpackbits(packed, axis=1, count=81).astype('bool_')
+        return const[0] if _is_index(key) else const
+
+    def solutions(self, key=slice(None)):
+        """
+        Unpacked solutions
+
+        Arguments:
+            key {int or slice or array} -- records to unpack
+
+        Raises:
+            ValueError -- if the corpus has no solutions
+
+        Returns:
+            np.ndarray -- (n, 81) uint8, (81,) for an int key
+        """
+        if not self.has_solution:
+            raise ValueError('Corpus has no solutions')
+        cells = unpack_cells(self.records['solution'][key])
+        return cells[0] if _is_index(key) else cells
+
+    def iter_chunks(self, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Unpack puzzles chunk by chunk
+
+        Keyword Arguments:
+            chunk_size {int} -- max number of puzzles per chunk
+
+        Yields:
+            np.ndarray -- (chunk, 81) uint8
+        """
+        for start in range(0, len(self), chunk_size):
+            yield self.puzzles(slice(start, start + chunk_size))
+
+
+class CorpusWriter:
+    def __init__(self, path, with_const=False, with_solution=False):
+        """
+        Create a corpus file. Records are appended
+        with <append>, the header is finalized
+        when the writer is closed.
+
+        Arguments:
+            path {str} -- path to the file
+
+        Keyword Arguments:
+            with_const {bool} -- store const masks (default: {False})
+            with_solution {bool} -- store solutions (default: {False})
+        """
+        self.flags = (
+            (HAS_CONST if with_const else 0) |
+            (HAS_SOLUTION if with_solution else 0)
+        )
+        self.dtype = record_dtype(self.flags)
+        self.count = 0
+        self.file = open(path, 'wb')
+        self._write_header()
+
+    def _write_header(self):
+        self.file.seek(0)
+        self.file.write(HEADER.pack(
+            MAGIC, VERSION, self.flags, self.dtype.itemsize, self.count))
+
+    def append(self, puzzles, const_nums=None, solutions=None):
+        """
+        Append a chunk of records
+
+        Arguments:
+            puzzles {array-like} -- (n, 81) or (n, 9, 9) puzzles
+
+        Keyword Arguments:
+            const_nums {array-like} -- (n, 81) const masks, clues
+                                       of the puzzles by default
+            solutions {array-like} -- (n, 81) solutions, required
+                                      if the corpus stores them
+
+        Raises:
+            ValueError -- if the puzzles are not 9x9, digits
+                          above 15 do not fit 4 bits per cell
+        """
+        puzzles = np.asarray(puzzles, dtype='uint8')
+        if puzzles.size % 81 or puzzles.shape[-1] not in (9, 81):
+            raise ValueError('Corpus stores 9x9 puzzles only')
+        puzzles = puzzles.reshape(-1, 81)
+        records = np.zeros(puzzles.shape[0], dtype=self.dtype)
+        records['puzzle'] = pack_cells(puzzles)
+        if self.flags & HAS_CONST:
+            if const_nums is None:
+                const_nums = puzzles != 0
+            const_nums = np.asarray(const_nums, dtype='bool_').reshape(-1, 81)
+            records['const'] = np.packbits(const_nums, axis=1)
+        if self.flags & HAS_SOLUTION:
+            if solutions is None:
+                raise ValueError('Corpus requires solutions')
+            records['solution'] = pack_cells(solutions)
+        self.file.write(records.tobytes())
+        self.count += puzzles.shape[0]
+
+    def close(self):
+        if self.file.closed:
+            return
+        self._write_header()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def from_lines(source, path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Convert one-line puzzles into a corpus
+
+    Arguments:
+        source {str or file} -- one-line puzzles
+        path {str} -- corpus to create
+
+    Returns:
+        int -- number of puzzles
+    """
+    with CorpusWriter(path) as writer:
+        for chunk in formats.read_puzzles(source, chunk_size):
+            writer.append(chunk)
+    return writer.count
+
+
+def from_boards(source, path):
+    """
+    Convert .board boards into a corpus,
+    the const masks are kept
+
+    Arguments:
+        source {str or file} -- .board boards
+        path {str} -- corpus to create
+
+    Returns:
+        int -- number of boards
+    """
+    with CorpusWriter(path, with_const=True) as writer:
+        for nums, const_nums in formats.read_boards(source):
+            writer.append(nums, const_nums)
+    return writer.count
+
+
+def to_lines(path, destination, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Convert a corpus into one-line puzzles
+
+    Arguments:
+        path {str} -- corpus to read
+        destination {str or file} -- where to write puzzles
+
+    Returns:
+        int -- number of puzzles
+    """
+    return formats.write_puzzles(Corpus(path).iter_chunks(chunk_size), destination)
+
+
+def to_boards(path, destination):
+    """
+    Convert a corpus into .board boards
+
+    Arguments:
+        path {str} -- corpus to read
+        destination {str or file} -- where to write boards
+
+    Returns:
+        int -- number of boards
+    """
+    corpus = Corpus(path)
+
+    def boards():
+        for start in range(0, len(corpus), DEFAULT_CHUNK_SIZE):
+            key = slice(start, start + DEFAULT_CHUNK_SIZE)
+            for nums, const_nums in zip(corpus.puzzles(key), corpus.const_nums(key)):
+                yield nums.reshape(9, 9), const_nums.reshape(9, 9)
+
+    return formats.write_boards(boards(), destination)
+
+
+def validate_corpus(corpus, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Validate every puzzle of the corpus
+
+    Arguments:
+        corpus {Corpus} -- corpus to validate
+
+    Keyword Arguments:
+        chunk_size {int} -- number of puzzles unpacked at once
+
+    Returns:
+        validation.ValidationResult -- see validation.validate_boards
+    """
+    results = [
+        validation.validate_boards(chunk, chunk_size)
+        for chunk in corpus.iter_chunks(chunk_size)
+    ]
+    if not results:
+        return validation.validate_boards(np.zeros((0, 81), dtype='uint8'))
+    return validation.ValidationResult(*(
+        np.concatenate(field) for field in zip(*results)
+    ))
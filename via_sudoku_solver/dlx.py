@@ -0,0 +1,229 @@
+"""
+Dancing Links (Algorithm X) exact-cover solver
+
+Sudoku is encoded as an exact cover problem
+with 4 * N^2 columns (cell, row-digit, column-digit
+and box-digit constraints, 324 for 9x9) and one row per
+candidate (cell, digit). The links of the empty
+board are built once per size and copied for
+every puzzle, then the givens are covered like
+chosen rows, which takes out the constraints
+they satisfy and the candidates they rule out.
+
+The links are kept in flat lists indexed by
+node instead of node objects, which is much
+faster in Python.
+"""
+import functools
+
+from .geometry import geometry, geometry_of
+from .solver import Solver, SolveCancelled
+
+
+@functools.lru_cache(maxsize=None)
+def _matrix(box):
+    """
+    Links of the empty board of a size, built
+    once and copied for every puzzle
+
+    Returns:
+        tuple -- (L, R, U, D, C, S) lists, the (cell, digit)
+                 of every node and the first node of
+                 the row of every candidate
+    """
+    geo = geometry(box)
+    size = geo.size
+    cells = geo.cells
+    # node 0 is the root, the next 4 * cells
+    # nodes are column headers
+    headers = 4 * cells
+    L = list(range(-1, headers))
+    L[0] = headers
+    R = list(range(1, headers + 2))
+    R[headers] = 0
+    U = list(range(headers + 1))
+    D = list(range(headers + 1))
+    C = list(range(headers + 1))
+    S = [0] * (headers + 1)
+    node_cell = [-1] * (headers + 1)
+    node_digit = [0] * (headers + 1)
+    row_node = [0] * (cells * size)
+
+    for idx in range(cells):
+        for digit in range(1, size + 1):
+            columns = (
+                1 + idx,
+                1 + cells + geo.row_of[idx] * size + digit - 1,
+                1 + 2 * cells + geo.col_of[idx] * size + digit - 1,
+                1 + 3 * cells + geo.box_of[idx] * size + digit - 1
+            )
+            first = len(L)
+            row_node[idx * size + digit - 1] = first
+            for k, column in enumerate(columns):
+                node = first + k
+                L.append(first + (k - 1) % 4)
+                R.append(first + (k + 1) % 4)
+                # insert at the bottom of the column
+                U.append(U[column])
+                D.append(column)
+                D[U[column]] = node
+                U[column] = node
+                C.append(column)
+                S[column] += 1
+                node_cell.append(idx)
+                node_digit.append(digit)
+    return L, R, U, D, C, S, node_cell, node_digit, row_node
+
+
+class DLXSolver(Solver):
+    def __init__(self, grid, trace=None):
+        """
+        Arguments:
+            grid {NxN array-like} -- board to solve, 0 for empty cells,
+                                     N is 4, 9, 16 or 25
+
+        Keyword Arguments:
+            trace {callable} -- tracing hook, see <Solver>
+        """
+        super().__init__(trace)
+        geo = self.geometry = geometry_of(grid)
+        size = geo.size
+        self.givens = [int(grid[i][j]) for i in range(size) for j in range(size)]
+        self.consistent = True
+
+        matrix = _matrix(geo.box)
+        self.L, self.R, self.U, self.D, self.C, self.S = (
+            list(links) for links in matrix[:6])
+        # shared, never changed
+        self.node_cell, self.node_digit, row_node = matrix[6:]
+
+        # the row of every given is taken out
+        # with its columns and the rows they share
+        covered = bytearray(len(self.S))
+        C, R = self.C, self.R
+        for idx, value in enumerate(self.givens):
+            if value == 0:
+                continue
+            if not 0 < value <= size:
+                self.consistent = False
+                break
+            row = row_node[idx * size + value - 1]
+            columns = (C[row], C[row + 1], C[row + 2], C[row + 3])
+            if any(covered[column] for column in columns):
+                self.consistent = False
+                break
+            for column in columns:
+                covered[column] = 1
+                self._cover(column)
+
+        self.solution = []
+
+    def _cover(self, column):
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        R[L[column]] = R[column]
+        L[R[column]] = L[column]
+        i = D[column]
+        while i != column:
+            j = R[i]
+            while j != i:
+                D[U[j]] = D[j]
+                U[D[j]] = U[j]
+                S[C[j]] -= 1
+                j = R[j]
+            i = D[i]
+
+    def _uncover(self, column):
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        i = U[column]
+        while i != column:
+            j = L[i]
+            while j != i:
+                S[C[j]] += 1
+                D[U[j]] = j
+                U[D[j]] = j
+                j = L[j]
+            i = U[i]
+        R[L[column]] = column
+        L[R[column]] = column
+
+    def _search(self, depth=0):
+        """
+        Algorithm X yielding every time all the
+        columns are covered. The links are restored
+        when the generator is closed.
+        """
+        stats = self.stats
+        stats.nodes += 1
+        if depth > stats.max_depth:
+            stats.max_depth = depth
+        if self.cancelled:
+            raise SolveCancelled()
+        trace = self.trace
+        if trace is not None:
+            trace('node', depth)
+
+        R, L, D, C, S = self.R, self.L, self.D, self.C, self.S
+        if R[0] == 0:
+            if trace is not None:
+                trace('solution', depth)
+            yield
+            return
+
+        # column with the fewest rows
+        column = R[0]
+        best = column
+        best_size = S[column]
+        while column != 0 and best_size > 1:
+            if S[column] < best_size:
+                best = column
+                best_size = S[column]
+            column = R[column]
+        if best_size == 0:
+            return
+        # a single row is forced, not guessed
+        if best_size == 1:
+            stats.propagations += 1
+
+        self._cover(best)
+        try:
+            r = D[best]
+            while r != best:
+                self.solution.append(r)
+                j = R[r]
+                while j != r:
+                    self._cover(C[j])
+                    j = R[j]
+                try:
+                    # depth counts guesses only
+                    yield from self._search(depth + (best_size > 1))
+                    if best_size > 1:
+                        stats.backtracks += 1
+                        if trace is not None:
+                            trace('backtrack', depth)
+                finally:
+                    j = L[r]
+                    while j != r:
+                        self._uncover(C[j])
+                        j = L[j]
+                    self.solution.pop()
+                r = D[r]
+        finally:
+            self._uncover(best)
+
+    def grid(self):
+        """
+        Givens combined with the rows
+        of the current partial solution
+        as a list of lists
+        """
+        size = self.geometry.size
+        cells = list(self.givens)
+        for node in self.solution:
+            cells[self.node_cell[node]] = self.node_digit[node]
+        return [cells[i * size:(i + 1) * size] for i in range(size)]
+
+    def _iter_solutions(self):
+        if not self.consistent:
+            return
+        for _ in self._search():
+            yield self.grid()
@@ -0,0 +1,215 @@
+"""
+Live solvability feedback for the game
+
+After every move the board is checked for
+a completion, within a small time budget so
+typing stays responsive. The check is warm
+started from the last solution found (the
+witness), cheapest step first:
+    1. every filled cell agrees with the
+       witness -- still solvable, nothing
+       to search
+    2. repair: cells the user filled against
+       the witness swap digits with it, so only
+       the empty cells holding one of these
+       digits in the witness are searched, the
+       rest keep their witness digits
+    3. a full search of the board
+Steps 2 and 3 stop at the deadline of the
+budget, and the board is then checked by a
+background solve (see tasks.py) the game
+polls, cancelled by the next move. It is
+started by the next poll rather than by the
+move: a new thread holds the interpreter lock
+for a switch interval (5 ms) before the move
+could return.
+"""
+import time
+
+from .solver import SolveCancelled, get_solver
+from .tasks import BackgroundSolve
+
+
+# seconds a check may take before it
+# goes to the background
+DEFAULT_BUDGET = 0.005
+
+
+class CheckStats:
+    """
+    Statistics of solvability checks
+
+    Attributes:
+        checks {int} -- moves checked
+        witness_hits {int} -- checks answered by the witness
+        repairs {int} -- checks answered by a repair
+        searches {int} -- checks answered by a full search
+        background {int} -- checks sent to the background
+        max_time {float} -- longest check within a move (s)
+    """
+    FIELDS = ('checks', 'witness_hits', 'repairs', 'searches', 'background', 'max_time')
+
+    def __init__(self):
+        self.checks = 0
+        self.witness_hits = 0
+        self.repairs = 0
+        self.searches = 0
+        self.background = 0
+        self.max_time = 0.0
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self):
+        return 'CheckStats({})'.format(', '.join(
+            '{}={}'.format(field, getattr(self, field)) for field in self.FIELDS))
+
+
+class SolvabilityCheck:
+    def __init__(self, rules, budget=DEFAULT_BUDGET):
+        """
+        Arguments:
+            rules {variants.Rules} -- rules of the board
+
+        Keyword Arguments:
+            budget {float} -- seconds a check may take before
+                              it goes to the background (default: {0.005})
+        """
+        self.rules = rules
+        self.budget = budget
+        self.stats = CheckStats()
+        # flat solution agreeing with the board, if known
+        self.witness = None
+        # background check of the last move
+        self.pending = None
+        # board of the last move left to a
+        # background check not started yet
+        self.deferred = None
+
+    def reset(self, solution=None):
+        """
+        Forget the witness, e.g. for a new board
+
+        Keyword Arguments:
+            solution {NxN array-like} -- known solution of
+                                         the new board (default: {None})
+        """
+        self.cancel()
+        self.witness = None
+        if solution is not None:
+            self.witness = [int(value) for row in solution for value in row]
+
+    def cancel(self):
+        self.deferred = None
+        if self.pending is not None:
+            self.pending.cancel()
+            self.pending = None
+
+    def _grid(self, values):
+        size = self.rules.size
+        return [list(values[i * size:(i + 1) * size]) for i in range(size)]
+
+    def _search(self, grid, deadline):
+        """
+        Returns:
+            tuple -- (whether the search finished,
+                      solution or None)
+        """
+        solver = get_solver(grid, rules=self.rules)
+
+        def trace(event, depth):
+            if time.perf_counter() > deadline:
+                solver.cancel()
+
+        solver.trace = trace
+        try:
+            return True, solver.solve()
+        except SolveCancelled:
+            return False, None
+
+    def _repair(self, values, deadline):
+        # digits the user placed against the witness
+        # and the witness digits they replaced
+        witness = self.witness
+        digits = set()
+        for idx, value in enumerate(values):
+            if value and value != witness[idx]:
+                digits.add(value)
+                digits.add(witness[idx])
+        repaired = [value or (0 if witness[idx] in digits else witness[idx])
+                    for idx, value in enumerate(values)]
+        return self._search(self._grid(repaired), deadline)
+
+    def _found(self, solution):
+        self.witness = [value for row in solution for value in row]
+        return True
+
+    def update(self, values, conflicts=0):
+        """
+        Check the board after a move
+
+        Arguments:
+            values {bytearray} -- flat values of the board,
+                                  see state.BoardState
+
+        Keyword Arguments:
+            conflicts {int} -- conflicts of the board, any
+                               makes it unsolvable (default: {0})
+
+        Returns:
+            bool or None -- whether the board can be completed,
+                            None while a background check runs
+        """
+        self.cancel()
+        if conflicts:
+            return False
+        stats = self.stats
+        stats.checks += 1
+        start = time.perf_counter()
+        deadline = start + self.budget
+        try:
+            witness = self.witness
+            if witness is not None:
+                if all(value == 0 or value == known for value, known in zip(values, witness)):
+                    stats.witness_hits += 1
+                    return True
+                finished, solution = self._repair(values, deadline)
+                if solution is not None:
+                    stats.repairs += 1
+                    return self._found(solution)
+                if not finished:
+                    return self._start_background(values)
+            finished, solution = self._search(self._grid(values), deadline)
+            if not finished:
+                return self._start_background(values)
+            stats.searches += 1
+            if solution is None:
+                return False
+            return self._found(solution)
+        finally:
+            stats.max_time = max(stats.max_time, time.perf_counter() - start)
+
+    def _start_background(self, values):
+        self.stats.background += 1
+        self.deferred = self._grid(values)
+        return None
+
+    def poll(self):
+        """
+        Result of the background check, if it is done
+
+        Returns:
+            bool or None -- whether the board can be completed,
+                            None if no check has finished
+        """
+        if self.deferred is not None:
+            self.pending = BackgroundSolve(self.deferred, rules=self.rules)
+            self.deferred = None
+            return None
+        task = self.pending
+        if task is None or not task.done:
+            return None
+        self.pending = None
+        if task.result is None:
+            return False
+        return self._found(task.result)
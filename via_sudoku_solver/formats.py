@@ -0,0 +1,358 @@
+"""
+Streaming readers and writers of puzzle files
+
+Two formats are supported:
+    one-line -- 81 characters per puzzle, '0' or '.'
+                for empty cells, anything after the
+                81st character is ignored
+    .board -- 9 lines of values followed by 9 lines
+              of the const mask, several boards may
+              follow each other in one stream
+
+A .board of a variant (see variants.py) starts
+with a 'variant <name>' line, killer boards add
+a 'cage <sum> <cell> <cell> ...' line per cage,
+cells indexed row by row. Boards without them
+are classic.
+
+4x4, 16x16 and 25x25 boards are written the
+same way (16, 256 or 625 characters per
+puzzle), with letters A..P for digits
+10..25. The size of one-line puzzles is
+taken from the first word of the first line.
+
+Sources can be paths, '-' for stdin/stdout,
+gzip files ('.gz') or binary file objects.
+Readers are generators working in chunks, so
+memory does not depend on the size of the input.
+"""
+import contextlib
+import gzip
+import itertools
+import sys
+
+import numpy as np
+
+from .geometry import CELL_COUNTS, SYMBOLS, as_board_stack, box_of_size, geometry_of
+from .variants import variant
+
+
+DEFAULT_CHUNK_SIZE = 4096
+
+# byte -> cell value, 255 for invalid symbols
+DECODE = np.full(256, 255, dtype='uint8')
+DECODE[ord('.')] = 0
+for _digit in range(10):
+    DECODE[ord(str(_digit))] = _digit
+for _digit, _symbol in enumerate(SYMBOLS[9:], 10):
+    DECODE[ord(_symbol)] = _digit
+    DECODE[ord(_symbol.lower())] = _digit
+del _digit, _symbol
+
+# cell value -> symbol, 26 is the line end
+ENCODE = '0' + SYMBOLS + '\n'
+
+
+@contextlib.contextmanager
+def open_stream(source, mode='rb'):
+    """
+    Open <source> as a binary stream
+
+    Arguments:
+        source {str or file} -- path, '-' for stdin/stdout
+                                or an open binary file
+
+    Keyword Arguments:
+        mode {str} -- 'rb' or 'wb' (default: {'rb'})
+    """
+    if not isinstance(source, str):
+        yield source
+    elif source == '-':
+        yield sys.stdin.buffer if 'r' in mode else sys.stdout.buffer
+    elif source.endswith('.gz'):
+        with gzip.open(source, mode) as f:
+            yield f
+    else:
+        with open(source, mode) as f:
+            yield f
+
+
+def parse_puzzle(line):
+    """
+    Convert a one-line puzzle into a grid
+
+    Arguments:
+        line {str} -- 81 characters, '0' or '.' for empty cells
+                      (16, 256 or 625 for other sizes)
+
+    Raises:
+        ValueError -- if the line is not a puzzle
+
+    Returns:
+        list -- 9x9 grid (size x size in general)
+    """
+    line = line.strip()
+    if len(line) not in CELL_COUNTS:
+        raise ValueError(
+            'Puzzle must have 16, 81, 256 or 625 cells, got {}'.format(len(line)))
+    values = _decode_lines([line.encode()], len(line))[0].tolist()
+    size = int(round(len(line) ** 0.5))
+    return [values[i * size:(i + 1) * size] for i in range(size)]
+
+
+def format_puzzle(grid):
+    """
+    Convert a grid into a one-line puzzle
+
+    Arguments:
+        grid {NxN array-like} -- grid to convert
+
+    Returns:
+        str -- 81 characters for 9x9 grids, '0' for empty cells
+    """
+    return ''.join(ENCODE[int(value)] for row in grid for value in row)
+
+
+def _decode_lines(lines, cells=81, numbers=None):
+    data = np.frombuffer(b''.join(lines), dtype='uint8')
+    puzzles = DECODE[data].reshape(-1, cells)
+    # also rejects letters too big for the board
+    invalid = puzzles > int(round(cells ** 0.5))
+    if invalid.any():
+        row = int(invalid.any(axis=1).argmax())
+        if numbers is not None:
+            raise ValueError('Invalid symbol in puzzle on line {}: {!r}'.format(
+                numbers[row], lines[row]))
+        raise ValueError('Invalid symbol in puzzle: {!r}'.format(lines[row]))
+    return puzzles
+
+
+def _cells_of_line(line):
+    # the first word is the puzzle, whatever follows
+    # it on the line is ignored
+    word = line.split()[0]
+    return len(word) if len(word) in CELL_COUNTS else 81
+
+
+def read_puzzles(source, chunk_size=DEFAULT_CHUNK_SIZE, cells=None):
+    """
+    Read one-line puzzles in chunks
+
+    Empty lines and lines starting
+    with '#' are skipped.
+
+    Arguments:
+        source {str or file} -- where to read from
+
+    Keyword Arguments:
+        chunk_size {int} -- max number of puzzles per chunk
+        cells {int} -- cells per puzzle (default: {from the first line})
+
+    Raises:
+        ValueError -- if a line is not a puzzle, with its number
+
+    Yields:
+        np.ndarray -- (chunk, 81) uint8 array, (chunk, cells) in general
+    """
+    with open_stream(source, 'rb') as f:
+        lines = []
+        numbers = []
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith(b'#'):
+                continue
+            if cells is None:
+                cells = _cells_of_line(line)
+            if len(line) < cells:
+                raise ValueError('Puzzle on line {} must have {} cells: {!r}'.format(
+                    number, cells, line))
+            lines.append(line[:cells])
+            numbers.append(number)
+            if len(lines) == chunk_size:
+                yield _decode_lines(lines, cells, numbers)
+                lines = []
+                numbers = []
+        if lines:
+            yield _decode_lines(lines, cells, numbers)
+
+
+def iter_puzzles(source, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Read one-line puzzles one by one
+
+    Arguments:
+        source {str or file} -- where to read from
+
+    Yields:
+        np.ndarray -- (9, 9) uint8 array, (size, size) in general
+    """
+    for chunk in read_puzzles(source, chunk_size):
+        size = int(round(chunk.shape[1] ** 0.5))
+        for puzzle in chunk:
+            yield puzzle.reshape(size, size)
+
+
+def write_puzzles(puzzles, destination, blank='0'):
+    """
+    Write one-line puzzles
+
+    Arguments:
+        puzzles {iterable} -- chunks of puzzles: (n, 81) or
+                              (n, 9, 9) arrays, or single
+                              (81,) or (9, 9) puzzles, any
+                              supported size
+        destination {str or file} -- where to write to
+
+    Keyword Arguments:
+        blank {str} -- symbol of empty cells (default: {'0'})
+
+    Returns:
+        int -- number of written puzzles
+    """
+    encode = np.frombuffer((blank + ENCODE[1:]).encode(), dtype='uint8')
+    written = 0
+    with open_stream(destination, 'wb') as f:
+        for chunk in puzzles:
+            chunk, geo = as_board_stack(np.asarray(chunk, dtype='uint8'))
+            lines = np.empty((chunk.shape[0], geo.cells + 1), dtype='uint8')
+            lines[:, :geo.cells] = encode[chunk]
+            lines[:, geo.cells] = encode[len(ENCODE) - 1]
+            f.write(lines.tobytes())
+            written += chunk.shape[0]
+    return written
+
+
+def _read_variant(first, lines):
+    """
+    Parse the variant and cage lines
+    before a board
+
+    Returns:
+        tuple -- (name, cages, first line of the board)
+    """
+    words = first.split()
+    if len(words) != 2:
+        raise ValueError('Malformed variant line: {!r}'.format(first))
+    name = words[1].decode()
+    cages = []
+    first = next(lines, None)
+    while first is not None and first.startswith(b'cage'):
+        words = [int(word) for word in first.split()[1:]]
+        if len(words) < 2:
+            raise ValueError('Malformed cage line: {!r}'.format(first))
+        cages.append((words[0], words[1:]))
+        first = next(lines, None)
+    if first is None:
+        raise ValueError('Variant {} has no board'.format(name))
+    return name, cages, first
+
+
+def read_boards(source, variants=False):
+    """
+    Read boards in the .board format
+
+    The size of every board is taken
+    from the length of its first line.
+
+    Arguments:
+        source {str or file} -- where to read from
+
+    Keyword Arguments:
+        variants {bool} -- yield the variant of every board
+                           too (default: {False})
+
+    Raises:
+        ValueError -- if a board or its variant is malformed
+
+    Yields:
+        tuple -- (nums, const_nums): (9, 9) uint8 and bool arrays,
+                 (size, size) in general, and a variants.Variant
+                 if <variants> is set
+    """
+    with open_stream(source, 'rb') as f:
+        lines = (line.strip() for line in f)
+        lines = (line for line in lines if line)
+        for first in lines:
+            name, cages = 'classic', ()
+            if first.startswith(b'variant'):
+                name, cages, first = _read_variant(first, lines)
+            size = len(first)
+            if size * size not in CELL_COUNTS:
+                raise ValueError('Board must have 4, 9, 16 or 25 columns, got {}'.format(size))
+            board_lines = [first] + list(itertools.islice(lines, 2 * size - 1))
+            if len(board_lines) != 2 * size or any(len(line) != size for line in board_lines):
+                raise ValueError('Board must have {} lines of {} cells'.format(2 * size, size))
+            values = _decode_lines(board_lines, 2 * size * size).reshape(2 * size, size)
+            if variants:
+                yield values[:size].copy(), values[size:] != 0, variant(
+                    name, box_of_size(size), cages)
+            else:
+                yield values[:size].copy(), values[size:] != 0
+
+
+def _format_variant(declaration):
+    lines = ['variant {}\n'.format(declaration.name)]
+    for total, cells in declaration.cages:
+        lines.append('cage {} {}\n'.format(total, ' '.join(str(idx) for idx in cells)))
+    return ''.join(lines).encode()
+
+
+def write_boards(boards, destination):
+    """
+    Write boards in the .board format
+
+    Arguments:
+        boards {iterable} -- (nums, const_nums) pairs of (9, 9)
+                             or other (size, size) arrays, or
+                             (nums, const_nums, variants.Variant)
+        destination {str or file} -- where to write to
+
+    Returns:
+        int -- number of written boards
+    """
+    encode = np.frombuffer(ENCODE.encode(), dtype='uint8')
+    written = 0
+    with open_stream(destination, 'wb') as f:
+        for record in boards:
+            nums, const_nums = record[:2]
+            if len(record) > 2 and record[2].name != 'classic':
+                f.write(_format_variant(record[2]))
+            nums = np.asarray(nums, dtype='uint8')
+            size = geometry_of(nums).size
+            values = np.concatenate([
+                nums.reshape(size, size),
+                np.asarray(const_nums, dtype='uint8').reshape(size, size)
+            ])
+            lines = np.empty((2 * size, size + 1), dtype='uint8')
+            lines[:, :size] = encode[values]
+            lines[:, size] = ord('\n')
+            f.write(lines.tobytes())
+            written += 1
+    return written
+
+
+def load_into_board(board, record):
+    """
+    Load a record of any format into the board
+
+    Arguments:
+        board {SudokuBoard} -- board to fill
+        record {array-like or tuple} -- one-line puzzle
+                                        ((81,) or (9, 9) array)
+                                        or (nums, const_nums)
+
+    Raises:
+        ValueError -- if the record does not fit the board
+    """
+    if isinstance(record, tuple):
+        nums, const_nums = record
+    else:
+        nums = record
+        const_nums = np.asarray(record) != 0
+    size = board.size
+    if np.asarray(nums).size != size * size:
+        raise ValueError('Board has {0}x{0} cells, got {1} values'.format(
+            size, np.asarray(nums).size))
+    board.clear()
+    board.set_nums(np.asarray(nums).reshape(size, size))
+    board.const_nums = np.asarray(const_nums, dtype='bool_').reshape(size, size)
@@ -1,27 +1,83 @@
 import numpy as np
 import cv2
-from tkinter import Tk, filedialog
 from .board import SudokuBoard
+from .cache import SolutionCache
+from .pool import PuzzlePool
+from .tasks import BackgroundSolve
+from .variants import get_rules
 import argparse
 import os
 
 
 class Game:
-    def __init__(self, board_size, num_to_fill=50, debug=False, random_fills_trials=50):
+    def __init__(self, board_size, num_to_fill=50, debug=False, seed=None, box=3,
+                 cache_file=None, pool_file=None, variant='classic', check_budget=0.005):
         """
         Keyword Arguments:
             num_to_fill {int} -- number of cells to fill randomly (default: {50})
+            seed {int} -- seed of the first board (default: {None})
+            box {int} -- box size, 3 for 9x9 boards (default: {3})
+            cache_file {str} -- sqlite file keeping solutions
+                                between runs (default: {None})
+            pool_file {str} -- JSON file keeping ready puzzles
+                               between runs (default: {None})
+            variant {str} -- one of variants.VARIANTS (default: {'classic'})
+            check_budget {float} -- seconds the solvability check of a
+                                    move may take before it goes to
+                                    the background (default: {0.005})
         """
         self.board_size = board_size
-        self.sudoku_board = SudokuBoard(self.board_size)
+        self.cache = SolutionCache(path=cache_file)
+        self.pool = PuzzlePool(path=pool_file)
+        rules = get_rules(variant, box)
+        if rules.is_classic:
+            # start generating before the first board is needed
+            self.pool.request(num_to_fill, box)
+        self.sudoku_board = SudokuBoard(self.board_size, box, self.cache, self.pool, rules,
+                                        check_budget)
         self.num_to_fill = num_to_fill
         self.debug = debug
-        self.random_fills_trials = random_fills_trials
+        self.seed = seed
 
         if self.debug:
             print('[INFO] Debugging mode on.')
 
         self.help_flag = False
+        self.solve_task = None
+
+    def start_solving(self):
+        """
+        Solve the board in the background
+        """
+        self.sudoku_board.selected_cell = None
+        self.solve_task = BackgroundSolve(
+            self.sudoku_board.nums, cache=self.cache, rules=self.sudoku_board.rules)
+
+    def stop_solving(self):
+        """
+        Cancel background solving
+        """
+        self.solve_task.cancel()
+        self.solve_task = None
+        self.sudoku_board.status_text = None
+        print('[INFO] Solving cancelled.')
+
+    def update_solving(self):
+        """
+        Show progress of background solving
+        and apply the solution once it is found
+        """
+        task = self.solve_task
+        if not task.done:
+            self.sudoku_board.status_text = task.progress()
+            return
+        self.solve_task = None
+        self.sudoku_board.status_text = None
+        if task.result is None:
+            print('[INFO] There is no solution!')
+            return
+        print('[INFO] Solved: {} nodes, {:.3f}s'.format(task.nodes, task.elapsed))
+        self.sudoku_board.set_nums(task.result, move=True)
 
     def __mouse_callback(self, event, x, y, *args):
         # cell selection
@@ -29,7 +85,10 @@ class Game:
             if self.help_flag:
                 self.help_flag = False
                 return None
-            cell_size = self.board_size // 9
+            # the board is locked while solving
+            if self.solve_task is not None:
+                return None
+            cell_size = self.board_size // self.sudoku_board.size
             pos_y = y // cell_size
             pos_x = x // cell_size
             self.sudoku_board.select_cell(
@@ -38,6 +97,7 @@ class Game:
             )
 
     def select_board(self):
+        from tkinter import Tk, filedialog
         root = Tk()
         path_to_board = filedialog.askopenfilename(
             parent=root,
@@ -54,6 +114,7 @@ class Game:
         self.sudoku_board.fill_from_file(path_to_board)
 
     def save_board(self):
+        from tkinter import Tk, filedialog
         root = Tk()
         path_to_board = filedialog.asksaveasfilename(
             parent=root,
@@ -96,6 +157,9 @@ class Game:
 
         cv2.putText(**next_help_args('q - quit'))
         cv2.putText(**next_help_args('a - solve automatically'))
+        cv2.putText(**next_help_args('a/esc - stop solving'))
+        cv2.putText(**next_help_args('i - show a hint'))
+        cv2.putText(**next_help_args('u/y - undo/redo'))
         cv2.putText(**next_help_args('o - open saved board'))
         cv2.putText(**next_help_args('s - save board'))
         cv2.putText(**next_help_args('r - refill board randomly'))
@@ -108,9 +172,14 @@ class Game:
     def main_loop(self):
         cv2.namedWindow('Sudoku')
         cv2.setMouseCallback('Sudoku', self.__mouse_callback)
-        self.sudoku_board.fill_random(self.num_to_fill, self.random_fills_trials)
+        self.sudoku_board.fill_random(self.num_to_fill, self.seed)
         # main loop starts here
         while True:
+            if self.solve_task is not None:
+                self.update_solving()
+            self.sudoku_board.poll_solvability()
+            if self.debug:
+                self.sudoku_board.check_state()
             board = self.sudoku_board.numpy()
             if self.help_flag:
                 board = self.write_help(board)
@@ -122,10 +191,25 @@ class Game:
 
             if key == ord('q'):
                 break
+            elif self.solve_task is not None:
+                # only cancelling is allowed while solving
+                if key in (27, ord('a')):
+                    self.stop_solving()
+                continue
             elif key == 27:
                 self.sudoku_board.selected_cell = None
             elif key == ord('a'):
-                self.sudoku_board.auto_solve()
+                self.start_solving()
+            elif key == ord('i'):
+                self.sudoku_board.show_hint()
+                continue
+            # ctrl+z and ctrl+y too
+            elif key in (ord('u'), 26):
+                self.sudoku_board.undo()
+                continue
+            elif key in (ord('y'), 25):
+                self.sudoku_board.redo()
+                continue
             elif key == ord('o'):
                 self.select_board()
             elif key == ord('s'):
@@ -154,4 +238,17 @@ class Game:
                 except Exception as e:
                     pass
 
+        if self.solve_task is not None:
+            self.solve_task.cancel()
         cv2.destroyAllWindows()
+        print('[INFO] Cache: {} hits, {} misses'.format(
+            self.cache.stats.hits, self.cache.stats.misses))
+        self.cache.close()
+        stats = self.pool.stats
+        print('[INFO] Puzzle pool: {:.0%} hit rate, {:.0f} ms to generate a puzzle on average'.format(
+            stats.hit_rate, stats.mean_refill_time * 1000))
+        self.pool.close()
+        self.sudoku_board.solvability.cancel()
+        stats = self.sudoku_board.solvability.stats
+        print('[INFO] Solvability checks: {} within budget, {} in the background, {:.1f} ms at most'.format(
+            stats.checks - stats.background, stats.background, stats.max_time * 1000))
@@ -0,0 +1,270 @@
+"""
+Generator of puzzles with a unique solution
+
+A random complete grid is built by filling
+the diagonal boxes (they do not see each
+other) with random permutations and solving
+the rest. Then clues are removed in random
+order, and a removal is kept only if the
+puzzle still has exactly one solution.
+Every cell is tried once, so the time is
+bounded by one early-exit solution count
+per cell.
+
+Variants (see variants.py) start from an
+empty grid with a few random digits instead,
+as the diagonal boxes may see each other
+through the groups of the variant. Some of
+these starts have no completion and take long
+to refute, so the search is given up after
+<MAX_VARIANT_NODES> nodes for new digits. Killer
+puzzles cut a random solution into cages
+of neighbouring cells with distinct digits.
+"""
+import functools
+import random
+
+from .solver import BitmaskSolver, SolveCancelled, get_solver
+from .variants import get_rules
+
+
+# box size -> default number of clues, fewer
+# clues get slow to generate on big boards
+DEFAULT_CLUES = {2: 6, 3: 30, 4: 120, 5: 400}
+
+# cells of the biggest killer cages generated
+MAX_CAGE = 4
+
+# nodes searched for the completion of random
+# digits of a variant before trying new ones
+MAX_VARIANT_NODES = 500
+
+
+def _completion(grid, rules, max_nodes):
+    """
+    Returns:
+        list or None -- solved grid, None if there is
+                        none or <max_nodes> were searched
+    """
+    solver = get_solver(grid, rules=rules)
+
+    def trace(event, depth):
+        if solver.stats.nodes > max_nodes:
+            solver.cancel()
+
+    solver.trace = trace
+    try:
+        return solver.solve()
+    except SolveCancelled:
+        return None
+
+
+def _random_variant_solution(rng, rules):
+    size = rules.size
+    while True:
+        grid = [[0] * size for _ in range(size)]
+        cells = rng.sample(range(rules.cells), size)
+        for idx in cells:
+            mask = get_solver(grid, rules=rules)._candidates(idx)
+            digits = [d for d in range(1, size + 1) if mask >> d & 1]
+            if digits:
+                grid[idx // size][idx % size] = rng.choice(digits)
+        solution = _completion(grid, rules, MAX_VARIANT_NODES)
+        if solution is not None:
+            return solution
+
+
+def random_solution(rng=random, box=3, rules=None):
+    """
+    Build a random complete grid
+
+    Keyword Arguments:
+        rng {random.Random} -- source of randomness
+        box {int} -- box size, 3 for 9x9 boards (default: {3})
+        rules {variants.Rules} -- rules of a variant (default: {None})
+
+    Returns:
+        list -- solved grid
+    """
+    if rules is not None and not rules.is_classic:
+        return _random_variant_solution(rng, rules)
+    size = box * box
+    while True:
+        grid = [[0] * size for _ in range(size)]
+        for b in range(box):
+            digits = list(range(1, size + 1))
+            rng.shuffle(digits)
+            for k, digit in enumerate(digits):
+                grid[b * box + k // box][b * box + k % box] = digit
+        solution = BitmaskSolver(grid).solve()
+        # small boards may have no completion
+        if solution is not None:
+            return solution
+
+
+def random_cages(solution, rng=random):
+    """
+    Cut a solved grid into killer cages of up
+    to <MAX_CAGE> neighbouring cells without
+    repeated digits, cells left alone join a
+    neighbouring cage where they can
+
+    Arguments:
+        solution {NxN array-like} -- solved grid
+
+    Keyword Arguments:
+        rng {random.Random} -- source of randomness
+
+    Returns:
+        list -- (sum, cells) pairs
+    """
+    size = len(solution)
+    values = [int(value) for row in solution for value in row]
+    # cage of every cell, -1 while it has none
+    cage_of = [-1] * len(values)
+    cages = []
+
+    def neighbours(idx):
+        row, col = divmod(idx, size)
+        return [row_near * size + col_near for row_near, col_near in (
+            (row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1))
+            if 0 <= row_near < size and 0 <= col_near < size]
+
+    def fits(cage, idx):
+        return len(cage) < MAX_CAGE and all(values[near] != values[idx] for near in cage)
+
+    order = list(range(len(values)))
+    rng.shuffle(order)
+    for start in order:
+        if cage_of[start] >= 0:
+            continue
+        cage = [start]
+        cage_of[start] = len(cages)
+        target = rng.randint(2, MAX_CAGE)
+        while len(cage) < target:
+            free = [near for idx in cage for near in neighbours(idx)
+                    if cage_of[near] < 0 and fits(cage, near)]
+            if not free:
+                break
+            near = rng.choice(free)
+            cage.append(near)
+            cage_of[near] = len(cages)
+        cages.append(cage)
+
+    for cage in cages:
+        if len(cage) != 1:
+            continue
+        idx = cage[0]
+        joinable = [cages[cage_of[near]] for near in neighbours(idx)
+                    if len(cages[cage_of[near]]) > 1 and fits(cages[cage_of[near]], idx)]
+        if joinable:
+            target = rng.choice(joinable)
+            target.append(idx)
+            cage.clear()
+            cage_of[idx] = cages.index(target)
+    return [(sum(values[idx] for idx in cage), cage) for cage in cages if cage]
+
+
+def _remove_clues(solution, clues, rng, rules=None):
+    # a removal is kept only if the puzzle stays unique
+    size = len(solution)
+    puzzle = [row[:] for row in solution]
+    filled = size * size
+    cells = list(range(size * size))
+    rng.shuffle(cells)
+    for idx in cells:
+        if filled <= clues:
+            break
+        i, j = divmod(idx, size)
+        value = puzzle[i][j]
+        puzzle[i][j] = 0
+        if get_solver(puzzle, rules=rules).count_solutions(limit=2) == 1:
+            filled -= 1
+        else:
+            puzzle[i][j] = value
+    return puzzle
+
+
+def generate_killer(clues=30, seed=None, rng=None, box=3):
+    """
+    Generate a killer puzzle with a unique
+    solution and new random cages
+
+    Keyword Arguments:
+        clues {int} -- target number of filled cells (default: {30})
+        seed {int} -- seed for reproducible puzzles (default: {None})
+        rng {random.Random} -- source of randomness, overrides <seed>
+        box {int} -- box size, 3 for 9x9 boards (default: {3})
+
+    Returns:
+        tuple -- (puzzle, solution) grids and the variants.Rules
+                 with the cages of the puzzle
+    """
+    if rng is None:
+        rng = random.Random(seed)
+    solution = random_solution(rng, box)
+    rules = get_rules('killer', box, random_cages(solution, rng))
+    return _remove_clues(solution, clues, rng, rules), solution, rules
+
+
+def generate(clues=30, seed=None, rng=None, box=3, rules=None):
+    """
+    Generate a puzzle with a unique solution
+
+    If no puzzle with <clues> clues can be reached
+    by removing cells from the random grid, the
+    puzzle with the fewest clues found is returned.
+
+    Keyword Arguments:
+        clues {int} -- target number of filled cells (default: {30})
+        seed {int} -- seed for reproducible puzzles (default: {None})
+        rng {random.Random} -- source of randomness, overrides <seed>
+        box {int} -- box size, 3 for 9x9 boards (default: {3})
+        rules {variants.Rules} -- rules of a variant, the cages of
+                                  killer rules are kept (default: {None})
+
+    Returns:
+        tuple -- (puzzle, solution) grids, 0 for empty cells
+    """
+    size = box * box
+    assert 0 <= clues <= size * size
+    if rng is None:
+        rng = random.Random(seed)
+    solution = random_solution(rng, box, rules)
+    return _remove_clues(solution, clues, rng, rules), solution
+
+
+def _generate_item(index, clues, seed, box):
+    # every puzzle gets its own seed so the
+    # result does not depend on the workers
+    item_seed = None if seed is None else '{}-{}'.format(seed, index)
+    return generate(clues, seed=item_seed, box=box)
+
+
+def generate_many(count, clues=30, seed=None, workers=None, chunk_size=16, box=3):
+    """
+    Generate puzzles over a process pool
+
+    Puzzles are yielded in order and are the
+    same for the same <seed> whatever the
+    number of workers is.
+
+    Arguments:
+        count {int} -- number of puzzles
+
+    Keyword Arguments:
+        clues {int} -- target number of filled cells (default: {30})
+        seed {int} -- seed for reproducible puzzles (default: {None})
+        workers {int} -- number of processes, 1 generates
+                         in this process (default: {cpu count})
+        chunk_size {int} -- puzzles generated by a worker at once
+        box {int} -- box size, 3 for 9x9 boards (default: {3})
+
+    Yields:
+        tuple -- (puzzle, solution) grids
+    """
+    from .batch import imap_windows
+
+    generate_item = functools.partial(
+        _generate_item, clues=clues, seed=seed, box=box)
+    return imap_windows(generate_item, range(count), workers, chunk_size)
@@ -0,0 +1,163 @@
+"""
+Geometry of N^2 x N^2 boards
+
+A board is made of boxes of <box> x <box>
+cells and has <size> = box * box rows,
+columns, boxes and digits. Cells are
+indexed row by row from 0 to size * size - 1.
+The tables are built once per box size.
+Only <as_board_stack> needs numpy, it is
+imported there so the solvers start
+without it.
+"""
+import functools
+
+
+# symbols of digits 1..25, '0' or '.' is an empty cell
+SYMBOLS = '123456789ABCDEFGHIJKLMNOP'
+
+MIN_BOX = 2
+MAX_BOX = 5
+
+# number of cells of the supported boards
+CELL_COUNTS = tuple((box * box) ** 2 for box in range(MIN_BOX, MAX_BOX + 1))
+
+
+class _BitCount:
+    """
+    Popcount by indexing, for masks too
+    wide for a lookup table
+    """
+
+    def __getitem__(self, mask):
+        return bin(mask).count('1')
+
+
+class Geometry:
+    def __init__(self, box):
+        """
+        Arguments:
+            box {int} -- size of a box, 3 for classic Sudoku
+        """
+        if not MIN_BOX <= box <= MAX_BOX:
+            raise ValueError('Box size must be in {}..{}, got {}'.format(
+                MIN_BOX, MAX_BOX, box))
+        size = box * box
+        self.box = box
+        self.size = size
+        self.cells = size * size
+
+        self.row_of = [idx // size for idx in range(self.cells)]
+        self.col_of = [idx % size for idx in range(self.cells)]
+        self.box_of = [
+            (idx // (size * box)) * box + (idx % size) // box
+            for idx in range(self.cells)
+        ]
+
+        # rows, then columns, then boxes
+        self.units = (
+            [[i * size + j for j in range(size)] for i in range(size)] +
+            [[i * size + j for i in range(size)] for j in range(size)] +
+            [[(b // box) * size * box + (b % box) * box + i * size + j
+              for i in range(box) for j in range(box)] for b in range(size)]
+        )
+
+        # units containing every cell and the
+        # other cells of these units
+        self.cell_units = [[] for _ in range(self.cells)]
+        for unit_index, unit in enumerate(self.units):
+            for idx in unit:
+                self.cell_units[idx].append(unit_index)
+        self.peers = [
+            sorted({peer for unit_index in self.cell_units[idx]
+                    for peer in self.units[unit_index]} - {idx})
+            for idx in range(self.cells)
+        ]
+
+        # bits 1..size are used for digits 1..size
+        self.all_digits = ((1 << size) - 1) << 1
+        self.digit_of = {1 << d: d for d in range(1, size + 1)}
+        self.symbols = SYMBOLS[:size]
+
+        # number of candidates in a mask
+        if size <= 16:
+            self.popcount = [bin(m).count('1') for m in range(1 << (size + 1))]
+        else:
+            self.popcount = _BitCount()
+
+
+@functools.lru_cache(maxsize=None)
+def geometry(box=3):
+    """
+    Geometry of boards with <box> x <box> boxes
+
+    Keyword Arguments:
+        box {int} -- size of a box (default: {3})
+
+    Returns:
+        Geometry -- shared tables
+    """
+    return Geometry(box)
+
+
+def box_of_size(size):
+    """
+    Box size of a board with <size> rows
+
+    Arguments:
+        size {int} -- number of rows (4, 9, 16 or 25)
+
+    Raises:
+        ValueError -- if <size> is not a square
+
+    Returns:
+        int -- box size
+    """
+    box = int(round(size ** 0.5))
+    if box * box != size or not MIN_BOX <= box <= MAX_BOX:
+        raise ValueError('Board must have 4, 9, 16 or 25 rows, got {}'.format(size))
+    return box
+
+
+def geometry_of(grid):
+    """
+    Geometry of a square grid
+
+    Arguments:
+        grid {array-like} -- size x size grid
+
+    Returns:
+        Geometry -- shared tables
+    """
+    return geometry(box_of_size(len(grid)))
+
+
+def as_board_stack(boards):
+    """
+    View boards as an (N, cells) array
+
+    A 2D array is a single board unless its rows
+    have 16, 81, 256 or 625 cells, so a single
+    16x16 board must be passed as (1, 16, 16).
+
+    Arguments:
+        boards {array-like} -- (N, size, size), (N, cells),
+                               (size, size) or (cells,) array
+
+    Raises:
+        ValueError -- if the boards are not square
+
+    Returns:
+        tuple -- (N, cells) array and its Geometry
+    """
+    import numpy as np
+
+    boards = np.asarray(boards)
+    if boards.ndim == 1 or (boards.ndim == 2 and boards.shape[1] not in CELL_COUNTS):
+        boards = boards[np.newaxis]
+    n = boards.shape[0]
+    cells = int(np.prod(boards.shape[1:]))
+    size = int(round(cells ** 0.5))
+    if size * size != cells:
+        raise ValueError('Board must be square, got {} cells'.format(cells))
+    return boards.reshape(n, cells), geometry(box_of_size(size))
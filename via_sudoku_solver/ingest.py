@@ -0,0 +1,260 @@
+"""
+Reading puzzles from images
+
+Scans, photos and screenshots go through:
+    1. the grid is found as the largest
+       four-cornered contour that is about
+       square (the top square of the image
+       if there is none, e.g. a screenshot
+       of the game) and warped to a square
+       of <CELL_PX> pixels per cell
+    2. the cells are views of the warped
+       image, trimmed of grid lines, empty
+       if they hold almost no ink
+    3. the ink of every filled cell is cut
+       to its bounding box, padded square and
+       scaled to <GLYPH> x <GLYPH>, and all of
+       them are compared at once (normalized
+       cross-correlation as one matrix product)
+       with the Hershey glyphs the game renders
+       digits with, at a few thicknesses
+
+The correlation of the best glyph is the
+confidence of a cell, empty cells get one
+minus their ink relative to the threshold.
+"""
+import collections
+import functools
+
+import numpy as np
+import cv2
+
+from .geometry import SYMBOLS
+
+
+# pixels per cell of the warped grid
+CELL_PX = 40
+# side of the normalized glyphs
+GLYPH = 20
+# share of the cell trimmed on every side
+MARGIN = 0.15
+# cells with less ink than this share are empty
+EMPTY_INK = 0.03
+# components smaller than this share of the
+# largest one of a cell are noise
+SPECK_SHARE = 0.2
+# stroke thickness of the rendered templates
+TEMPLATE_THICKNESS = (1, 2, 3, 4)
+
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+
+ReadResult = collections.namedtuple('ReadResult', ['grid', 'confidence', 'found'])
+
+
+def _normalize(glyphs):
+    """
+    Zero mean, unit norm rows, so a dot
+    product is a normalized correlation
+    """
+    glyphs = glyphs.reshape(len(glyphs), -1).astype('float32')
+    glyphs -= glyphs.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(glyphs, axis=1, keepdims=True)
+    return glyphs / np.maximum(norms, 1e-6)
+
+
+def _strokes(cell):
+    """
+    Ink of a cell without specks: connected
+    components much smaller than the largest
+    one are dropped
+    """
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(
+        cell.astype('uint8'), connectivity=8)
+    if count <= 2:
+        return cell
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    keep = np.flatnonzero(areas >= SPECK_SHARE * areas.max()) + 1
+    return np.isin(labels, keep)
+
+
+def _glyph(ink):
+    """
+    Cut <ink> to its bounding box, pad it
+    square (keeping the aspect ratio) and
+    scale it to GLYPH x GLYPH
+    """
+    ys, xs = np.nonzero(ink)
+    if len(ys) == 0:
+        return np.zeros((GLYPH, GLYPH), dtype='float32')
+    ink = ink[ys.min():ys.max() + 1, xs.min():xs.max() + 1]
+    height, width = ink.shape
+    side = max(height, width)
+    square = np.zeros((side, side), dtype='uint8')
+    y = (side - height) // 2
+    x = (side - width) // 2
+    square[y:y + height, x:x + width] = ink
+    return cv2.resize(square, (GLYPH, GLYPH), interpolation=cv2.INTER_AREA)
+
+
+@functools.lru_cache(maxsize=None)
+def _templates(size):
+    """
+    Normalized glyphs of digits 1..size
+
+    Large clean glyphs are drawn at a few
+    thicknesses, and small ones as the game
+    draws them into a cell go through the same
+    thresholding as the cells of an image.
+
+    Returns:
+        np.ndarray -- (size, variants, GLYPH * GLYPH)
+    """
+    margin = int(round(MARGIN * CELL_PX))
+    glyphs = []
+    for symbol in SYMBOLS[:size]:
+        for thickness in TEMPLATE_THICKNESS:
+            canvas = np.zeros((120, 120), dtype='uint8')
+            cv2.putText(canvas, symbol, (20, 95), cv2.FONT_HERSHEY_SIMPLEX,
+                        2.5, 255, thickness * 2, cv2.LINE_AA)
+            glyphs.append(_glyph(canvas > 127))
+        for thickness in (1, 2):
+            # position and scale of BoardRenderer
+            cell = np.full((CELL_PX, CELL_PX), 255, dtype='uint8')
+            cv2.putText(cell, symbol, (int(0.35 * CELL_PX), int(0.68 * CELL_PX)),
+                        cv2.FONT_HERSHEY_SIMPLEX, CELL_PX / 66, 0, thickness, cv2.LINE_AA)
+            ink = _ink(cell)[margin:CELL_PX - margin, margin:CELL_PX - margin]
+            glyphs.append(_glyph(_strokes(ink)))
+    return _normalize(np.array(glyphs)).reshape(size, len(glyphs) // size, -1)
+
+
+def _ink(gray):
+    """
+    Dark strokes of a grayscale image
+    """
+    return cv2.adaptiveThreshold(cv2.GaussianBlur(gray, (3, 3), 0), 255,
+                                 cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV,
+                                 15, 10) > 0
+
+
+def _order_corners(points):
+    # top-left, top-right, bottom-right, bottom-left
+    points = points.reshape(4, 2).astype('float32')
+    sums = points.sum(axis=1)
+    diffs = np.diff(points, axis=1).ravel()
+    return np.array([points[np.argmin(sums)], points[np.argmin(diffs)],
+                     points[np.argmax(sums)], points[np.argmax(diffs)]], dtype='float32')
+
+
+def find_grid(gray):
+    """
+    Find the corners of the grid
+
+    Arguments:
+        gray {np.ndarray} -- grayscale image
+
+    Returns:
+        tuple -- ((4, 2) corners from the top-left clockwise,
+                  whether a grid contour was found)
+    """
+    height, width = gray.shape
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    edges = cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                  cv2.THRESH_BINARY_INV, 11, 2)
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        area = cv2.contourArea(contour)
+        if area < 0.2 * height * width:
+            break
+        approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        if len(approx) != 4 or not cv2.isContourConvex(approx):
+            continue
+        _, _, box_width, box_height = cv2.boundingRect(approx)
+        if 0.8 <= box_width / box_height <= 1.25:
+            return _order_corners(approx), True
+    side = min(height, width)
+    corners = np.array([[0, 0], [side, 0], [side, side], [0, side]], dtype='float32')
+    return corners, False
+
+
+def read_grid(image, box=3):
+    """
+    Read a puzzle from an image
+
+    Arguments:
+        image {str or np.ndarray} -- path or BGR/grayscale image
+
+    Keyword Arguments:
+        box {int} -- box size of the puzzle (default: {3})
+
+    Raises:
+        ValueError -- if the image cannot be read
+
+    Returns:
+        ReadResult -- (size, size) uint8 grid, 0 for empty
+                      cells, (size, size) confidence in 0..1
+                      and whether a grid contour was found
+    """
+    if isinstance(image, str):
+        path = image
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise ValueError('Cannot read image {}'.format(path))
+    elif image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+    size = box * box
+    side = CELL_PX * size
+    corners, found = find_grid(image)
+    target = np.array([[0, 0], [side, 0], [side, side], [0, side]], dtype='float32')
+    warped = cv2.warpPerspective(
+        image, cv2.getPerspectiveTransform(corners, target), (side, side))
+    ink = _ink(warped)
+
+    # (row, col, y, x) views of the cell interiors
+    margin = int(round(MARGIN * CELL_PX))
+    cells = ink.reshape(size, CELL_PX, size, CELL_PX).swapaxes(1, 2)
+    cells = cells[:, :, margin:CELL_PX - margin, margin:CELL_PX - margin]
+    ink_share = cells.mean(axis=(2, 3))
+    filled = ink_share >= EMPTY_INK
+
+    grid = np.zeros((size, size), dtype='uint8')
+    confidence = np.clip(1 - ink_share / EMPTY_INK, 0, 1).astype('float32')
+    rows, cols = np.nonzero(filled)
+    if len(rows):
+        glyphs = _normalize(np.array([
+            _glyph(_strokes(cells[i, j])) for i, j in zip(rows, cols)]))
+        templates = _templates(size)
+        # (cells, digits, thicknesses) correlations
+        scores = np.einsum('kg,dtg->kdt', glyphs, templates).max(axis=2)
+        grid[rows, cols] = scores.argmax(axis=1) + 1
+        confidence[rows, cols] = np.clip(scores.max(axis=1), 0, 1)
+    return ReadResult(grid, confidence, found)
+
+
+def image_to_board(image, box=3, width=600):
+    """
+    Read a puzzle from an image into a new board,
+    the digits read are the givens
+
+    Returns:
+        SudokuBoard -- the board
+    """
+    from .board import SudokuBoard
+    from .formats import load_into_board
+
+    board = SudokuBoard(width, box)
+    load_into_board(board, read_grid(image, box).grid)
+    return board
+
+
+def read_image(path, box=3):
+    """
+    Read an image for batch processing
+
+    Returns:
+        tuple -- (path, ReadResult or None, error message or None)
+    """
+    try:
+        return path, read_grid(path, box), None
+    except (ValueError, cv2.error) as e:
+        return path, None, str(e)
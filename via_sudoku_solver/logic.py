@@ -0,0 +1,384 @@
+"""
+Logical solver using human techniques
+
+Candidates of every cell are kept as
+bitmasks like in the bitmask solver, but
+instead of guessing, techniques are tried
+in order of cost and the first one that
+makes progress is applied:
+    naked and hidden singles,
+    naked and hidden pairs and triples,
+    pointing and claiming,
+    X-Wing and Swordfish.
+After every step the cheapest technique
+is tried again. The techniques used tell
+how hard the puzzle is for a human, and
+the first placement is a hint.
+"""
+import collections
+import itertools
+
+from .geometry import geometry_of
+
+
+# name, difficulty level, in order of cost
+TECHNIQUES = (
+    ('naked_single', 'easy'),
+    ('hidden_single', 'easy'),
+    ('naked_pair', 'medium'),
+    ('hidden_pair', 'medium'),
+    ('naked_triple', 'medium'),
+    ('hidden_triple', 'medium'),
+    ('pointing', 'medium'),
+    ('claiming', 'medium'),
+    ('x_wing', 'hard'),
+    ('swordfish', 'hard'),
+)
+
+# 'expert' puzzles need more than these techniques
+LEVELS = ('easy', 'medium', 'hard', 'expert')
+
+LEVEL_OF = dict(TECHNIQUES)
+
+# placements and eliminations are (row, col, digit)
+Step = collections.namedtuple(
+    'Step', ['technique', 'placements', 'eliminations'])
+
+Hint = collections.namedtuple('Hint', ['row', 'col', 'digit', 'techniques'])
+
+Grade = collections.namedtuple('Grade', ['level', 'solved', 'techniques'])
+
+
+class LogicalSolver:
+    def __init__(self, grid):
+        """
+        Arguments:
+            grid {NxN array-like} -- board to solve, 0 for empty cells
+        """
+        geo = self.geometry = geometry_of(grid)
+        size = geo.size
+        self.values = [int(grid[i][j]) for i in range(size) for j in range(size)]
+        self.candidates = [0] * geo.cells
+        # number of steps of every technique
+        self.counts = collections.Counter()
+        self.consistent = True
+
+        used = [0] * len(geo.units)
+        for idx, value in enumerate(self.values):
+            if value == 0:
+                continue
+            bit = 1 << value
+            for unit_index in geo.cell_units[idx]:
+                if value > size or used[unit_index] & bit:
+                    self.consistent = False
+                used[unit_index] |= bit
+        for idx, value in enumerate(self.values):
+            if value == 0:
+                mask = geo.all_digits
+                for unit_index in geo.cell_units[idx]:
+                    mask &= ~used[unit_index]
+                self.candidates[idx] = mask
+
+        self.techniques = [(name, getattr(self, '_' + name)) for name, _ in TECHNIQUES]
+
+    @property
+    def solved(self):
+        return self.consistent and all(self.values)
+
+    def _cell(self, idx, digit):
+        row, col = divmod(idx, self.geometry.size)
+        return row, col, digit
+
+    def _digits(self, mask):
+        digit_of = self.geometry.digit_of
+        while mask:
+            bit = mask & -mask
+            mask ^= bit
+            yield digit_of[bit]
+
+    def _place(self, idx, digit, technique):
+        bit = 1 << digit
+        self.values[idx] = digit
+        self.candidates[idx] = 0
+        candidates = self.candidates
+        for peer in self.geometry.peers[idx]:
+            candidates[peer] &= ~bit
+        return Step(technique, [self._cell(idx, digit)], [])
+
+    def _eliminate(self, eliminations, technique):
+        """
+        Remove candidates
+
+        Arguments:
+            eliminations {list} -- (cell, mask of digits) pairs
+            technique {str} -- name of the technique
+
+        Returns:
+            Step or None -- None if nothing was removed
+        """
+        removed = []
+        candidates = self.candidates
+        for idx, mask in eliminations:
+            mask &= candidates[idx]
+            if mask:
+                candidates[idx] &= ~mask
+                removed.extend(self._cell(idx, digit) for digit in self._digits(mask))
+        if not removed:
+            return None
+        return Step(technique, [], removed)
+
+    def _naked_single(self):
+        for idx, mask in enumerate(self.candidates):
+            if mask and not mask & (mask - 1):
+                return self._place(idx, self.geometry.digit_of[mask], 'naked_single')
+        # an empty cell without candidates
+        for mask, value in zip(self.candidates, self.values):
+            if not mask and not value:
+                self.consistent = False
+                break
+        return None
+
+    def _hidden_single(self):
+        geo = self.geometry
+        values, candidates = self.values, self.candidates
+        for unit in geo.units:
+            once = twice = placed = 0
+            for idx in unit:
+                mask = candidates[idx]
+                twice |= once & mask
+                once |= mask
+                placed |= 1 << values[idx]
+            if (once | placed) & geo.all_digits != geo.all_digits:
+                # a digit has no place in the unit
+                self.consistent = False
+                return None
+            single = once & ~twice
+            if single:
+                bit = single & -single
+                for idx in unit:
+                    if candidates[idx] & bit:
+                        return self._place(idx, geo.digit_of[bit], 'hidden_single')
+        return None
+
+    def _naked_subset(self, k, technique):
+        popcount = self.geometry.popcount
+        candidates = self.candidates
+        for unit in self.geometry.units:
+            empty = [idx for idx in unit if candidates[idx]]
+            if len(empty) <= k:
+                continue
+            small = [idx for idx in empty if popcount[candidates[idx]] <= k]
+            for subset in itertools.combinations(small, k):
+                union = 0
+                for idx in subset:
+                    union |= candidates[idx]
+                if popcount[union] != k:
+                    continue
+                step = self._eliminate(
+                    [(idx, union) for idx in empty if idx not in subset], technique)
+                if step is not None:
+                    return step
+        return None
+
+    def _hidden_subset(self, k, technique):
+        geo = self.geometry
+        popcount = geo.popcount
+        candidates = self.candidates
+        for unit in geo.units:
+            if sum(1 for idx in unit if candidates[idx]) <= k:
+                continue
+            # positions in the unit of every digit
+            positions = {}
+            for pos, idx in enumerate(unit):
+                for digit in self._digits(candidates[idx]):
+                    positions[digit] = positions.get(digit, 0) | 1 << pos
+            digits = [digit for digit, mask in positions.items() if popcount[mask] <= k]
+            for subset in itertools.combinations(digits, k):
+                union = 0
+                keep = 0
+                for digit in subset:
+                    union |= positions[digit]
+                    keep |= 1 << digit
+                if popcount[union] != k:
+                    continue
+                step = self._eliminate(
+                    [(unit[pos], ~keep) for pos in range(len(unit)) if union >> pos & 1],
+                    technique)
+                if step is not None:
+                    return step
+        return None
+
+    def _naked_pair(self):
+        return self._naked_subset(2, 'naked_pair')
+
+    def _hidden_pair(self):
+        return self._hidden_subset(2, 'hidden_pair')
+
+    def _naked_triple(self):
+        return self._naked_subset(3, 'naked_triple')
+
+    def _hidden_triple(self):
+        return self._hidden_subset(3, 'hidden_triple')
+
+    def _intersection(self, bases, covers, technique):
+        """
+        Eliminate a digit confined to the
+        intersection of a base unit and a
+        cover unit from the rest of the cover
+        """
+        geo = self.geometry
+        candidates = self.candidates
+        for base in bases:
+            unit = geo.units[base]
+            for digit in range(1, geo.size + 1):
+                bit = 1 << digit
+                cells = [idx for idx in unit if candidates[idx] & bit]
+                if not cells:
+                    continue
+                for cover in covers:
+                    shared = {geo.cell_units[idx][cover] for idx in cells}
+                    if len(shared) != 1:
+                        continue
+                    rest = geo.units[shared.pop()]
+                    step = self._eliminate(
+                        [(idx, bit) for idx in rest if idx not in unit], technique)
+                    if step is not None:
+                        return step
+        return None
+
+    def _pointing(self):
+        # boxes pointing along rows or columns,
+        # cell_units are (row, column, box)
+        size = self.geometry.size
+        return self._intersection(range(2 * size, 3 * size), (0, 1), 'pointing')
+
+    def _claiming(self):
+        size = self.geometry.size
+        return self._intersection(range(2 * size), (2,), 'claiming')
+
+    def _fish(self, k, technique):
+        geo = self.geometry
+        size = geo.size
+        popcount = geo.popcount
+        candidates = self.candidates
+        for digit in range(1, geo.size + 1):
+            bit = 1 << digit
+            # rows covering columns, then columns covering rows
+            for bases, covers in ((range(size), range(size, 2 * size)),
+                                  (range(size, 2 * size), range(size))):
+                positions = []
+                for base in bases:
+                    mask = 0
+                    for pos, idx in enumerate(geo.units[base]):
+                        if candidates[idx] & bit:
+                            mask |= 1 << pos
+                    if 2 <= popcount[mask] <= k:
+                        positions.append((base, mask))
+                for subset in itertools.combinations(positions, k):
+                    union = 0
+                    for _, mask in subset:
+                        union |= mask
+                    if popcount[union] != k:
+                        continue
+                    fish = {idx for base, _ in subset for idx in geo.units[base]}
+                    eliminations = [
+                        (idx, bit)
+                        for pos in range(size) if union >> pos & 1
+                        for idx in geo.units[covers[pos]] if idx not in fish
+                    ]
+                    step = self._eliminate(eliminations, technique)
+                    if step is not None:
+                        return step
+        return None
+
+    def _x_wing(self):
+        return self._fish(2, 'x_wing')
+
+    def _swordfish(self):
+        return self._fish(3, 'swordfish')
+
+    def step(self):
+        """
+        Apply the cheapest technique
+        that makes progress
+
+        Returns:
+            Step or None -- None if the board is solved,
+                            inconsistent or no technique
+                            applies
+        """
+        if not self.consistent:
+            return None
+        for name, technique in self.techniques:
+            step = technique()
+            if not self.consistent:
+                return None
+            if step is not None:
+                self.counts[name] += 1
+                return step
+        return None
+
+    def solve(self):
+        """
+        Apply techniques while they make progress
+
+        Returns:
+            bool -- whether the board got solved
+        """
+        while not self.solved and self.step() is not None:
+            pass
+        return self.solved
+
+    def grid(self):
+        size = self.geometry.size
+        return [self.values[i * size:(i + 1) * size] for i in range(size)]
+
+
+def grade(grid):
+    """
+    Grade the difficulty of a puzzle
+
+    Arguments:
+        grid {NxN array-like} -- puzzle, 0 for empty cells
+
+    Returns:
+        Grade -- level ('easy', 'medium', 'hard', 'expert'
+                 or 'invalid' if the givens contradict),
+                 whether the techniques solved it and the
+                 number of steps of every technique used
+    """
+    solver = LogicalSolver(grid)
+    solved = solver.solve()
+    if not solver.consistent:
+        level = 'invalid'
+    elif not solved:
+        level = 'expert'
+    else:
+        level = max((LEVEL_OF[name] for name in solver.counts),
+                    key=LEVELS.index, default='easy')
+    return Grade(level, solved, dict(solver.counts))
+
+
+def next_hint(grid):
+    """
+    Find the next cell that can be filled
+    by logic alone
+
+    Arguments:
+        grid {NxN array-like} -- board, 0 for empty cells
+
+    Returns:
+        Hint or None -- cell, its digit and the techniques
+                        applied to find it, None if there
+                        is no such cell
+    """
+    solver = LogicalSolver(grid)
+    techniques = []
+    while True:
+        step = solver.step()
+        if step is None:
+            return None
+        techniques.append(step.technique)
+        if step.placements:
+            row, col, digit = step.placements[0]
+            return Hint(row, col, digit, techniques)
@@ -0,0 +1,230 @@
+"""
+Parallel search of a single puzzle
+
+The search tree is split at its top levels:
+the most constrained cell of the propagated
+board is branched on until there are a few
+subproblems per worker, every subproblem is
+the board with the guesses made so far.
+
+A worker explores its subproblem depth-first
+with the bitmask solver for at most <budget>
+nodes. When the budget runs out, the parts of
+the subtree it did not reach are sent back as
+new subproblems (re-splitting), so one large
+subtree does not keep a single worker busy
+while the others idle. Subproblems are
+disjoint, so every solution is found once.
+
+Finding one solution terminates the pool as
+soon as it arrives. Enumeration yields the
+solutions as workers report them, so their
+order depends on the scheduling.
+"""
+import multiprocessing
+import os
+import queue
+
+from .solver import BitmaskSolver
+
+
+# nodes a worker explores before splitting again
+DEFAULT_BUDGET = 2000
+
+# initial subproblems per worker
+SPLIT_FACTOR = 4
+
+
+def _explore(solver, budget, limit, found, frontier):
+    """
+    Depth-first search of the solver's board
+    appending solutions to <found> and boards
+    left unexplored past <budget> nodes to <frontier>
+
+    Returns:
+        bool -- whether <limit> solutions were found
+    """
+    solver.stats.nodes += 1
+    checkpoint = solver.trail.checkpoint()
+    best = solver._propagate()
+    try:
+        if best == -1:
+            found.append(solver.grid())
+            return limit is not None and len(found) >= limit
+        if best < 0:
+            return False
+        if solver.stats.nodes > budget:
+            frontier.append(solver.grid())
+            return False
+        mask = solver._candidates(best)
+        while mask:
+            bit = mask & -mask
+            mask ^= bit
+            branch = solver.trail.checkpoint()
+            solver._place(best, bit)
+            solver.trail.push(best, 0)
+            try:
+                if _explore(solver, budget, limit, found, frontier):
+                    return True
+            finally:
+                solver._rollback(branch)
+        return False
+    finally:
+        solver._rollback(checkpoint)
+
+
+def explore(grid, budget=DEFAULT_BUDGET, limit=None):
+    """
+    Explore the subtree of a board
+
+    Arguments:
+        grid {NxN array-like} -- board, 0 for empty cells
+
+    Keyword Arguments:
+        budget {int} -- nodes to visit before returning
+                        the rest as subproblems (default: {2000})
+        limit {int} -- stop after this many solutions (default: {None})
+
+    Returns:
+        tuple -- (solutions, unexplored boards, nodes visited)
+    """
+    solver = BitmaskSolver(grid)
+    found = []
+    frontier = []
+    if solver.consistent:
+        _explore(solver, budget, limit, found, frontier)
+    return found, frontier, solver.stats.nodes
+
+
+def _explore_item(grid, budget, limit):
+    return explore(grid, budget, limit)
+
+
+def split(grid, count):
+    """
+    Split the search of a board into
+    at least <count> subproblems, branching
+    breadth-first on the most constrained cell
+
+    Arguments:
+        grid {NxN array-like} -- board, 0 for empty cells
+        count {int} -- subproblems wanted
+
+    Returns:
+        tuple -- (solutions found while splitting, subproblems)
+    """
+    found = []
+    subproblems = [[[int(value) for value in row] for row in grid]]
+    start = 0
+    while start < len(subproblems) and len(subproblems) - start < count:
+        # a budget of one node branches once
+        solutions, children, _ = explore(subproblems[start], budget=1)
+        start += 1
+        found.extend(solutions)
+        subproblems.extend(children)
+    return found, subproblems[start:]
+
+
+def iter_solutions(grid, jobs=None, limit=None, budget=DEFAULT_BUDGET):
+    """
+    Enumerate solutions over a process pool,
+    yielding them as they are found
+
+    Arguments:
+        grid {NxN array-like} -- board to solve, 0 for empty cells
+
+    Keyword Arguments:
+        jobs {int} -- number of processes, 1 searches
+                      in this process (default: {cpu count})
+        limit {int} -- stop after this many solutions,
+                       None for all of them (default: {None})
+        budget {int} -- nodes explored by a worker before
+                        it splits its subproblem (default: {2000})
+
+    Yields:
+        list -- solved grid
+    """
+    if jobs == 1:
+        count = 0
+        for solution in BitmaskSolver(grid).iter_solutions():
+            yield solution
+            count += 1
+            if count == limit:
+                return
+        return
+
+    jobs = jobs or os.cpu_count() or 1
+    count = 0
+    found, pending = split(grid, jobs * SPLIT_FACTOR)
+    for solution in found:
+        yield solution
+        count += 1
+        if count == limit:
+            return
+
+    results = queue.Queue()
+    # leaving the block terminates the workers,
+    # also when the caller stops iterating
+    with multiprocessing.Pool(jobs) as pool:
+        running = 0
+        while pending or running:
+            # a couple of subproblems per worker are queued,
+            # the rest waits here to be explored depth-first
+            while pending and running < 2 * jobs:
+                remaining = None if limit is None else limit - count
+                pool.apply_async(
+                    _explore_item, (pending.pop(), budget, remaining),
+                    callback=results.put, error_callback=results.put)
+                running += 1
+            result = results.get()
+            running -= 1
+            if isinstance(result, BaseException):
+                raise result
+            solutions, frontier, _ = result
+            pending.extend(frontier)
+            for solution in solutions:
+                yield solution
+                count += 1
+                if count == limit:
+                    return
+
+
+def solve(grid, jobs=None, budget=DEFAULT_BUDGET):
+    """
+    Find a solution over a process pool,
+    the workers are stopped as soon as
+    one of them finds it
+
+    Arguments:
+        grid {NxN array-like} -- board to solve, 0 for empty cells
+
+    Keyword Arguments:
+        jobs {int} -- number of processes (default: {cpu count})
+        budget {int} -- nodes explored by a worker before
+                        it splits its subproblem (default: {2000})
+
+    Returns:
+        list or None -- solved grid
+                        or None if there is no solution
+    """
+    for solution in iter_solutions(grid, jobs, 1, budget):
+        return solution
+    return None
+
+
+def count_solutions(grid, limit=None, jobs=None, budget=DEFAULT_BUDGET):
+    """
+    Count solutions over a process pool
+
+    Arguments:
+        grid {NxN array-like} -- board to check, 0 for empty cells
+
+    Keyword Arguments:
+        limit {int} -- max number of solutions to count (default: {None})
+        jobs {int} -- number of processes (default: {cpu count})
+        budget {int} -- see <iter_solutions>
+
+    Returns:
+        int -- number of solutions, at most <limit>
+    """
+    return sum(1 for _ in iter_solutions(grid, jobs, limit, budget))
@@ -0,0 +1,236 @@
+"""
+Pool of pre-generated puzzles
+
+Generating a puzzle with few clues takes a
+noticeable time, so a worker thread keeps a
+few ready puzzles for every requested kind
+(box size, number of clues and optionally a
+difficulty level, see logic.grade) and the
+game takes one without waiting. The pool is
+only bypassed when it is empty.
+
+The pool can be saved to a JSON file on close
+and loaded on the next start, so the first
+board of the next game is ready at once.
+"""
+import collections
+import json
+import os
+import random
+import threading
+import time
+
+from .formats import format_puzzle, parse_puzzle
+from .generator import generate
+from .logic import grade
+
+
+DEFAULT_SIZE = 8
+
+# attempts to generate a puzzle of the requested level
+MAX_LEVEL_TRIES = 50
+
+
+class PoolStats:
+    """
+    Statistics of a pool
+
+    Attributes:
+        hits {int} -- puzzles taken from the pool
+        misses {int} -- puzzles generated on request
+                        because the pool was empty
+        generated {int} -- puzzles generated by the worker
+        refill_time {float} -- time the worker spent generating (s)
+        max_refill_time {float} -- longest generation of a puzzle (s)
+    """
+    FIELDS = ('hits', 'misses', 'generated', 'refill_time', 'max_refill_time')
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.refill_time = 0.0
+        self.max_refill_time = 0.0
+
+    @property
+    def hit_rate(self):
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    @property
+    def mean_refill_time(self):
+        return self.refill_time / self.generated if self.generated else 0.0
+
+    def as_dict(self):
+        stats = {field: getattr(self, field) for field in self.FIELDS}
+        stats['hit_rate'] = self.hit_rate
+        stats['mean_refill_time'] = self.mean_refill_time
+        return stats
+
+    def __repr__(self):
+        return 'PoolStats({})'.format(', '.join(
+            '{}={}'.format(field, getattr(self, field)) for field in self.FIELDS))
+
+
+def generate_puzzle(clues, box=3, level=None, rng=None):
+    """
+    Generate a puzzle, of <level> if possible
+
+    Keyword Arguments:
+        box {int} -- box size (default: {3})
+        level {str} -- wanted level, see logic.grade, the
+                       last puzzle is kept if none of
+                       <MAX_LEVEL_TRIES> has it (default: {None})
+        rng {random.Random} -- source of randomness
+
+    Returns:
+        tuple -- (puzzle, solution) grids
+    """
+    rng = rng or random.Random()
+    for _ in range(MAX_LEVEL_TRIES):
+        puzzle, solution = generate(clues, rng=rng, box=box)
+        if level is None or grade(puzzle).level == level:
+            break
+    return puzzle, solution
+
+
+class PuzzlePool:
+    def __init__(self, size=DEFAULT_SIZE, path=None):
+        """
+        Keyword Arguments:
+            size {int} -- puzzles kept ready of every kind (default: {8})
+            path {str} -- JSON file to load the pool from and
+                          save it to on <close> (default: {None})
+        """
+        self.size = size
+        self.path = path
+        self.stats = PoolStats()
+        # (box, clues, level) -> ready (puzzle, solution) pairs
+        self.ready = collections.defaultdict(collections.deque)
+        # kinds the worker keeps full
+        self.kinds = []
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.rng = random.Random()
+        if path is not None and os.path.exists(path):
+            self.load(path)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def request(self, clues, box=3, level=None):
+        """
+        Keep puzzles of this kind ready
+        """
+        kind = (box, clues, level)
+        with self.lock:
+            if kind not in self.kinds:
+                self.kinds.append(kind)
+        self.wakeup.set()
+
+    def pop(self, clues, box=3, level=None):
+        """
+        Take a ready puzzle, O(1)
+
+        Returns:
+            tuple or None -- (puzzle, solution) grids,
+                             None if the pool is empty
+        """
+        self.request(clues, box, level)
+        with self.lock:
+            ready = self.ready[(box, clues, level)]
+            if not ready:
+                return None
+            return ready.popleft()
+
+    def get(self, clues, box=3, level=None):
+        """
+        Take a ready puzzle or generate
+        one now if the pool is empty
+
+        Returns:
+            tuple -- (puzzle, solution) grids
+        """
+        puzzle = self.pop(clues, box, level)
+        if puzzle is not None:
+            self.stats.hits += 1
+            return puzzle
+        self.stats.misses += 1
+        return generate_puzzle(clues, box, level)
+
+    def _next_kind(self):
+        # the emptiest requested kind that is not full
+        with self.lock:
+            kinds = [kind for kind in self.kinds if len(self.ready[kind]) < self.size]
+            if not kinds:
+                return None
+            return min(kinds, key=lambda kind: len(self.ready[kind]))
+
+    def _run(self):
+        while not self.stopped:
+            kind = self._next_kind()
+            if kind is None:
+                self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+            box, clues, level = kind
+            start = time.perf_counter()
+            puzzle = generate_puzzle(clues, box, level, self.rng)
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.ready[kind].append(puzzle)
+                self.stats.generated += 1
+                self.stats.refill_time += elapsed
+                self.stats.max_refill_time = max(self.stats.max_refill_time, elapsed)
+
+    def __len__(self):
+        with self.lock:
+            return sum(len(ready) for ready in self.ready.values())
+
+    def load(self, path):
+        """
+        Add the puzzles saved in a JSON file,
+        a broken file is ignored
+        """
+        try:
+            with open(path) as f:
+                records = json.load(f)['puzzles']
+            loaded = [
+                ((record['box'], record['clues'], record['level']),
+                 (parse_puzzle(record['puzzle']), parse_puzzle(record['solution'])))
+                for record in records
+            ]
+        except (OSError, ValueError, KeyError, TypeError):
+            print('[INFO] Could not load puzzle pool from {}'.format(path))
+            return
+        with self.lock:
+            for kind, puzzle in loaded:
+                self.ready[kind].append(puzzle)
+
+    def save(self, path):
+        """
+        Save the ready puzzles to a JSON file
+        """
+        with self.lock:
+            records = [
+                {'box': box, 'clues': clues, 'level': level,
+                 'puzzle': format_puzzle(puzzle), 'solution': format_puzzle(solution)}
+                for (box, clues, level), ready in self.ready.items()
+                for puzzle, solution in ready
+            ]
+        # written aside first so a crash keeps the old file
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump({'puzzles': records}, f)
+        os.replace(temp_path, path)
+
+    def close(self):
+        """
+        Stop the worker and save the pool if it
+        has a file. A puzzle being generated
+        is finished in the background.
+        """
+        self.stopped = True
+        self.wakeup.set()
+        if self.path is not None:
+            self.save(self.path)
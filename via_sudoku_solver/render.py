@@ -0,0 +1,254 @@
+"""
+Cached rendering of the board
+
+The grid is drawn once into a base image.
+Every cell is a tile (the part of the cell
+not covered by grid lines) blitted from
+pre-rendered sprites: one per tile size,
+digit and background. Only the cells the
+board marked dirty are redrawn, and an
+unchanged board returns the last frame.
+
+Cells breaking a rule are highlighted, and the
+status bar is red while there are conflicts,
+orange when the board can no longer be
+completed and green otherwise.
+
+Cells of the groups a variant adds (diagonals,
+windows) get a shaded background, and killer
+cages a dotted outline inside their cells with
+the sum in the corner of their first cell, both
+drawn into the sprites of these cells.
+"""
+import numpy as np
+import cv2
+
+from .geometry import SYMBOLS
+
+
+WHITE = (255, 255, 255)
+CONST_COLOR = (200, 200, 0)
+SELECTED_COLOR = (200, 150, 200)
+GROUP_COLOR = (225, 225, 225)
+CAGE_COLOR = (90, 90, 90)
+HINT_COLOR = (150, 220, 255)
+CONFLICT_COLOR = (160, 160, 255)
+CORRECT_COLOR = (0, 255, 0)
+INCORRECT_COLOR = (0, 0, 255)
+UNSOLVABLE_COLOR = (0, 165, 255)
+
+STATUS_HEIGHT = 50
+
+
+class BoardRenderer:
+    def __init__(self, width, box=3, rules=None):
+        """
+        Arguments:
+            width {int} -- width of the board (px)
+
+        Keyword Arguments:
+            box {int} -- box size of the board (default: {3})
+            rules {variants.Rules} -- rules of a variant (default: {None})
+        """
+        self.width = width
+        self.box = box
+        self.size = box * box
+        # (row, col) of cells in groups of the variant
+        self.group_cells = set()
+        # (row, col) -> (open sides, sum label) of cage cells
+        self.cage_marks = {}
+        if rules is not None:
+            self.group_cells = {divmod(idx, self.size) for idx in rules.group_cells}
+            self.cage_marks = self._cage_marks(rules)
+        # digits are scaled down on bigger boards
+        self.font_scale = 9 / self.size
+        self.font_thickness = max(1, int(round(2 * self.font_scale)))
+        self.base = self._draw_grid()
+        self.row_tiles = self._find_tiles(axis=0)
+        self.col_tiles = self._find_tiles(axis=1)
+        self.sprites = {}
+        self.frame = None
+        self.status = None
+
+    def _draw_grid(self):
+        width = self.width
+        size = self.size
+        base = np.full((width + STATUS_HEIGHT, width, 3), 255, dtype='uint8')
+
+        # not bold lines
+        for i in range(size):
+            cv2.line(base, (0, (width * i) // size),
+                     (width, (width * i) // size), (0, 0, 0), 1)
+            cv2.line(base, ((width * i) // size, 0),
+                     ((width * i) // size, width), (0, 0, 0), 1)
+
+        # bold lines
+        for i in range(1, self.box):
+            cv2.line(base, ((width * i) // self.box, 0),
+                     ((width * i) // self.box, width), (0, 0, 0), 5)
+            cv2.line(base, (0, (width * i) // self.box),
+                     (width, (width * i) // self.box), (0, 0, 0), 5)
+
+        # correctness bar border
+        cv2.line(base, (0, width), (width, width), (0, 0, 0), 5)
+        return base
+
+    def _find_tiles(self, axis):
+        """
+        Find the part of every row (axis 0) or
+        column (axis 1) of cells not covered
+        by grid lines
+
+        Returns:
+            list -- (start, stop) pixel ranges
+        """
+        tiles = []
+        for k in range(self.size):
+            start = (self.width * k) // self.size
+            stop = (self.width * (k + 1)) // self.size
+            middle = (start + stop) // 2
+            if axis == 0:
+                line = self.base[start:stop, middle, 0]
+            else:
+                line = self.base[middle, start:stop, 0]
+            white = np.flatnonzero(line == 255)
+            if len(white) == 0:
+                tiles.append((start, start))
+            else:
+                tiles.append((start + int(white[0]), start + int(white[-1]) + 1))
+        return tiles
+
+    def _cage_marks(self, rules):
+        """
+        Sides of every cage cell on the border of
+        its cage (top, right, bottom, left) and the
+        sum written into the first cell of a cage
+        """
+        size = self.size
+        marks = {}
+        for unit_index, total in rules.cages:
+            cells = set(rules.units[unit_index])
+            first = min(cells)
+            for idx in cells:
+                row, col = divmod(idx, size)
+                sides = (
+                    row == 0 or idx - size not in cells,
+                    col == size - 1 or idx + 1 not in cells,
+                    row == size - 1 or idx + size not in cells,
+                    col == 0 or idx - 1 not in cells,
+                )
+                marks[(row, col)] = (sides, str(total) if idx == first else None)
+        return marks
+
+    def _draw_cage(self, sprite, sides, label):
+        height, width = sprite.shape[:2]
+        inset = max(2, min(height, width) // 12)
+        top, right, bottom, left = sides
+        # dotted lines, every other pair of pixels
+        dots = np.arange(height) % 4 < 2
+        if left:
+            sprite[dots, inset] = CAGE_COLOR
+        if right:
+            sprite[dots, width - 1 - inset] = CAGE_COLOR
+        dots = np.arange(width) % 4 < 2
+        if top:
+            sprite[inset, dots] = CAGE_COLOR
+        if bottom:
+            sprite[height - 1 - inset, dots] = CAGE_COLOR
+        if label is not None:
+            scale = 0.35 * self.font_scale
+            cv2.putText(sprite, label, (inset + 2, inset + int(22 * scale) + 2),
+                        cv2.FONT_HERSHEY_SIMPLEX, scale, CAGE_COLOR, 1, cv2.LINE_AA)
+
+    def _sprite(self, row, col, digit, color):
+        """
+        Tile of the cell with <digit>
+        drawn on <color> background
+        """
+        y0, y1 = self.row_tiles[row]
+        x0, x1 = self.col_tiles[col]
+        cell_size = self.width / self.size
+        # I just tried and tried
+        # to make it fit into cell
+        # don't touch it!!
+        x = int(cell_size // 2 + col * cell_size - 0.15 * cell_size) - x0
+        y = int(cell_size // 2 + row * cell_size + 0.18 * cell_size) - y0
+
+        cage_mark = self.cage_marks.get((row, col))
+        key = (y1 - y0, x1 - x0, x, y, digit, color, cage_mark)
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            sprite = np.empty((y1 - y0, x1 - x0, 3), dtype='uint8')
+            sprite[:] = color
+            if cage_mark is not None:
+                self._draw_cage(sprite, *cage_mark)
+            if digit != 0:
+                cv2.putText(sprite, SYMBOLS[digit - 1], (x, y), cv2.FONT_HERSHEY_SIMPLEX,
+                            self.font_scale, (0, 0, 0), self.font_thickness, cv2.LINE_AA)
+            self.sprites[key] = sprite
+        return sprite
+
+    def _draw_cell(self, board, row, col):
+        if board.selected_cell == (row, col):
+            color = SELECTED_COLOR
+        elif row * self.size + col in board.conflict_cells:
+            color = CONFLICT_COLOR
+        elif board.hint_cell == (row, col):
+            color = HINT_COLOR
+        elif board.const_nums[row, col]:
+            color = CONST_COLOR
+        elif (row, col) in self.group_cells:
+            color = GROUP_COLOR
+        else:
+            color = WHITE
+        y0, y1 = self.row_tiles[row]
+        x0, x1 = self.col_tiles[col]
+        self.frame[y0:y1, x0:x1] = self._sprite(
+            row, col, int(board.nums[row, col]), color)
+
+    def _draw_status(self, correct, solvable, solved, text):
+        status_bar = self.frame[self.width:]
+        if not correct:
+            status_bar[:] = INCORRECT_COLOR
+        elif solvable is False:
+            status_bar[:] = UNSOLVABLE_COLOR
+            text = text or 'No solution from here'
+        else:
+            status_bar[:] = CORRECT_COLOR
+
+        if text:
+            cv2.putText(self.frame, text, (10, self.width + 35), cv2.FONT_HERSHEY_SIMPLEX, 0.7,
+                        (0, 0, 0), 2, cv2.LINE_AA)
+
+        # winning condition
+        if solved:
+            cv2.putText(self.frame, 'Win!', (self.width // 2, self.width + 35), cv2.FONT_HERSHEY_SIMPLEX, 1,
+                        (0, 0, 0), 2, cv2.LINE_AA)
+
+    def render(self, board):
+        """
+        Render the board redrawing
+        only what has changed
+
+        Arguments:
+            board {SudokuBoard} -- board to render
+
+        Returns:
+            np.ndarray -- frame, it is reused by the
+                          next call, so copy it to modify
+        """
+        dirty_cells = board.take_dirty_cells()
+        if self.frame is None:
+            self.frame = self.base.copy()
+            dirty_cells = None
+        if dirty_cells is None:
+            dirty_cells = [(i, j) for i in range(self.size) for j in range(self.size)]
+        for row, col in dirty_cells:
+            self._draw_cell(board, row, col)
+
+        status = (board.conflicts == 0, board.solvable, board.is_solved(), board.status_text)
+        if status != self.status:
+            self._draw_status(*status)
+            self.status = status
+
+        return self.frame
@@ -0,0 +1,467 @@
+"""
+Local solve service
+
+A small HTTP/1.1 JSON server on asyncio, over
+TCP or a Unix socket, so other processes can
+solve puzzles without starting Python and
+importing numpy for every call:
+
+    POST /solve   {"puzzle": "..."} or {"puzzles": [...]},
+                  optionally "timeout" in seconds
+    GET  /stats   counters, queue depth and
+                  latency histograms
+    GET  /health  {"status": "ok"}
+
+Puzzles of all requests go through one queue
+and are grouped into micro-batches: a batch
+is sent to the worker pool as soon as it is
+full or <max_delay> after its first puzzle.
+At most two batches per worker are in flight,
+so when the workers fall behind the queue
+fills up and new requests get 503 instead of
+piling up (backpressure). A request that is
+not answered within its timeout gets 504; its
+puzzles are dropped if they did not reach a
+worker yet. Nothing here imports cv2 or
+tkinter, and only the standard library is
+needed besides the solver itself.
+
+Worker processes are started by a fork server
+(spawned where there is none), so they do not
+inherit the sockets of open connections. A
+script running the server therefore needs the
+usual `if __name__ == '__main__':` guard.
+"""
+import asyncio
+import bisect
+import collections
+import concurrent.futures
+import functools
+import json
+import multiprocessing
+import os
+import time
+
+from . import batch
+from .formats import parse_puzzle
+from .solver import BACKENDS
+
+
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_MAX_DELAY = 0.005
+DEFAULT_MAX_QUEUE = 4096
+DEFAULT_TIMEOUT = 10.0
+# requests larger than this are refused
+MAX_BODY = 16 << 20
+
+# upper bounds of histogram buckets (seconds),
+# the last bucket takes everything above
+LATENCY_BUCKETS = (
+    0.001, 0.002, 0.005, 0.01, 0.02, 0.05,
+    0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0,
+)
+
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    503: 'Service Unavailable',
+    504: 'Gateway Timeout',
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class LatencyHistogram:
+    """
+    Latencies counted in fixed buckets, so
+    memory does not grow with the requests
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the <q> quantile,
+        the maximum for the last bucket
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        labels = ['<={}'.format(bound) for bound in self.buckets]
+        labels.append('>{}'.format(self.buckets[-1]))
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+# a puzzle waiting for a worker
+_Item = collections.namedtuple('_Item', ['line', 'future'])
+
+
+class SolveServer:
+    def __init__(self, workers=None, backend='bitmask', batch_size=DEFAULT_BATCH_SIZE,
+                 max_delay=DEFAULT_MAX_DELAY, max_queue=DEFAULT_MAX_QUEUE,
+                 timeout=DEFAULT_TIMEOUT, cache=False, cache_file=None):
+        """
+        Keyword Arguments:
+            workers {int} -- number of processes, 1 solves on a
+                             thread of this process (default: {cpu count})
+            backend {str} -- solver backend (default: {'bitmask'})
+            batch_size {int} -- puzzles sent to a worker at once (default: {64})
+            max_delay {float} -- seconds a batch waits to fill up (default: {0.005})
+            max_queue {int} -- puzzles waiting for a worker before
+                               requests are refused (default: {4096})
+            timeout {float} -- default seconds a request may take (default: {10.0})
+            cache {bool} -- check a SolutionCache first (default: {False})
+            cache_file {str} -- sqlite file of the cache, implies
+                                <cache> (default: {None})
+        """
+        if backend not in BACKENDS:
+            raise ValueError('Unknown backend: {}'.format(backend))
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.solve_batch = functools.partial(
+            batch.solve_lines, backend=backend, cache=cache, cache_file=cache_file)
+
+        self.queue = None
+        self.slots = None
+        self.executor = None
+        # futures of the batches handed to the executor
+        self.running = set()
+        self.server = None
+        self.path = None
+        self.dispatcher = None
+        self.in_flight = 0
+        self.started = None
+
+        self.counters = collections.Counter()
+        self.latency = LatencyHistogram()
+        self.batch_latency = LatencyHistogram()
+
+    async def start(self, host='127.0.0.1', port=0, path=None):
+        """
+        Start listening
+
+        Keyword Arguments:
+            host {str} -- address to bind (default: {'127.0.0.1'})
+            port {int} -- TCP port, 0 picks a free one (default: {0})
+            path {str} -- Unix socket to listen on instead of TCP
+
+        Returns:
+            str -- address the server listens on
+        """
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(2 * self.workers)
+        if self.workers == 1:
+            self.executor = concurrent.futures.ThreadPoolExecutor(1)
+        else:
+            # workers start on the first batch, when client
+            # sockets are open, and must not inherit them
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context(
+                'forkserver' if 'forkserver' in methods else 'spawn')
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                self.workers, mp_context=context)
+        self.dispatcher = asyncio.ensure_future(self._dispatch())
+        self.started = time.monotonic()
+        if path is not None:
+            self.path = path
+            self.server = await asyncio.start_unix_server(self._handle, path)
+            return 'unix:{}'.format(path)
+        self.server = await asyncio.start_server(self._handle, host, port)
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    async def serve_forever(self):
+        await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if self.dispatcher is not None:
+            self.dispatcher.cancel()
+            try:
+                await self.dispatcher
+            except asyncio.CancelledError:
+                pass
+        if self.executor is not None:
+            # shutdown(cancel_futures=True) needs Python 3.9;
+            # waiting lets the workers exit before the interpreter
+            for future in list(self.running):
+                future.cancel()
+            self.executor.shutdown()
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _dispatch(self):
+        """
+        Group queued puzzles into batches
+        and hand them to the workers
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            if self.queue.qsize() < self.batch_size - 1:
+                await asyncio.sleep(self.max_delay)
+            while len(items) < self.batch_size and not self.queue.empty():
+                items.append(self.queue.get_nowait())
+            # puzzles of timed out requests
+            items = [item for item in items if not item.future.done()]
+            if not items:
+                continue
+            await self.slots.acquire()
+            self.in_flight += 1
+            loop.create_task(self._run(items))
+
+    async def _run(self, items):
+        start = time.perf_counter()
+        future = self.executor.submit(self.solve_batch, [item.line for item in items])
+        self.running.add(future)
+        future.add_done_callback(self.running.discard)
+        try:
+            solutions = await asyncio.wrap_future(future)
+        except Exception as e:
+            for item in items:
+                if not item.future.done():
+                    item.future.set_exception(e)
+        else:
+            for item, solution in zip(items, solutions):
+                if not item.future.done():
+                    item.future.set_result(solution)
+        finally:
+            self.in_flight -= 1
+            self.slots.release()
+        self.batch_latency.record(time.perf_counter() - start)
+        self.counters['batches'] += 1
+        self.counters['batched_puzzles'] += len(items)
+
+    async def solve(self, lines, timeout=None):
+        """
+        Solve puzzles through the batching queue
+
+        Arguments:
+            lines {list} -- one-line puzzles
+
+        Keyword Arguments:
+            timeout {float} -- seconds to wait (default: server timeout)
+
+        Returns:
+            list -- solutions, None where there is none
+
+        Raises:
+            HttpError -- 503 if the queue is full,
+                         504 if <timeout> runs out
+        """
+        if self.queue.qsize() + len(lines) > self.max_queue:
+            self.counters['rejected'] += 1
+            raise HttpError(503, 'Queue is full, retry later')
+        loop = asyncio.get_running_loop()
+        futures = []
+        for line in lines:
+            future = loop.create_future()
+            self.queue.put_nowait(_Item(line, future))
+            futures.append(future)
+        try:
+            solutions = await asyncio.wait_for(
+                asyncio.gather(*futures), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.counters['timeouts'] += 1
+            raise HttpError(504, 'Timed out')
+        self.counters['puzzles'] += len(lines)
+        self.counters['failures'] += sum(1 for solution in solutions if solution is None)
+        return solutions
+
+    def stats(self):
+        batches = self.counters['batches']
+        stats = {field: self.counters[field] for field in (
+            'requests', 'puzzles', 'failures', 'rejected', 'timeouts', 'errors', 'batches')}
+        stats.update({
+            'uptime': time.monotonic() - self.started,
+            'workers': self.workers,
+            'queue_depth': self.queue.qsize(),
+            'in_flight_batches': self.in_flight,
+            'mean_batch_size': self.counters['batched_puzzles'] / batches if batches else 0.0,
+            'latency': self.latency.as_dict(),
+            'batch_latency': self.batch_latency.as_dict(),
+        })
+        return stats
+
+    async def _solve_request(self, body):
+        try:
+            request = json.loads(body or b'{}')
+        except ValueError:
+            raise HttpError(400, 'Body is not JSON')
+        if not isinstance(request, dict):
+            raise HttpError(400, 'Body is not a JSON object')
+        single = 'puzzle' in request
+        lines = [request['puzzle']] if single else request.get('puzzles')
+        if not isinstance(lines, list) or not lines:
+            raise HttpError(400, 'Expected "puzzle" or a non-empty list of "puzzles"')
+        for index, line in enumerate(lines):
+            # malformed puzzles are refused before queueing
+            try:
+                if not isinstance(line, str):
+                    raise ValueError(line)
+                parse_puzzle(line)
+            except ValueError:
+                raise HttpError(400, 'Malformed puzzle at index {}'.format(index))
+        timeout = request.get('timeout')
+        if timeout is not None and (not isinstance(timeout, (int, float)) or timeout <= 0):
+            raise HttpError(400, '"timeout" must be a positive number')
+
+        solutions = await self.solve(lines, timeout)
+        if single:
+            return {'solution': solutions[0], 'solved': solutions[0] is not None}
+        return {'solutions': solutions,
+                'solved': sum(1 for solution in solutions if solution is not None)}
+
+    async def _route(self, method, path, body):
+        if path == '/solve':
+            if method != 'POST':
+                raise HttpError(405, 'Use POST')
+            start = time.perf_counter()
+            response = await self._solve_request(body)
+            self.latency.record(time.perf_counter() - start)
+            return response
+        if path in ('/stats', '/health'):
+            if method != 'GET':
+                raise HttpError(405, 'Use GET')
+            return self.stats() if path == '/stats' else {'status': 'ok'}
+        raise HttpError(404, 'No such endpoint')
+
+    async def _handle(self, reader, writer):
+        """
+        Serve requests of a connection,
+        keeping it open unless asked not to
+        """
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except HttpError as e:
+                    await _respond(writer, e.status, {'error': e.message}, close=True)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body, keep_alive = request
+                self.counters['requests'] += 1
+                try:
+                    status, response = 200, await self._route(method, path, body)
+                except HttpError as e:
+                    status, response = e.status, {'error': e.message}
+                except Exception as e:
+                    self.counters['errors'] += 1
+                    status, response = 500, {'error': repr(e)}
+                await _respond(writer, status, response, close=not keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def _read_request(reader):
+    """
+    Read one HTTP request
+
+    Returns:
+        tuple or None -- (method, path, headers, body, keep alive),
+                         None if the connection was closed
+    """
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, path, version = line.decode('latin-1').split()
+    except ValueError:
+        raise HttpError(400, 'Malformed request line')
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise HttpError(400, 'Malformed Content-Length')
+    if length > MAX_BODY:
+        raise HttpError(413, 'Body is too large')
+    body = await reader.readexactly(length) if length else b''
+    connection = headers.get('connection', '').lower()
+    keep_alive = connection != 'close' and (version == 'HTTP/1.1' or connection == 'keep-alive')
+    return method.upper(), path.split('?')[0], headers, body, keep_alive
+
+
+async def _respond(writer, status, response, close=False):
+    body = json.dumps(response).encode()
+    head = (
+        'HTTP/1.1 {} {}\r\n'
+        'Content-Type: application/json\r\n'
+        'Content-Length: {}\r\n'
+        '{}'
+        'Connection: {}\r\n'
+        '\r\n'
+    ).format(status, REASONS.get(status, 'Internal Server Error'), len(body),
+             'Retry-After: 1\r\n' if status == 503 else '',
+             'close' if close else 'keep-alive')
+    writer.write(head.encode() + body)
+    await writer.drain()
+
+
+async def serve(host='127.0.0.1', port=8080, path=None, **kwargs):
+    """
+    Run a SolveServer until cancelled
+
+    Keyword Arguments:
+        host {str} -- address to bind (default: {'127.0.0.1'})
+        port {int} -- TCP port (default: {8080})
+        path {str} -- Unix socket to listen on instead of TCP
+        **kwargs -- see SolveServer
+    """
+    server = SolveServer(**kwargs)
+    address = await server.start(host, port, path)
+    print('[INFO] Serving on {}'.format(address), flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
@@ -0,0 +1,589 @@
+"""
+Bitmask constraint-propagation solver
+
+Every row, column and box keeps a bitmask
+of the digits already placed into it, so the
+candidates of a cell are obtained with three
+ORs instead of a scan of the whole grid.
+The search always branches on the most
+constrained cell and propagates naked and
+hidden singles after every placement.
+Placements are recorded in a Trail, and
+backtracking rolls it back to the checkpoint
+of the node.
+
+Variants with more groups of cells or killer
+cages (see variants.py) are solved by the
+<VariantSolver>, which keeps one mask per unit
+of the compiled rules and also limits the
+cells of a cage to the digits of the sums
+still possible. Classic boards keep the
+dedicated three-mask solver.
+
+Other backends (see <BACKENDS>) share
+the <Solver> interface.
+"""
+import time
+
+from .geometry import geometry_of
+from .trail import Trail
+from .variants import cage_digits
+
+
+class SolveCancelled(Exception):
+    """
+    Raised by a solver when <Solver.cancel>
+    is called during the search
+    """
+
+
+class SolveStats:
+    """
+    Statistics of a solver run
+
+    Attributes:
+        nodes {int} -- search nodes visited
+        backtracks {int} -- guesses undone after
+                            their subtree was exhausted
+        propagations {int} -- cells filled by propagation
+        max_depth {int} -- deepest guess
+        solutions {int} -- solutions found
+        wall_time {float} -- time spent searching (s)
+        cpu_time {float} -- CPU time spent searching (s)
+    """
+    FIELDS = (
+        'nodes', 'backtracks', 'propagations', 'max_depth',
+        'solutions', 'wall_time', 'cpu_time'
+    )
+
+    def __init__(self):
+        self.nodes = 0
+        self.backtracks = 0
+        self.propagations = 0
+        self.max_depth = 0
+        self.solutions = 0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def __repr__(self):
+        return 'SolveStats({})'.format(', '.join(
+            '{}={}'.format(field, getattr(self, field)) for field in self.FIELDS))
+
+
+class Solver:
+    """
+    Common interface of solver backends.
+    Subclasses implement <_iter_solutions>
+    updating <stats>, calling <trace> (if set)
+    and checking <cancelled> at every node.
+
+    <trace> is called as trace(event, depth),
+    event is one of 'node', 'backtrack' and
+    'solution'.
+    """
+
+    def __init__(self, trace=None):
+        self.stats = SolveStats()
+        self.trace = trace
+        self.cancelled = False
+
+    def cancel(self):
+        """
+        Stop the search, may be called from
+        another thread. The running call
+        raises SolveCancelled.
+        """
+        self.cancelled = True
+
+    def _iter_solutions(self):
+        raise NotImplementedError
+
+    def iter_solutions(self):
+        """
+        Lazily enumerate all the solutions,
+        time spent in the search is added
+        to <stats>
+
+        Yields:
+            list -- solved grid
+        """
+        stats = self.stats
+        search = self._iter_solutions()
+        try:
+            while True:
+                wall_start = time.perf_counter()
+                cpu_start = time.process_time()
+                try:
+                    solution = next(search)
+                except StopIteration:
+                    return
+                finally:
+                    stats.wall_time += time.perf_counter() - wall_start
+                    stats.cpu_time += time.process_time() - cpu_start
+                stats.solutions += 1
+                yield solution
+        finally:
+            search.close()
+
+    def solve(self):
+        """
+        Solve the board
+
+        Returns:
+            list or None -- solved grid
+                            or None if there is no solution
+        """
+        for solution in self.iter_solutions():
+            return solution
+        return None
+
+    def count_solutions(self, limit=2):
+        """
+        Count solutions stopping
+        as soon as <limit> are found
+
+        Keyword Arguments:
+            limit {int} -- max number of solutions to count,
+                           None to count all of them (default: {2})
+
+        Returns:
+            int -- number of solutions, at most <limit>
+        """
+        count = 0
+        for _ in self.iter_solutions():
+            count += 1
+            if count == limit:
+                break
+        return count
+
+
+class BitmaskSolver(Solver):
+    def __init__(self, grid, trace=None):
+        """
+        Arguments:
+            grid {NxN array-like} -- board to solve, 0 for empty cells,
+                                     N is 4, 9, 16 or 25
+
+        Keyword Arguments:
+            trace {callable} -- tracing hook, see <Solver>
+        """
+        super().__init__(trace)
+        geo = self.geometry = geometry_of(grid)
+        size = geo.size
+        self.cells = [0] * geo.cells
+        self.rows = [0] * size
+        self.cols = [0] * size
+        self.boxes = [0] * size
+        self.consistent = True
+        # cells placed by the search
+        self.trail = Trail()
+
+        for i in range(size):
+            for j in range(size):
+                value = int(grid[i][j])
+                if value == 0:
+                    continue
+                idx = i * size + j
+                bit = 1 << value
+                if value > size or self._candidates(idx) & bit == 0:
+                    self.consistent = False
+                self._place(idx, bit)
+
+    def _place(self, idx, bit):
+        geo = self.geometry
+        self.cells[idx] = bit
+        self.rows[geo.row_of[idx]] |= bit
+        self.cols[geo.col_of[idx]] |= bit
+        self.boxes[geo.box_of[idx]] |= bit
+
+    def _unplace(self, idx):
+        geo = self.geometry
+        bit = self.cells[idx]
+        self.cells[idx] = 0
+        self.rows[geo.row_of[idx]] ^= bit
+        self.cols[geo.col_of[idx]] ^= bit
+        self.boxes[geo.box_of[idx]] ^= bit
+
+    def _candidates(self, idx):
+        geo = self.geometry
+        return geo.all_digits & ~(
+            self.rows[geo.row_of[idx]] |
+            self.cols[geo.col_of[idx]] |
+            self.boxes[geo.box_of[idx]]
+        )
+
+    def _rollback(self, checkpoint):
+        for idx in self.trail.rollback_cells(checkpoint):
+            self._unplace(idx)
+
+    def _propagate(self):
+        """
+        Place naked and hidden singles
+        until nothing changes, placed
+        cells are pushed to the trail
+
+        Returns:
+            int -- most constrained empty cell,
+                   -1 if the board is complete,
+                   -2 on contradiction
+        """
+        geo = self.geometry
+        row_of, col_of, box_of = geo.row_of, geo.col_of, geo.box_of
+        all_digits = geo.all_digits
+        popcount = geo.popcount
+        cells = self.cells
+        rows, cols, boxes = self.rows, self.cols, self.boxes
+        push = self.trail.push
+        while True:
+            changed = False
+            candidates = [0] * geo.cells
+            best = -1
+            best_count = geo.size + 1
+
+            # naked singles
+            for idx in range(geo.cells):
+                if cells[idx]:
+                    continue
+                mask = all_digits & ~(
+                    rows[row_of[idx]] | cols[col_of[idx]] | boxes[box_of[idx]])
+                if not mask:
+                    return -2
+                if not mask & (mask - 1):
+                    self._place(idx, mask)
+                    push(idx, 0)
+                    changed = True
+                    continue
+                candidates[idx] = mask
+                count = popcount[mask]
+                if count < best_count:
+                    best = idx
+                    best_count = count
+            if changed:
+                continue
+
+            # hidden singles
+            for unit in geo.units:
+                once = twice = placed = 0
+                for idx in unit:
+                    mask = candidates[idx]
+                    twice |= once & mask
+                    once |= mask
+                    placed |= cells[idx]
+                # some digit has no place in the unit
+                if once | placed != all_digits:
+                    return -2
+                hidden = once & ~twice
+                while hidden:
+                    bit = hidden & -hidden
+                    hidden ^= bit
+                    for idx in unit:
+                        if candidates[idx] & bit:
+                            break
+                    if cells[idx] == bit:
+                        continue
+                    if cells[idx] or (rows[row_of[idx]] | cols[col_of[idx]]
+                                      | boxes[box_of[idx]]) & bit:
+                        return -2
+                    self._place(idx, bit)
+                    push(idx, 0)
+                    changed = True
+            if not changed:
+                return best
+
+    def _search(self, depth=0):
+        """
+        Depth-first search yielding every time
+        the board is complete. The state is
+        restored when the generator is closed.
+        """
+        stats = self.stats
+        stats.nodes += 1
+        if depth > stats.max_depth:
+            stats.max_depth = depth
+        if self.cancelled:
+            raise SolveCancelled()
+        trace = self.trace
+        if trace is not None:
+            trace('node', depth)
+
+        checkpoint = self.trail.checkpoint()
+        best = self._propagate()
+        stats.propagations += self.trail.checkpoint() - checkpoint
+        try:
+            if best == -1:
+                if trace is not None:
+                    trace('solution', depth)
+                yield
+            elif best >= 0:
+                mask = self._candidates(best)
+                while mask:
+                    bit = mask & -mask
+                    mask ^= bit
+                    branch = self.trail.checkpoint()
+                    self._place(best, bit)
+                    self.trail.push(best, 0)
+                    try:
+                        yield from self._search(depth + 1)
+                        stats.backtracks += 1
+                        if trace is not None:
+                            trace('backtrack', depth)
+                    finally:
+                        self._rollback(branch)
+        finally:
+            self._rollback(checkpoint)
+
+    def grid(self):
+        """
+        Current state of the solver as
+        a list of lists
+        """
+        digit_of = self.geometry.digit_of
+        size = self.geometry.size
+        return [[digit_of.get(self.cells[i * size + j], 0) for j in range(size)]
+                for i in range(size)]
+
+    def _iter_solutions(self):
+        if not self.consistent:
+            return
+        for _ in self._search():
+            yield self.grid()
+
+
+class VariantSolver(BitmaskSolver):
+    def __init__(self, grid, rules, trace=None):
+        """
+        Arguments:
+            grid {NxN array-like} -- board to solve, 0 for empty cells
+            rules {variants.Rules} -- compiled rules of the board
+
+        Keyword Arguments:
+            trace {callable} -- tracing hook, see <Solver>
+        """
+        Solver.__init__(self, trace)
+        if len(grid) != rules.size:
+            raise ValueError('Rules are for {0}x{0} boards, got {1} rows'.format(
+                rules.size, len(grid)))
+        self.rules = rules
+        geo = self.geometry = rules.geometry
+        size = geo.size
+        self.cells = [0] * geo.cells
+        # digits placed in every unit
+        self.used = [0] * len(rules.units)
+        # sum still missing and empty cells of every cage
+        self.cage_sums = [total for _, total in rules.cages]
+        self.cage_left = [len(rules.units[unit_index]) for unit_index, _ in rules.cages]
+        self.consistent = True
+        self.trail = Trail()
+
+        for i in range(size):
+            for j in range(size):
+                value = int(grid[i][j])
+                if value == 0:
+                    continue
+                idx = i * size + j
+                bit = 1 << value
+                if value > size or self._candidates(idx) & bit == 0:
+                    self.consistent = False
+                self._place(idx, bit)
+
+    def _place(self, idx, bit):
+        rules = self.rules
+        self.cells[idx] = bit
+        used = self.used
+        for unit_index in rules.cell_units[idx]:
+            used[unit_index] |= bit
+        cage = rules.cage_of[idx]
+        if cage >= 0:
+            self.cage_sums[cage] -= bit.bit_length() - 1
+            self.cage_left[cage] -= 1
+
+    def _unplace(self, idx):
+        rules = self.rules
+        bit = self.cells[idx]
+        self.cells[idx] = 0
+        used = self.used
+        for unit_index in rules.cell_units[idx]:
+            used[unit_index] ^= bit
+        cage = rules.cage_of[idx]
+        if cage >= 0:
+            self.cage_sums[cage] += bit.bit_length() - 1
+            self.cage_left[cage] += 1
+
+    def _candidates(self, idx):
+        rules = self.rules
+        used = self.used
+        all_digits = self.geometry.all_digits
+        taken = 0
+        for unit_index in rules.cell_units[idx]:
+            taken |= used[unit_index]
+        mask = all_digits & ~taken
+        cage = rules.cage_of[idx]
+        if cage >= 0 and mask:
+            # digits of the sums the empty cells can still make
+            unit_index = rules.cages[cage][0]
+            mask &= cage_digits(self.cage_left[cage], self.cage_sums[cage],
+                                all_digits & ~used[unit_index])
+        return mask
+
+    def _propagate(self):
+        """
+        Like <BitmaskSolver._propagate>,
+        over the units of the rules
+
+        Returns:
+            int -- most constrained empty cell,
+                   -1 if the board is complete,
+                   -2 on contradiction
+        """
+        geo = self.geometry
+        all_digits = geo.all_digits
+        popcount = geo.popcount
+        cells = self.cells
+        candidates_of = self._candidates
+        place = self._place
+        push = self.trail.push
+        while True:
+            changed = False
+            candidates = [0] * geo.cells
+            best = -1
+            best_count = geo.size + 1
+
+            # naked singles
+            for idx in range(geo.cells):
+                if cells[idx]:
+                    continue
+                mask = candidates_of(idx)
+                if not mask:
+                    return -2
+                if not mask & (mask - 1):
+                    place(idx, mask)
+                    push(idx, 0)
+                    changed = True
+                    continue
+                candidates[idx] = mask
+                count = popcount[mask]
+                if count < best_count:
+                    best = idx
+                    best_count = count
+            if changed:
+                continue
+
+            # hidden singles of the units holding every digit
+            for unit in self.rules.full_units:
+                once = twice = placed = 0
+                for idx in unit:
+                    mask = candidates[idx]
+                    twice |= once & mask
+                    once |= mask
+                    placed |= cells[idx]
+                if once | placed != all_digits:
+                    return -2
+                hidden = once & ~twice
+                while hidden:
+                    bit = hidden & -hidden
+                    hidden ^= bit
+                    for idx in unit:
+                        if candidates[idx] & bit:
+                            break
+                    if cells[idx] == bit:
+                        continue
+                    if cells[idx] or not candidates_of(idx) & bit:
+                        return -2
+                    place(idx, bit)
+                    push(idx, 0)
+                    changed = True
+            if not changed:
+                return best
+
+
+BACKENDS = ('bitmask', 'dlx')
+
+
+def get_solver(grid, backend='bitmask', trace=None, rules=None):
+    """
+    Create a solver for the board
+
+    Arguments:
+        grid {NxN array-like} -- board to solve, 0 for empty cells
+
+    Keyword Arguments:
+        backend {str} -- one of <BACKENDS> (default: {'bitmask'})
+        trace {callable} -- tracing hook, see <Solver>
+        rules {variants.Rules} -- rules of a variant,
+                                  None for classic (default: {None})
+
+    Raises:
+        ValueError -- if the backend is unknown or
+                      does not support the rules
+
+    Returns:
+        Solver -- solver of the chosen backend,
+                  its <stats> are filled by the search
+    """
+    if rules is not None and not rules.is_classic:
+        if backend != 'bitmask':
+            raise ValueError('The {} backend only solves classic boards'.format(backend))
+        return VariantSolver(grid, rules, trace)
+    if backend == 'bitmask':
+        return BitmaskSolver(grid, trace)
+    if backend == 'dlx':
+        from .dlx import DLXSolver
+        return DLXSolver(grid, trace)
+    raise ValueError('Unknown solver backend: {}'.format(backend))
+
+
+def solve(grid, backend='bitmask', rules=None):
+    """
+    Solve the board without modifying it
+
+    Arguments:
+        grid {NxN array-like} -- board to solve, 0 for empty cells
+
+    Keyword Arguments:
+        backend {str} -- one of <BACKENDS> (default: {'bitmask'})
+        rules {variants.Rules} -- rules of a variant (default: {None})
+
+    Returns:
+        list or None -- solved grid
+                        or None if there is no solution
+    """
+    return get_solver(grid, backend, rules=rules).solve()
+
+
+def count_solutions(grid, limit=2, backend='bitmask', rules=None):
+    """
+    Count solutions of the board
+    stopping as soon as <limit> are found
+
+    Arguments:
+        grid {NxN array-like} -- board to check, 0 for empty cells
+
+    Keyword Arguments:
+        limit {int} -- max number of solutions to count (default: {2})
+        backend {str} -- one of <BACKENDS> (default: {'bitmask'})
+        rules {variants.Rules} -- rules of a variant (default: {None})
+
+    Returns:
+        int -- number of solutions, at most <limit>
+    """
+    return get_solver(grid, backend, rules=rules).count_solutions(limit)
+
+
+def iter_solutions(grid, backend='bitmask', rules=None):
+    """
+    Lazily enumerate all the solutions of the board
+
+    Arguments:
+        grid {NxN array-like} -- board to solve, 0 for empty cells
+
+    Keyword Arguments:
+        backend {str} -- one of <BACKENDS> (default: {'bitmask'})
+        rules {variants.Rules} -- rules of a variant (default: {None})
+
+    Yields:
+        list -- solved grid
+    """
+    return get_solver(grid, backend, rules=rules).iter_solutions()
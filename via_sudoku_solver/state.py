@@ -0,0 +1,271 @@
+"""
+Compact state of a board
+
+Values live in a flat bytearray, one byte per
+cell indexed row by row, and occupancy counts
+of every digit in every unit in another one,
+so a state takes a few hundred bytes, copies
+with two buffer copies and keeps the number
+of conflicts up to date on every write.
+Nothing here knows about rendering.
+
+Writes are logged in a Trail (see trail.py),
+so changes can be rolled back to a checkpoint.
+
+Units come from the compiled rules of the
+board (see variants.py), classic by default.
+A killer cage whose digits add up to more
+than its sum, or to a different sum once it
+is full, counts as one more conflict.
+"""
+import functools
+
+from .geometry import geometry
+from .trail import Trail
+from .variants import MAX_COMPILED, get_rules
+
+
+# tables of classic 9x9 boards, see Geometry
+UNITS = geometry(3).units
+CELL_UNITS = geometry(3).cell_units
+PEERS = geometry(3).peers
+
+
+@functools.lru_cache(maxsize=MAX_COMPILED)
+def _count_offsets(rules):
+    """
+    Offsets of the counts of every cell's
+    units, counts of unit u start at u * (size + 1)
+    """
+    return tuple(
+        tuple(unit_index * (rules.size + 1) for unit_index in units)
+        for units in rules.cell_units
+    )
+
+
+class BoardState:
+    __slots__ = ('geometry', 'rules', 'offsets', 'values', 'counts',
+                 'conflicts', 'filled', 'history', 'cage_sums', 'cage_filled')
+
+    def __init__(self, box=3, values=None, rules=None):
+        """
+        Keyword Arguments:
+            box {int} -- box size, 3 for 9x9 boards (default: {3})
+            values {iterable} -- flat values, row by row,
+                                 0 for empty cells (default: {None})
+            rules {variants.Rules} -- rules of the board,
+                                      classic if None (default: {None})
+        """
+        rules = self.rules = rules or get_rules('classic', box)
+        geo = self.geometry = rules.geometry
+        self.offsets = _count_offsets(rules)
+        self.values = bytearray(geo.cells)
+        self.counts = bytearray(len(rules.units) * (geo.size + 1))
+        # sum and filled cells of every killer cage
+        self.cage_sums = [0] * len(rules.cages)
+        self.cage_filled = [0] * len(rules.cages)
+        # number of repeated digits over all units
+        # and of broken cages
+        self.conflicts = 0
+        # number of non-empty cells
+        self.filled = 0
+        # previous value of every written cell
+        self.history = Trail()
+        if values is not None:
+            for idx, value in enumerate(values):
+                if value:
+                    self.set(idx, value)
+            self.history.clear()
+
+    @classmethod
+    def from_grid(cls, grid, rules=None):
+        """
+        Arguments:
+            grid {NxN array-like} -- board, 0 for empty cells
+
+        Keyword Arguments:
+            rules {variants.Rules} -- rules of the board (default: {None})
+
+        Returns:
+            BoardState -- state of <grid>
+        """
+        size = len(grid)
+        box = int(round(size ** 0.5))
+        return cls(box, (int(value) for row in grid for value in row), rules)
+
+    @property
+    def size(self):
+        return self.geometry.size
+
+    def set(self, idx, value):
+        """
+        Write <value> into cell <idx> keeping
+        occupancy counts up to date
+
+        Arguments:
+            idx {int} -- cell, row * size + col
+            value {int} -- number to write, 0 to empty the cell
+
+        Returns:
+            int -- previous value
+        """
+        old_value = self.values[idx]
+        if old_value != value:
+            self._write(idx, old_value, value)
+            self.history.push(idx, old_value)
+        return old_value
+
+    def _write(self, idx, old_value, value):
+        counts = self.counts
+        offsets = self.offsets[idx]
+        if old_value:
+            self.filled -= 1
+            for offset in offsets:
+                offset += old_value
+                counts[offset] -= 1
+                if counts[offset]:
+                    self.conflicts -= 1
+        if value:
+            self.filled += 1
+            for offset in offsets:
+                offset += value
+                if counts[offset]:
+                    self.conflicts += 1
+                counts[offset] += 1
+        self.values[idx] = value
+        if self.cage_sums:
+            cage = self.rules.cage_of[idx]
+            if cage >= 0:
+                self._write_cage(cage, old_value, value)
+
+    def _cage_broken(self, cage):
+        unit_index, total = self.rules.cages[cage]
+        cage_sum = self.cage_sums[cage]
+        return cage_sum > total or (
+            self.cage_filled[cage] == len(self.rules.units[unit_index]) and cage_sum != total)
+
+    def _write_cage(self, cage, old_value, value):
+        broken = self._cage_broken(cage)
+        self.cage_sums[cage] += value - old_value
+        self.cage_filled[cage] += int(value != 0) - int(old_value != 0)
+        self.conflicts += self._cage_broken(cage) - broken
+
+    def checkpoint(self):
+        """
+        Returns:
+            int -- checkpoint to roll back to with <undo>
+        """
+        return self.history.checkpoint()
+
+    def undo(self, checkpoint=None):
+        """
+        Roll back writes made after <checkpoint>,
+        the last write if it is None
+
+        Keyword Arguments:
+            checkpoint {int} -- see <checkpoint> (default: {None})
+
+        Returns:
+            list -- (cell, value before the rollback)
+                    of every write undone, latest first
+        """
+        if checkpoint is None:
+            checkpoint = self.history.checkpoint() - 1
+        values = self.values
+        changes = []
+        for idx, value in self.history.rollback(checkpoint):
+            changes.append((idx, values[idx]))
+            self._write(idx, values[idx], value)
+        return changes
+
+    def clear(self):
+        """
+        Empty every cell and forget the history
+        """
+        self.values[:] = bytes(len(self.values))
+        self.counts[:] = bytes(len(self.counts))
+        self.cage_sums = [0] * len(self.cage_sums)
+        self.cage_filled = [0] * len(self.cage_filled)
+        self.conflicts = 0
+        self.filled = 0
+        self.history.clear()
+
+    def copy(self):
+        """
+        Returns:
+            BoardState -- independent state with
+                          the same values and no history
+        """
+        state = BoardState.__new__(BoardState)
+        state.geometry = self.geometry
+        state.rules = self.rules
+        state.offsets = self.offsets
+        state.values = self.values[:]
+        state.counts = self.counts[:]
+        state.cage_sums = self.cage_sums[:]
+        state.cage_filled = self.cage_filled[:]
+        state.conflicts = self.conflicts
+        state.filled = self.filled
+        state.history = Trail()
+        return state
+
+    def candidates(self, idx):
+        """
+        Digits not used by any unit of cell <idx>
+
+        Returns:
+            int -- mask with bit d set for every digit d
+        """
+        counts = self.counts
+        mask = 0
+        for digit in range(1, self.geometry.size + 1):
+            for offset in self.offsets[idx]:
+                if counts[offset + digit]:
+                    break
+            else:
+                mask |= 1 << digit
+        return mask
+
+    def in_conflict(self, idx):
+        """
+        Whether the digit of cell <idx> is repeated
+        in one of its units or is in a broken cage
+
+        Returns:
+            bool -- False for empty cells
+        """
+        value = self.values[idx]
+        if not value:
+            return False
+        counts = self.counts
+        for offset in self.offsets[idx]:
+            if counts[offset + value] > 1:
+                return True
+        if self.cage_sums:
+            cage = self.rules.cage_of[idx]
+            return cage >= 0 and self._cage_broken(cage)
+        return False
+
+    def is_solved(self):
+        return self.filled == len(self.values) and self.conflicts == 0
+
+    def grid(self):
+        size = self.geometry.size
+        values = self.values
+        return [list(values[i * size:(i + 1) * size]) for i in range(size)]
+
+    def numpy(self):
+        """
+        Returns:
+            np.ndarray -- (size, size) uint8 view of the
+                          values, writes through it
+                          bypass the counts
+        """
+        import numpy as np
+
+        size = self.geometry.size
+        return np.frombuffer(self.values, dtype='uint8').reshape(size, size)
+
+    def __repr__(self):
+        return 'BoardState({}x{} {}, filled={}, conflicts={})'.format(
+            self.size, self.size, self.rules.name, self.filled, self.conflicts)
@@ -0,0 +1,233 @@
+"""
+Canonical form of 9x9 puzzles
+
+Puzzles that differ only by a transposition,
+swaps of bands or stacks, swaps of rows or
+columns within them and a relabeling of the
+digits have the same solution up to the same
+transformation, so they can share it.
+
+The canonical form is the smallest grid
+(read row by row, digits relabeled in order
+of first appearance, 0 for empty cells)
+reachable by these transformations. It is
+found in two steps:
+    1. the pattern of filled cells is minimized
+       row by row, columns are kept in ordered
+       groups of still interchangeable columns
+       and rows are chosen by backtracking over
+       the ones giving the smallest next row
+    2. the digits are relabeled for every
+       arrangement giving the smallest pattern
+       and the smallest result is taken
+
+Very symmetric patterns (e.g. almost empty
+grids) have too many such arrangements, so
+at most <MAX_BRANCHES> row orders and
+<MAX_CANDIDATES> arrangements are tried.
+The result is then still a transformation
+of the puzzle, but equivalent puzzles may
+get different forms.
+"""
+import itertools
+
+import numpy as np
+
+
+MAX_BRANCHES = 64
+MAX_CANDIDATES = 1024
+
+# three stacks of three columns, all interchangeable
+_INITIAL_COLUMNS = ((((0, 1, 2),), ((3, 4, 5),), ((6, 7, 8),)),)
+
+
+class Transform:
+    """
+    Transformation of a grid into its canonical form
+
+    Attributes:
+        transpose {bool} -- whether the grid is transposed first
+        rows {tuple} -- row of the (transposed) grid
+                        moved to every row
+        cols {tuple} -- column moved to every column
+        labels {np.ndarray} -- new label of every digit, 0 stays 0
+    """
+
+    def __init__(self, transpose, rows, cols, labels):
+        self.transpose = transpose
+        self.rows = tuple(rows)
+        self.cols = tuple(cols)
+        self.labels = np.asarray(labels, dtype='int')
+        self.inverse_labels = np.argsort(self.labels)
+
+    def apply(self, grid):
+        """
+        Transform a grid
+
+        Arguments:
+            grid {9x9 array-like} -- puzzle or solution
+
+        Returns:
+            np.ndarray -- (9, 9) transformed grid
+        """
+        grid = np.asarray(grid, dtype='int')
+        if self.transpose:
+            grid = grid.T
+        return self.labels[grid[np.ix_(self.rows, self.cols)]]
+
+    def invert(self, grid):
+        """
+        Undo the transformation
+
+        Arguments:
+            grid {9x9 array-like} -- transformed grid
+
+        Returns:
+            np.ndarray -- (9, 9) original grid
+        """
+        grid = self.inverse_labels[np.asarray(grid, dtype='int')]
+        original = np.empty_like(grid)
+        original[np.ix_(self.rows, self.cols)] = grid
+        if self.transpose:
+            original = original.T
+        return original
+
+    def __repr__(self):
+        return 'Transform(transpose={}, rows={}, cols={}, labels={})'.format(
+            self.transpose, self.rows, self.cols, self.labels.tolist())
+
+
+def _refine(columns, values):
+    """
+    Order the columns to make <values> smallest
+
+    Arguments:
+        columns {tuple} -- ordered groups of interchangeable
+                           stacks, every stack is a tuple of
+                           cells of interchangeable columns
+        values {list} -- value of every column
+
+    Returns:
+        tuple -- (smallest row, refined columns)
+    """
+    row = []
+    groups = []
+    for group in columns:
+        keyed = []
+        for stack in group:
+            cells = []
+            signature = []
+            for cell in stack:
+                ordered = sorted(cell, key=values.__getitem__)
+                for value, cell_cols in itertools.groupby(ordered, key=values.__getitem__):
+                    cell_cols = tuple(cell_cols)
+                    cells.append(cell_cols)
+                    signature.extend([value] * len(cell_cols))
+            keyed.append((tuple(signature), tuple(cells)))
+        keyed.sort(key=lambda item: item[0])
+        for signature, items in itertools.groupby(keyed, key=lambda item: item[0]):
+            stacks = tuple(cells for _, cells in items)
+            groups.append(stacks)
+            row.extend(signature * len(stacks))
+    return tuple(row), tuple(groups)
+
+
+def _stack_orders(stack):
+    cell_orders = [itertools.permutations(cell) for cell in stack]
+    for order in itertools.product(*cell_orders):
+        yield sum(order, ())
+
+
+def _column_orders(columns):
+    """
+    Every column order allowed by the groups
+    """
+    group_orders = []
+    for group in columns:
+        group_orders.append([
+            sum(order, ())
+            for stacks in itertools.permutations(group)
+            for order in itertools.product(*(_stack_orders(stack) for stack in stacks))
+        ])
+    for order in itertools.product(*group_orders):
+        yield sum(order, ())
+
+
+def _pattern_branches(grid):
+    """
+    Row orders and column groups giving
+    the smallest pattern of filled cells
+
+    Returns:
+        list -- (transpose, rows, columns) branches
+    """
+    # state: (transpose, rows so far, column groups)
+    states = [(False, (), _INITIAL_COLUMNS), (True, (), _INITIAL_COLUMNS)]
+    patterns = {False: (grid != 0).astype('int').tolist(),
+                True: (grid.T != 0).astype('int').tolist()}
+
+    for position in range(9):
+        best = None
+        expanded = []
+        for transpose, rows, columns in states:
+            if position % 3 == 0:
+                # first row of a band: any row of an unused band
+                used_bands = {row // 3 for row in rows}
+                candidates = [row for row in range(9) if row // 3 not in used_bands]
+            else:
+                band = rows[-1] // 3
+                candidates = [row for row in range(band * 3, band * 3 + 3) if row not in rows]
+            for row in candidates:
+                values, refined = _refine(columns, patterns[transpose][row])
+                if best is None or values < best:
+                    best = values
+                    expanded = []
+                if values == best:
+                    expanded.append((transpose, rows + (row,), refined))
+        states = expanded[:MAX_BRANCHES]
+    return states
+
+
+def _relabel(values):
+    labels = [0] * 10
+    next_label = 1
+    for value in values:
+        if value and not labels[value]:
+            labels[value] = next_label
+            next_label += 1
+    return labels
+
+
+def canonical_form(grid):
+    """
+    Canonical form of a 9x9 puzzle
+
+    Arguments:
+        grid {9x9 array-like} -- puzzle, 0 for empty cells
+
+    Returns:
+        tuple -- (canonical grid as an 81 character string,
+                  Transform from <grid> to it)
+    """
+    grid = np.asarray(grid, dtype='int').reshape(9, 9)
+    best = None
+    best_transform = None
+    candidates = (
+        (transpose, rows, cols)
+        for transpose, rows, columns in _pattern_branches(grid)
+        for cols in _column_orders(columns)
+    )
+    for transpose, rows, cols in itertools.islice(candidates, MAX_CANDIDATES):
+        source = grid.T if transpose else grid
+        values = source[np.ix_(rows, cols)].ravel().tolist()
+        labels = _relabel(values)
+        key = [labels[value] for value in values]
+        if best is None or key < best:
+            best = key
+            best_transform = (transpose, rows, cols, labels)
+
+    transpose, rows, cols, labels = best_transform
+    # digits missing from the puzzle get the labels left
+    unused = iter(label for label in range(1, 10) if label not in labels)
+    labels = [label or (digit and next(unused)) for digit, label in enumerate(labels)]
+    return ''.join(map(str, best)), Transform(transpose, rows, cols, labels)
@@ -0,0 +1,80 @@
+"""
+Background solving for the game
+
+The solver runs on a worker thread, so the
+window keeps repainting and taking input.
+The main thread polls the task for progress
+and applies the solution once it is done.
+"""
+import threading
+import time
+
+from .solver import SolveCancelled, get_solver
+
+
+class BackgroundSolve:
+    def __init__(self, grid, backend='bitmask', cache=None, rules=None):
+        """
+        Start solving a copy of <grid>
+
+        Arguments:
+            grid {NxN array-like} -- board to solve, 0 for empty cells
+
+        Keyword Arguments:
+            backend {str} -- solver backend (default: {'bitmask'})
+            cache {SolutionCache} -- cache to check first, only
+                                     for classic rules (default: {None})
+            rules {variants.Rules} -- rules of a variant (default: {None})
+        """
+        self.grid = [[int(value) for value in row] for row in grid]
+        self.backend = backend
+        if rules is not None and not rules.is_classic:
+            cache = None
+        self.cache = cache
+        self.solver = get_solver(self.grid, backend, rules=rules)
+        self.result = None
+        self.cancelled = False
+        self.start_time = time.perf_counter()
+        self.end_time = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        try:
+            if self.cache is not None:
+                self.result = self.cache.solve(self.grid, self.backend, self.solver)
+            else:
+                self.result = self.solver.solve()
+        except SolveCancelled:
+            self.cancelled = True
+        finally:
+            self.end_time = time.perf_counter()
+
+    @property
+    def done(self):
+        return not self.thread.is_alive()
+
+    @property
+    def nodes(self):
+        return self.solver.stats.nodes
+
+    @property
+    def elapsed(self):
+        end_time = self.end_time or time.perf_counter()
+        return end_time - self.start_time
+
+    def progress(self):
+        """
+        Human readable progress
+
+        Returns:
+            str -- nodes explored and elapsed time
+        """
+        return 'Solving: {} nodes, {:.1f}s'.format(self.nodes, self.elapsed)
+
+    def cancel(self):
+        """
+        Stop solving and wait for the worker
+        """
+        self.solver.cancel()
+        self.thread.join()
@@ -0,0 +1,96 @@
+"""
+Undo log of cell changes
+
+Every change is pushed as one int holding the
+cell and the value it had before (a digit, a
+candidate mask or whatever the owner keeps
+per cell). A checkpoint is the position in
+the log, rolling back pops the changes made
+after it, latest first, so undoing k changes
+costs O(k) however deep the search or long
+the game is.
+
+Checkpoints keep growing when old entries are
+dropped with <forget>, so they stay valid for
+the entries that are still there.
+"""
+
+
+# cells of the biggest (25x25) board fit in 10 bits
+CELL_BITS = 10
+CELL_MASK = (1 << CELL_BITS) - 1
+
+
+class Trail:
+    __slots__ = ('entries', 'base')
+
+    def __init__(self):
+        # (previous value << CELL_BITS) | cell
+        self.entries = []
+        # checkpoint of the first entry
+        self.base = 0
+
+    def push(self, cell, value):
+        """
+        Record that <cell> had <value>
+        before it was changed
+        """
+        self.entries.append(value << CELL_BITS | cell)
+
+    def checkpoint(self):
+        """
+        Returns:
+            int -- position to roll back to
+        """
+        return self.base + len(self.entries)
+
+    def rollback(self, checkpoint):
+        """
+        Pop the changes made after <checkpoint>
+
+        Arguments:
+            checkpoint {int} -- see <checkpoint>, entries
+                                already forgotten are skipped
+
+        Returns:
+            list -- (cell, previous value) pairs, latest first
+        """
+        start = max(checkpoint - self.base, 0)
+        entries = self.entries
+        changes = [(entry & CELL_MASK, entry >> CELL_BITS)
+                   for entry in reversed(entries[start:])]
+        del entries[start:]
+        return changes
+
+    def rollback_cells(self, checkpoint):
+        """
+        Like <rollback>, for owners that do
+        not need the previous values
+
+        Returns:
+            list -- cells, latest first
+        """
+        start = max(checkpoint - self.base, 0)
+        entries = self.entries
+        cells = [entry & CELL_MASK for entry in reversed(entries[start:])]
+        del entries[start:]
+        return cells
+
+    def forget(self, checkpoint):
+        """
+        Let the entries before <checkpoint> go,
+        they are dropped once they make up half
+        of the log, so this is O(1) amortized
+        """
+        drop = checkpoint - self.base
+        if drop > 0 and 2 * drop >= len(self.entries):
+            drop = min(drop, len(self.entries))
+            del self.entries[:drop]
+            self.base += drop
+
+    def clear(self):
+        self.base = self.checkpoint()
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
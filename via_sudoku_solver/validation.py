@@ -0,0 +1,165 @@
+"""
+Vectorized validation of stacks of boards
+
+Every unit (row, column or box) of every
+board is gathered into an (N, 27, 9) array
+(N, 3 * size, size in general) and each
+cell is one-hot encoded as a bit. A unit
+contains a repeated digit exactly when the
+sum of its bits differs from their bitwise OR.
+
+Variants (see variants.py) add their groups
+and cages as more units, padded to <size>
+cells with a column that is always empty,
+and killer cages also compare the sum of
+their values with the cage sum.
+"""
+import functools
+from collections import namedtuple
+
+import numpy as np
+
+from .geometry import as_board_stack, geometry
+from .variants import MAX_COMPILED
+
+
+# indices of cells of every unit in the flattened
+# board: rows 0..8, columns 9..17, boxes 18..26
+UNIT_INDEX = np.array(geometry(3).units, dtype='intp')
+
+# bit of every cell value, 0 stays 0
+DIGIT_BITS = np.array([0] + [1 << d for d in range(9)], dtype='uint16')
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+ValidationResult = namedtuple(
+    'ValidationResult',
+    ['consistent', 'complete', 'first_conflict']
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _tables(box):
+    if box == 3:
+        return UNIT_INDEX, DIGIT_BITS
+    size = box * box
+    # sums of 16 or more bits overflow uint16
+    dtype = 'uint16' if size <= 9 else 'uint32'
+    unit_index = np.array(geometry(box).units, dtype='intp')
+    digit_bits = np.array([0] + [1 << d for d in range(size)], dtype=dtype)
+    return unit_index, digit_bits
+
+
+@functools.lru_cache(maxsize=MAX_COMPILED)
+def _rule_tables(rules):
+    """
+    Padded unit and cage indices of compiled rules,
+    index <cells> is the empty padding column
+    """
+    size = rules.size
+    unit_index = np.full((len(rules.units), size), rules.cells, dtype='intp')
+    for k, unit in enumerate(rules.units):
+        unit_index[k, :len(unit)] = unit
+    cage_units = np.array([unit for unit, _ in rules.cages], dtype='intp')
+    cage_totals = np.array([total for _, total in rules.cages], dtype='int32')
+    cage_sizes = np.array([len(rules.units[unit]) for unit, _ in rules.cages], dtype='int32')
+    return unit_index, cage_units, cage_totals, cage_sizes
+
+
+def validate_boards(boards, chunk_size=DEFAULT_CHUNK_SIZE, rules=None):
+    """
+    Validate a stack of boards
+
+    Boards are processed in chunks of <chunk_size>
+    so the memory used does not depend on N.
+    Values outside 0..size make a board inconsistent.
+    2D arrays are read as in <as_board_stack>.
+
+    Arguments:
+        boards {array-like} -- (N, 9, 9) or (N, 81) integer array,
+                               0 for empty cells, also 4x4,
+                               16x16 and 25x25 boards
+
+    Keyword Arguments:
+        chunk_size {int} -- number of boards processed at once
+        rules {variants.Rules} -- rules of the boards,
+                                  classic if None (default: {None})
+
+    Raises:
+        ValueError -- if the rules are for another board size
+
+    Returns:
+        ValidationResult -- (N,) arrays:
+            consistent -- no repeated digits in any unit
+                          and no broken cage
+            complete -- consistent and all cells are filled
+            first_conflict -- index of the first unit with
+                              a repeated digit (rows 0..8,
+                              columns 9..17, boxes 18..26
+                              for 9x9 boards, then the units
+                              of <rules>) or -1
+    """
+    boards, geo = as_board_stack(boards)
+    n = boards.shape[0]
+    size = geo.size
+    unit_index, digit_bits = _tables(geo.box)
+    if rules is not None and rules.is_classic:
+        rules = None
+    if rules is not None:
+        if rules.size != size:
+            raise ValueError('Rules are for {0}x{0} boards, got {1}x{1}'.format(
+                rules.size, size))
+        unit_index, cage_units, cage_totals, cage_sizes = _rule_tables(rules)
+
+    consistent = np.empty(n, dtype='bool_')
+    complete = np.empty(n, dtype='bool_')
+    first_conflict = np.empty(n, dtype='int16')
+
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        chunk = boards[start:stop]
+
+        in_range = (chunk >= 0) & (chunk <= size)
+        values = np.where(in_range, chunk, 0)
+        if rules is not None:
+            values = np.concatenate(
+                [values, np.zeros((len(values), 1), dtype=values.dtype)], axis=1)
+        bits = digit_bits[values]
+        units = bits[:, unit_index]
+        repeated = (
+            np.bitwise_or.reduce(units, axis=2) !=
+            units.sum(axis=2, dtype=digit_bits.dtype)
+        )
+        if rules is not None and len(cage_units):
+            cages = values[:, unit_index[cage_units]]
+            cage_sums = cages.sum(axis=2, dtype='int32')
+            full = (cages != 0).sum(axis=2) == cage_sizes
+            repeated[:, cage_units] |= (cage_sums > cage_totals) | (
+                full & (cage_sums != cage_totals))
+        has_conflict = repeated.any(axis=1)
+
+        consistent[start:stop] = ~has_conflict & in_range.all(axis=1)
+        complete[start:stop] = (
+            consistent[start:stop] & (chunk != 0).all(axis=1)
+        )
+        first_conflict[start:stop] = np.where(
+            has_conflict, repeated.argmax(axis=1), -1)
+
+    return ValidationResult(consistent, complete, first_conflict)
+
+
+def is_correct(board, rules=None):
+    """
+    Check a single board
+
+    Arguments:
+        board {NxN array-like} -- board to check
+
+    Keyword Arguments:
+        rules {variants.Rules} -- rules of the board (default: {None})
+
+    Returns:
+        bool -- whether there are no repeated
+                digits in any unit
+    """
+    return bool(validate_boards(np.asarray(board)[np.newaxis], rules=rules).consistent[0])
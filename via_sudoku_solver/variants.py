@@ -0,0 +1,230 @@
+"""
+Variant rules compiled into constraint tables
+
+A variant is declared as data: its name picks
+the extra groups of cells that must hold
+distinct digits on top of rows, columns and
+boxes, and killer puzzles add cages, groups
+of distinct digits with a given sum:
+    classic -- rows, columns and boxes
+    diagonal -- and both main diagonals
+    windoku -- and four windows of 3x3 cells
+               between the boxes (one 2x2 window
+               on 4x4 boards)
+    killer -- and the cages of the puzzle
+
+A declaration is compiled once into Rules:
+units with the classic ones first, the units
+of every cell, the peers of every cell and
+the cage of every cell. The solver, the
+board state, validation and rendering all
+read these tables, so a new variant is a
+new list of groups. Classic rules keep
+the geometry tables as they are and get the
+dedicated BitmaskSolver, other rules get the
+VariantSolver (see solver.py).
+"""
+import collections
+import functools
+
+from .geometry import geometry
+
+
+VARIANTS = ('classic', 'diagonal', 'windoku', 'killer')
+
+# compiled declarations kept, every random
+# killer puzzle has a declaration of its own
+MAX_COMPILED = 64
+
+# cages are (sum, cells) pairs, cells
+# are indexed row by row
+Variant = collections.namedtuple('Variant', ['name', 'box', 'cages'])
+
+
+def variant(name='classic', box=3, cages=()):
+    """
+    Declare a variant
+
+    Keyword Arguments:
+        name {str} -- one of <VARIANTS> (default: {'classic'})
+        box {int} -- box size, 3 for 9x9 boards (default: {3})
+        cages {iterable} -- (sum, cells) pairs, only
+                            for killer puzzles (default: {()})
+
+    Raises:
+        ValueError -- if the variant is unknown or
+                      a cage does not fit the board
+
+    Returns:
+        Variant -- hashable declaration
+    """
+    if name not in VARIANTS:
+        raise ValueError('Unknown variant: {}'.format(name))
+    if name == 'windoku' and box > 3:
+        raise ValueError('Windoku is played on 4x4 and 9x9 boards only')
+    geo = geometry(box)
+    cages = tuple(sorted((int(total), tuple(sorted(int(idx) for idx in cells)))
+                         for total, cells in cages))
+    if cages and name != 'killer':
+        raise ValueError('Only killer puzzles have cages')
+    seen = set()
+    for total, cells in cages:
+        count = len(cells)
+        if not 0 < count <= geo.size or not all(0 <= idx < geo.cells for idx in cells):
+            raise ValueError('Cage {} does not fit a {}x{} board'.format(
+                list(cells), geo.size, geo.size))
+        if seen.intersection(cells) or len(set(cells)) != count:
+            raise ValueError('Cages overlap at cells {}'.format(list(cells)))
+        seen.update(cells)
+        if not cage_digits(count, total, geo.all_digits):
+            raise ValueError('No {} distinct digits sum to {}'.format(count, total))
+    return Variant(name, box, cages)
+
+
+def extra_groups(name, box=3):
+    """
+    Groups of cells a variant adds
+    to rows, columns and boxes
+
+    Returns:
+        list -- lists of cells
+    """
+    size = box * box
+    if name == 'diagonal':
+        return [[i * size + i for i in range(size)],
+                [i * size + size - 1 - i for i in range(size)]]
+    if name == 'windoku':
+        # one cell away from the box borders
+        starts = [1 + k * (box + 1) for k in range(box - 1)]
+        return [[(top + i) * size + left + j for i in range(box) for j in range(box)]
+                for top in starts for left in starts]
+    return []
+
+
+@functools.lru_cache(maxsize=None)
+def cage_digits(count, total, allowed):
+    """
+    Digits of the ways to write <total>
+    as a sum of <count> distinct digits
+    of <allowed>
+
+    Arguments:
+        count {int} -- number of digits
+        total {int} -- their sum
+        allowed {int} -- mask with bit d set for every usable digit d
+
+    Returns:
+        int -- mask of the digits used by any way, with
+               bit 0 set when there is a way at all
+    """
+    if count == 0:
+        return 1 if total == 0 else 0
+    if total <= 0 or not allowed:
+        return 0
+    bit = allowed & -allowed
+    digit = bit.bit_length() - 1
+    # the other digits are bigger still
+    if digit > total:
+        return 0
+    rest = allowed ^ bit
+    mask = cage_digits(count, total, rest)
+    with_digit = cage_digits(count - 1, total - digit, rest)
+    if with_digit:
+        mask |= with_digit | bit
+    return mask
+
+
+class Rules:
+    def __init__(self, declaration):
+        """
+        Arguments:
+            declaration {Variant} -- see <variant>
+        """
+        geo = self.geometry = geometry(declaration.box)
+        self.variant = declaration
+        self.name = declaration.name
+        self.box = geo.box
+        self.size = geo.size
+        self.cells = geo.cells
+        self.is_classic = declaration.name == 'classic'
+
+        groups = extra_groups(declaration.name, declaration.box)
+        # classic units first, so rows, columns
+        # and boxes keep their indices
+        self.units = geo.units + groups + [list(cells) for _, cells in declaration.cages]
+        # units holding every digit once
+        self.full_units = [unit for unit in self.units if len(unit) == geo.size]
+
+        if self.is_classic:
+            self.cell_units = geo.cell_units
+            self.peers = geo.peers
+        else:
+            self.cell_units = [[] for _ in range(geo.cells)]
+            for unit_index, unit in enumerate(self.units):
+                for idx in unit:
+                    self.cell_units[idx].append(unit_index)
+            self.peers = [
+                sorted({peer for unit_index in self.cell_units[idx]
+                        for peer in self.units[unit_index]} - {idx})
+                for idx in range(geo.cells)
+            ]
+
+        # cages as (unit index, sum), -1 for cells in no cage
+        first_cage = len(geo.units) + len(groups)
+        self.cages = [(first_cage + k, total)
+                      for k, (total, _) in enumerate(declaration.cages)]
+        self.cage_of = [-1] * geo.cells
+        for k, (_, cells) in enumerate(declaration.cages):
+            for idx in cells:
+                self.cage_of[idx] = k
+        # cells of groups other than cages
+        self.group_cells = sorted({idx for group in groups for idx in group})
+
+    def __repr__(self):
+        return 'Rules({}, {}x{}, {} units, {} cages)'.format(
+            self.name, self.size, self.size, len(self.units), len(self.cages))
+
+
+@functools.lru_cache(maxsize=MAX_COMPILED)
+def compile_rules(declaration):
+    """
+    Compile a declaration, once per recent
+    declaration
+
+    Arguments:
+        declaration {Variant} -- see <variant>
+
+    Returns:
+        Rules -- shared tables
+    """
+    return Rules(declaration)
+
+
+def get_rules(name='classic', box=3, cages=()):
+    """
+    Compiled rules of a variant,
+    see <variant> for the arguments
+
+    Returns:
+        Rules -- shared tables
+    """
+    return compile_rules(variant(name, box, cages))
+
+
+def rules_of(declaration, box=3):
+    """
+    Compiled rules of a variant name
+    or declaration
+
+    Arguments:
+        declaration {str or Variant} -- name or declaration
+
+    Keyword Arguments:
+        box {int} -- box size for a name (default: {3})
+
+    Returns:
+        Rules -- shared tables
+    """
+    if isinstance(declaration, str):
+        return get_rules(declaration, box)
+    return compile_rules(declaration)